@@ -1,8 +1,14 @@
 from flask import Flask
 
+from database import unit_of_work
+from database.registry import managerRegistry
+from database.spatial_index import GridSpatialIndex
 from models import db
+from models.answer import AnswerModel
+from models.question import QuestionModel
 from views.answerView import answer_bp
 from views.questionView import questions_bp
+from views.tileView import tiles_bp
 
 
 def read_config(app, config_path='config_dev.Config'):
@@ -13,19 +19,76 @@ def read_config(app, config_path='config_dev.Config'):
 def register_blueprints(app, prefix="/api"):
     app.register_blueprint(questions_bp, url_prefix=prefix)
     app.register_blueprint(answer_bp, url_prefix=prefix)
+    app.register_blueprint(tiles_bp, url_prefix=prefix)
     return app
 
 
 def init_db(app):
+    # managers hold collection handles of the previous connection
+    managerRegistry.reset()
     db.init_app(app)
 
 
+def ensure_indexes(app, models=(QuestionModel, AnswerModel)):
+    with app.app_context():
+        for model_cls in models:
+            created = model_cls.manager().ensure_indexes()
+            if created:
+                app.logger.info("created indexes on %s: %s", model_cls.__name__, ", ".join(created))
+    return app
+
+
+def backfill_cells(app, models=(QuestionModel, AnswerModel)):
+    with app.app_context():
+        for model_cls in models:
+            count = model_cls.manager().backfill_cells()
+            app.logger.info("wrote the cell of %d %s documents", count, model_cls.__name__)
+    return app
+
+
+def warm_up_spatial_indexes(app, models=(QuestionModel,)):
+    with app.app_context():
+        for model_cls in models:
+            manager = model_cls.manager()
+            manager.enable_spatial_index(GridSpatialIndex(
+                max_size=app.config['SPATIAL_INDEX_MAX_SIZE'],
+                max_age=app.config.get('SPATIAL_INDEX_MAX_AGE', 60)
+            ))
+            count = manager.warm_up_spatial_index()
+            if count is None:
+                app.logger.warning("spatial index of %s is full, queries go to the database", model_cls.__name__)
+            else:
+                app.logger.info("loaded %d locations of %s into the spatial index", count, model_cls.__name__)
+    return app
+
+
+def register_commands(app):
+    @app.cli.command("ensure-indexes")
+    def ensure_indexes_command():
+        """Create all missing indexes declared by the models."""
+        ensure_indexes(app)
+
+    @app.cli.command("backfill-cells")
+    def backfill_cells_command():
+        """Write the location cell of all documents saved before it existed."""
+        backfill_cells(app)
+
+    return app
+
+
 def factory(config_path=None):
     app = Flask(__name__)
     read_config(app, config_path)
 
     init_db(app)
+    if app.config.get('ENSURE_INDEXES', False):
+        ensure_indexes(app)
+    if app.config.get('SPATIAL_INDEX_MAX_SIZE', 0):
+        warm_up_spatial_indexes(app)
+    if app.config.get('UNIT_OF_WORK_PER_REQUEST', False):
+        unit_of_work.init_app(app)
     register_blueprints(app)
+    register_commands(app)
     return app
 
 
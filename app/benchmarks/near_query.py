@@ -0,0 +1,90 @@
+"""
+benchmark of the sorted ($near) and unsorted ($geoWithin $centerSphere) radius queries.
+
+run from the app directory:  python -m benchmarks.near_query <mongo uri> [items] [queries]
+
+the points are written to a scratch collection with the indexes of the question model.
+for every mode the best time of all queries and the winning plan of the first one are printed.
+"""
+import random
+import sys
+import timeit
+
+from pymongo import MongoClient
+
+from database.geo import EARTH_RADIUS
+from database.indexes import ensure_indexes
+from models.question import QuestionModel
+
+CENTER = (13.4, 52.5)
+MAX_DISTANCE = 20000
+LIMIT = 100
+
+
+def build_raw_items(count, rng):
+    return [
+        {
+            'deleted': False,
+            'score': rng.randint(0, 100),
+            'loc': {
+                'type': 'Point',
+                'coordinates': [CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.3, 0.3)]
+            }
+        } for _ in range(count)
+    ]
+
+
+def near_filter(longitude, latitude):
+    return {'deleted': False, 'loc': {'$near': {
+        '$geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+        '$maxDistance': MAX_DISTANCE
+    }}}
+
+
+def sphere_filter(longitude, latitude):
+    return {'deleted': False, 'loc': {'$geoWithin': {
+        '$centerSphere': [[longitude, latitude], MAX_DISTANCE / EARTH_RADIUS]
+    }}}
+
+
+def winning_stages(plan):
+    stages = [plan['stage']]
+    while 'inputStage' in plan:
+        plan = plan['inputStage']
+        stages.append(plan['stage'])
+    return " <- ".join(stages)
+
+
+def main(mongo_uri, count=100000, query_count=200, repeat=3):
+    rng = random.Random(0)
+    collection = MongoClient(mongo_uri)['benchmarks']['near_query']
+    collection.drop()
+    ensure_indexes(collection, QuestionModel.get_indexes())
+    collection.insert_many(build_raw_items(int(count), rng))
+    queries = [
+        (CENTER[0] + rng.uniform(-0.4, 0.4), CENTER[1] + rng.uniform(-0.2, 0.2)) for _ in range(int(query_count))
+    ]
+
+    modes = (
+        ('$near, limit {}'.format(LIMIT), lambda lon, lat: list(collection.find(near_filter(lon, lat), limit=LIMIT))),
+        ('$centerSphere, limit {}'.format(LIMIT),
+         lambda lon, lat: list(collection.find(sphere_filter(lon, lat), limit=LIMIT))),
+        ('$near, all', lambda lon, lat: list(collection.find(near_filter(lon, lat)))),
+        ('$centerSphere, all', lambda lon, lat: list(collection.find(sphere_filter(lon, lat)))),
+        ('$centerSphere, count', lambda lon, lat: collection.count_documents(sphere_filter(lon, lat))),
+    )
+    try:
+        for name, run in modes:
+            best = min(timeit.repeat(lambda: [run(lon, lat) for lon, lat in queries], number=1, repeat=repeat))
+            print("{name}: {best:.4f}s for {queries} queries, {per_query:.2f}ms per query".format(
+                name=name, best=best, queries=len(queries), per_query=best / len(queries) * 1000
+            ))
+        for name, filter_fn in (('$near', near_filter), ('$centerSphere', sphere_filter)):
+            plan = collection.find(filter_fn(*queries[0]), limit=LIMIT).explain()['queryPlanner']['winningPlan']
+            print("{name} plan: {stages}".format(name=name, stages=winning_stages(plan)))
+    finally:
+        collection.drop()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
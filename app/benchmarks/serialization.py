@@ -0,0 +1,54 @@
+"""
+micro benchmark for serializing a list response of questions.
+
+run from the app directory:  python -m benchmarks.serialization [items] [repeat]
+
+"cold" resets the schema registry before every item, which is what building the
+schema classes on every call used to cost. "warm" uses the registry as the app does.
+"""
+import sys
+import timeit
+import unittest.mock as mock
+
+from database.schema import schemaRegistry
+from models.question import QuestionModel
+
+
+def build_raw_items(count):
+    return [
+        {
+            'topic': 'topic %d' % idx,
+            'question': 'question %d' % idx,
+            'score': idx,
+            'deleted': False,
+            'loc': {
+                'type': 'Point',
+                'coordinates': [idx % 180, idx % 90]
+            }
+        } for idx in range(count)
+    ]
+
+
+def serialize_list(raw_items, reset_registry):
+    for raw_item in raw_items:
+        if reset_registry:
+            schemaRegistry.reset()
+        item = QuestionModel.get_schema().load(raw_item).data
+        item.serialize()
+
+
+def main(count=500, repeat=5):
+    raw_items = build_raw_items(count)
+    with mock.patch('database.manager.get_db') as get_db_mock:
+        get_db_mock.return_value.__getitem__.return_value.find.return_value = []
+        for name, reset_registry in (('cold', True), ('warm', False)):
+            timings = timeit.repeat(
+                lambda: serialize_list(raw_items, reset_registry), number=1, repeat=repeat
+            )
+            print("{name}: {best:.4f}s for {count} items (best of {repeat})".format(
+                name=name, best=min(timings), count=count, repeat=repeat
+            ))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,94 @@
+"""
+micro benchmark for candidate lookups of nearby queries.
+
+run from the app directory:  python -m benchmarks.spatial_index [items] [queries] [mongo uri]
+
+"index" answers the queries from a GridSpatialIndex. with a mongo uri the same points are written
+to a scratch collection and "2dsphere" runs the $near query, "index + $in" the lookup followed by
+fetching the documents by id, which is what LocationManager does with an enabled index.
+"""
+import random
+import sys
+import timeit
+
+from pymongo import GEOSPHERE, MongoClient
+
+from database.spatial_index import GridSpatialIndex
+from database.utils import int_to_id_obj
+
+CENTER = (13.4, 52.5)
+MAX_DISTANCE = 1000
+
+
+def build_raw_items(count, rng):
+    return [
+        {
+            '_id': int_to_id_obj(idx + 1),
+            'deleted': False,
+            'score': rng.randint(0, 100),
+            'loc': {
+                'type': 'Point',
+                'coordinates': [CENTER[0] + rng.uniform(-0.5, 0.5), CENTER[1] + rng.uniform(-0.3, 0.3)]
+            }
+        } for idx in range(count)
+    ]
+
+
+def build_queries(count, rng):
+    return [
+        (CENTER[0] + rng.uniform(-0.4, 0.4), CENTER[1] + rng.uniform(-0.2, 0.2)) for _ in range(count)
+    ]
+
+
+def report(name, timings, queries):
+    best = min(timings)
+    print("{name}: {best:.4f}s for {queries} queries, {per_query:.1f}us per query".format(
+        name=name, best=best, queries=queries, per_query=best / queries * 1e6
+    ))
+
+
+def run_mongo(mongo_uri, raw_items, index, queries, repeat):
+    collection = MongoClient(mongo_uri)['benchmarks']['spatial_index']
+    collection.drop()
+    collection.create_index([('loc', GEOSPHERE)])
+    collection.insert_many(raw_items)
+
+    def near():
+        for longitude, latitude in queries:
+            list(collection.find({'loc': {'$near': {
+                '$geometry': {'type': 'Point', 'coordinates': [longitude, latitude]},
+                '$maxDistance': MAX_DISTANCE
+            }}}))
+
+    def index_and_fetch():
+        for longitude, latitude in queries:
+            ids = [_id for _, _id in index.near(longitude, latitude, MAX_DISTANCE)]
+            list(collection.find({'_id': {'$in': ids}}))
+
+    try:
+        report('2dsphere', timeit.repeat(near, number=1, repeat=repeat), len(queries))
+        report('index + $in', timeit.repeat(index_and_fetch, number=1, repeat=repeat), len(queries))
+    finally:
+        collection.drop()
+
+
+def main(count=100000, query_count=1000, mongo_uri=None, repeat=5):
+    rng = random.Random(0)
+    raw_items = build_raw_items(int(count), rng)
+    queries = build_queries(int(query_count), rng)
+
+    index = GridSpatialIndex(max_size=len(raw_items))
+    warm_up_time = timeit.timeit(lambda: index.warm_up(raw_items), number=1)
+    print("warm up: {:.4f}s for {} items".format(warm_up_time, len(raw_items)))
+
+    def lookup():
+        for longitude, latitude in queries:
+            index.near(longitude, latitude, MAX_DISTANCE)
+
+    report('index', timeit.repeat(lookup, number=1, repeat=repeat), len(queries))
+    if mongo_uri:
+        run_mongo(mongo_uri, raw_items, index, queries, repeat)
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -1,2 +1,21 @@
 class Config(object):
     MONGO_HOST = "database"
+    # create the indexes of all models once at startup instead of on demand
+    ENSURE_INDEXES = True
+    # locations of questions kept in memory per worker for nearby / within lookups, 0 disables it
+    SPATIAL_INDEX_MAX_SIZE = 0
+    # seconds until the index is reloaded to pick up writes of other workers
+    SPATIAL_INDEX_MAX_AGE = 60
+    # directory of the rendered map tiles shared by the workers of a host, None disables the cache
+    TILE_CACHE_DIR = None
+    # seconds until a cached tile is rendered again, e.g. after an item moved away from it
+    TILE_CACHE_MAX_AGE = 300
+    # deeper tiles are rendered on every request
+    TILE_CACHE_MAX_ZOOM = 16
+    # the oldest tiles beyond this size are removed
+    TILE_CACHE_MAX_BYTES = 1024 ** 3
+    # seconds votes are summed in process before they are written, 0 writes every vote at once
+    VOTE_BUFFER_INTERVAL = 0.3
+    # collect the writes of every request and flush them with one bulk_write per collection before the response.
+    # bulk POST/PUT/DELETE and votes are written at once, after flushing the writes collected before them
+    UNIT_OF_WORK_PER_REQUEST = False
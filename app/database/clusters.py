@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from math import ceil, floor
+
+MAX_ZOOM = 20
+
+
+class ClusterGrid(object):
+    """
+    degree grid of the cluster queries. at zoom z the world is 2^z tiles wide and the tiles are square,
+    every tile is split into cells_per_tile x cells_per_tile cells and every non empty cell is one cluster.
+    cells and tiles are numbered from (-180, -90).
+    """
+
+    def __init__(self, cells_per_tile=4):
+        self.cells_per_tile = cells_per_tile
+
+    def tile_size(self, zoom):
+        return 360.0 / 2 ** zoom
+
+    def cell_size(self, zoom):
+        return self.tile_size(zoom) / self.cells_per_tile
+
+    def tile_counts(self, zoom):
+        return 2 ** zoom, int(ceil(180 / self.tile_size(zoom)))
+
+    def tile_of(self, zoom, longitude, latitude):
+        tile_size = self.tile_size(zoom)
+        count_x, count_y = self.tile_counts(zoom)
+        # the east and north edge of the world belong to the last tile
+        return (
+            min(int(floor((longitude + 180) / tile_size)), count_x - 1),
+            min(int(floor((latitude + 90) / tile_size)), count_y - 1)
+        )
+
+    def tile_of_cell(self, cell_x, cell_y):
+        return cell_x // self.cells_per_tile, cell_y // self.cells_per_tile
+
+    def tiles(self, zoom, box):
+        """tiles overlapping a (min_longitude, min_latitude, max_longitude, max_latitude) box"""
+        min_x, min_y = self.tile_of(zoom, box[0], box[1])
+        max_x, max_y = self.tile_of(zoom, box[2], box[3])
+        return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+    def tile_count(self, zoom, box):
+        min_x, min_y = self.tile_of(zoom, box[0], box[1])
+        max_x, max_y = self.tile_of(zoom, box[2], box[3])
+        return (max_x - min_x + 1) * (max_y - min_y + 1)
+
+    def tiles_box(self, zoom, tiles):
+        """smallest box containing all tiles"""
+        tile_size = self.tile_size(zoom)
+        xs = [x for x, _ in tiles]
+        ys = [y for _, y in tiles]
+        return (
+            min(xs) * tile_size - 180, min(ys) * tile_size - 90,
+            min((max(xs) + 1) * tile_size - 180, 180), min((max(ys) + 1) * tile_size - 90, 90)
+        )
+
+    def cell_in_box(self, zoom, cell_x, cell_y, box):
+        cell_size = self.cell_size(zoom)
+        min_longitude, min_latitude = cell_x * cell_size - 180, cell_y * cell_size - 90
+        return min_longitude <= box[2] and box[0] <= min_longitude + cell_size and \
+            min_latitude <= box[3] and box[1] <= min_latitude + cell_size
+
+
+class ClusterCache(object):
+    """
+    LRU + TTL cache of the clusters of one tile per zoom level and filter.
+    a write invalidates the tiles containing the new location on every zoom level.
+    the tiles of the previous location of a moved item stay until they expire.
+    the threads of a process share the cache, the entries are only touched with the lock held.
+    """
+
+    def __init__(self, grid=None, ttl=30, max_entries=4096, clock=time.monotonic):
+        self.grid = grid or ClusterGrid()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _key(self, zoom, tile, filter_data):
+        return json.dumps(filter_data, sort_keys=True, default=str), zoom, tile
+
+    def get(self, zoom, tile, filter_data):
+        key = self._key(zoom, tile, filter_data)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, clusters = entry
+            if expires_at < self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return clusters
+
+    def put(self, zoom, tile, filter_data, clusters):
+        key = self._key(zoom, tile, filter_data)
+        with self.lock:
+            self.entries[key] = (self.clock() + self.ttl, clusters)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, longitude, latitude):
+        stale_tiles = set(
+            (zoom, self.grid.tile_of(zoom, longitude, latitude)) for zoom in range(MAX_ZOOM + 1)
+        )
+        with self.lock:
+            stale_keys = [key for key in self.entries if key[1:] in stale_tiles]
+            for key in stale_keys:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
@@ -41,3 +41,15 @@ class DeletionFailedException(TableModificationFailedError):
         super().__init__(*args, **kwargs)
         self.table = table
         self._id = _id
+
+
+class InvalidCursorError(DatabaseError):
+    def __init__(self, cursor, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor = cursor
+
+
+class SpatialIndexFullError(DatabaseError):
+    def __init__(self, max_size, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_size = max_size
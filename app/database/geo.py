@@ -0,0 +1,165 @@
+from math import asin, ceil, cos, hypot, radians, sin, sqrt
+
+# mongodb uses this radius for spherical distances
+EARTH_RADIUS = 6378.1 * 1000
+
+
+def haversine_distance(longitude1, latitude1, longitude2, latitude2):
+    """great circle distance between both coordinates in meters"""
+    longitude1, latitude1, longitude2, latitude2 = map(
+        radians, (longitude1, latitude1, longitude2, latitude2)
+    )
+    half_chord = sin((latitude2 - latitude1) / 2) ** 2 + \
+        cos(latitude1) * cos(latitude2) * sin((longitude2 - longitude1) / 2) ** 2
+    return 2 * EARTH_RADIUS * asin(min(1.0, sqrt(half_chord)))
+
+
+def distance_between(point1, point2):
+    return haversine_distance(point1.longitude, point1.latitude, point2.longitude, point2.latitude)
+
+
+def split_bbox(min_longitude, min_latitude, max_longitude, max_latitude):
+    """
+    list of (min_longitude, min_latitude, max_longitude, max_latitude) boxes.
+    a box with min_longitude > max_longitude crosses the antimeridian and is split there.
+    """
+    if min_longitude <= max_longitude:
+        return [(min_longitude, min_latitude, max_longitude, max_latitude)]
+    return [
+        (min_longitude, min_latitude, 180, max_latitude),
+        (-180, min_latitude, max_longitude, max_latitude)
+    ]
+
+
+# longitude span of the polygon edges which follow a parallel of a bounding box.
+# a great circle edge of this span leaves the parallel by at most ~30m, less than a pixel of such a viewport.
+BBOX_EDGE_DEGREES = 0.5
+# in degrees of latitude, more than the densified edges leave the parallels
+BBOX_EDGE_MARGIN = 0.001
+# GeoJSON polygons have to be smaller than a hemisphere
+MAX_BBOX_POLYGON_WIDTH = 90
+
+
+def _parallel(start_longitude, end_longitude, latitude, max_edge):
+    """positions from start_longitude to end_longitude on the parallel, a pole is a single position"""
+    if abs(latitude) == 90:
+        return [(start_longitude, latitude)]
+    steps = max(1, ceil(abs(end_longitude - start_longitude) / max_edge))
+    return [
+        (start_longitude + (end_longitude - start_longitude) * step / steps, latitude) for step in range(steps + 1)
+    ]
+
+
+def bbox_polygons(min_longitude, min_latitude, max_longitude, max_latitude, max_edge=BBOX_EDGE_DEGREES):
+    """
+    coordinates of GeoJSON polygons covering the bounding box, for $geoWithin $geometry on a 2dsphere index.
+    the edges along parallels are densified, because the edges of GeoJSON polygons are great circles.
+    boxes crossing the antimeridian or wider than MAX_BBOX_POLYGON_WIDTH are split, empty boxes are skipped.
+    """
+    polygons = []
+    for box_min_longitude, box_min_latitude, box_max_longitude, box_max_latitude in split_bbox(
+            min_longitude, min_latitude, max_longitude, max_latitude):
+        width = box_max_longitude - box_min_longitude
+        if width <= 0 or box_max_latitude <= box_min_latitude:
+            continue
+        parts = ceil(width / MAX_BBOX_POLYGON_WIDTH)
+        for part in range(parts):
+            west = box_min_longitude + width * part / parts
+            east = box_min_longitude + width * (part + 1) / parts
+            # the meridian edges are great circles already
+            ring = _parallel(west, east, box_min_latitude, max_edge) + \
+                _parallel(east, west, box_max_latitude, max_edge)
+            polygons.append([[list(position) for position in ring + ring[:1]]])
+    return polygons
+
+
+def _segment_distance(point, start, end):
+    """planar distance of point to the segment from start to end"""
+    delta_x, delta_y = end[0] - start[0], end[1] - start[1]
+    if delta_x == 0 and delta_y == 0:
+        return hypot(point[0] - start[0], point[1] - start[1])
+    position = ((point[0] - start[0]) * delta_x + (point[1] - start[1]) * delta_y) / \
+        (delta_x * delta_x + delta_y * delta_y)
+    position = max(0.0, min(1.0, position))
+    return hypot(point[0] - start[0] - position * delta_x, point[1] - start[1] - position * delta_y)
+
+
+def _unwrapped_longitudes(ring):
+    """longitudes of the ring without the jumps of 360 degrees where edges cross the antimeridian"""
+    longitudes = [ring[0][0]]
+    for longitude, _ in ring[1:]:
+        previous = longitudes[-1]
+        longitudes.append(longitude + 360 * round((previous - longitude) / 360))
+    return longitudes
+
+
+def _orientation(first, second, third):
+    cross_product = (second[0] - first[0]) * (third[1] - first[1]) - (second[1] - first[1]) * (third[0] - first[0])
+    return (cross_product > 0) - (cross_product < 0)
+
+
+def _segments_intersect(start1, end1, start2, end2):
+    orientations = (
+        _orientation(start1, end1, start2), _orientation(start1, end1, end2),
+        _orientation(start2, end2, start1), _orientation(start2, end2, end1)
+    )
+    if orientations[0] != orientations[1] and orientations[2] != orientations[3]:
+        return True
+    # collinear overlaps
+    return any(
+        orientation == 0 and min(start[0], end[0]) <= point[0] <= max(start[0], end[0]) and
+        min(start[1], end[1]) <= point[1] <= max(start[1], end[1])
+        for orientation, (start, end, point) in zip(orientations, (
+            (start1, end1, start2), (start1, end1, end2), (start2, end2, start1), (start2, end2, end1)
+        ))
+    )
+
+
+def is_simple_ring(positions):
+    """whether no two edges of the closed ring of planar positions touch except neighbours at their vertex"""
+    edges = list(zip(positions, positions[1:]))
+    for first_index, (start1, end1) in enumerate(edges):
+        for second_index in range(first_index + 2, len(edges)):
+            if first_index == 0 and second_index == len(edges) - 1:
+                # the first and the last edge share the closing vertex
+                continue
+            start2, end2 = edges[second_index]
+            if _segments_intersect(start1, end1, start2, end2):
+                return False
+    return True
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Douglas-Peucker simplification of a closed ring of (longitude, latitude) positions.
+    tolerance is in meters, the ring is projected to a local equirectangular plane,
+    longitudes continue across the antimeridian.
+    rings which would collapse to less than a triangle or intersect themselves are returned unchanged.
+    """
+    if tolerance <= 0 or len(ring) <= 4:
+        return list(ring)
+    reference_latitude = radians(sum(latitude for _, latitude in ring) / len(ring))
+    projected = [
+        (radians(longitude) * cos(reference_latitude) * EARTH_RADIUS, radians(latitude) * EARTH_RADIUS)
+        for longitude, (_, latitude) in zip(_unwrapped_longitudes(ring), ring)
+    ]
+
+    keep = [False] * len(ring)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(ring) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance, max_index = 0, None
+        for index in range(first + 1, last):
+            distance = _segment_distance(projected[index], projected[first], projected[last])
+            if distance > max_distance:
+                max_distance, max_index = distance, index
+        if max_index is not None and max_distance > tolerance:
+            keep[max_index] = True
+            stack.append((first, max_index))
+            stack.append((max_index, last))
+
+    simplified = [position for position, kept in zip(ring, keep) if kept]
+    if len(simplified) < 4 or not is_simple_ring([position for position, kept in zip(projected, keep) if kept]):
+        return list(ring)
+    return simplified
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from math import ceil, floor
+
+from bson import ObjectId
+
+from database.geo import haversine_distance
+from database.utils import id_obj_to_hex_str
+
+
+def _freeze(filter_data):
+    return json.dumps(filter_data, sort_keys=True, default=str)
+
+
+def _hex_id(_id):
+    return id_obj_to_hex_str(_id) if isinstance(_id, ObjectId) else _id
+
+
+class _CacheEntry(object):
+    def __init__(self, raw_items, expires_at, covers):
+        self.raw_items = raw_items
+        self.ids = set(_hex_id(raw_item['_id']) for raw_item in raw_items)
+        self.expires_at = expires_at
+        # covers(longitude, latitude) tells whether an item written there may belong to the entry
+        self.covers = covers
+
+
+class GeoQueryCache(object):
+    """
+    LRU + TTL cache of raw documents for nearby and within queries.
+
+    nearby queries are quantized: the center is snapped to a grid cell and the radius is rounded up
+    to the next radius_step. the cached documents are the superset of all queries of that cell and
+    radius step, each query filters its exact result out of them.
+    writes invalidate the entries which contain the written item or cover its new location.
+    writes of other processes are noticed by the write generation of the collection, see sync.
+    the instance is shared by the threads of a process, the entries are only touched with the lock held.
+    """
+
+    def __init__(self, location_field="loc", cell_size=0.01, radius_step=500, max_radius=10000,
+                 ttl=10, max_entries=512, max_items=5000, clock=time.monotonic):
+        self.location_field = location_field
+        # in degrees
+        self.cell_size = cell_size
+        # in meters
+        self.radius_step = radius_step
+        self.max_radius = max_radius
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # larger results are returned, but not cached
+        self.max_items = max_items
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # write generation of the collection the entries were built at
+        self.generation = None
+
+    def _coordinates(self, raw_item):
+        return raw_item[self.location_field]['coordinates']
+
+    def _get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry.expires_at < self.clock():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry
+
+    def _put(self, key, raw_items, covers):
+        if len(raw_items) > self.max_items:
+            return
+        entry = _CacheEntry(raw_items, self.clock() + self.ttl, covers)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def is_cacheable_near(self, max_distance):
+        return max_distance <= self.max_radius
+
+    def _near_key(self, longitude, latitude, max_distance, filter_data):
+        cell = (floor(longitude / self.cell_size), floor(latitude / self.cell_size))
+        radius_bucket = max(1, ceil(max_distance / self.radius_step))
+        return 'near', cell, radius_bucket, _freeze(filter_data)
+
+    def near_superset(self, longitude, latitude, max_distance):
+        """center and radius of the circle containing every query of the cell and radius step"""
+        _, (cell_x, cell_y), radius_bucket, _ = self._near_key(longitude, latitude, max_distance, {})
+        center_longitude = (cell_x + 0.5) * self.cell_size
+        center_latitude = (cell_y + 0.5) * self.cell_size
+        half_diagonal = max(
+            haversine_distance(center_longitude, center_latitude, corner_longitude, corner_latitude)
+            for corner_longitude in (cell_x * self.cell_size, (cell_x + 1) * self.cell_size)
+            for corner_latitude in (cell_y * self.cell_size, (cell_y + 1) * self.cell_size)
+        )
+        return center_longitude, center_latitude, radius_bucket * self.radius_step + half_diagonal
+
+    def get_near(self, longitude, latitude, max_distance, min_distance, filter_data, query_fn):
+        """
+        raw documents between min_distance and max_distance sorted by (distance, _id),
+        as list of (distance, raw_item) tuples.
+        query_fn(longitude, latitude, radius) fetches the superset from the database on a miss.
+        """
+        key = self._near_key(longitude, latitude, max_distance, filter_data)
+        entry = self._get(key)
+        if entry is not None:
+            raw_items = entry.raw_items
+        else:
+            center_longitude, center_latitude, radius = self.near_superset(longitude, latitude, max_distance)
+            raw_items = list(query_fn(center_longitude, center_latitude, radius))
+            self._put(key, raw_items, lambda lon, lat: haversine_distance(
+                center_longitude, center_latitude, lon, lat
+            ) <= radius)
+
+        result = []
+        for raw_item in raw_items:
+            distance = haversine_distance(longitude, latitude, *self._coordinates(raw_item))
+            if min_distance <= distance <= max_distance:
+                result.append((distance, raw_item))
+        result.sort(key=lambda distance_and_item: (distance_and_item[0], _hex_id(distance_and_item[1]['_id'])))
+        return result
+
+    def get_within(self, vertices, filter_data, query_fn):
+        vertices = tuple((round(longitude, 6), round(latitude, 6)) for longitude, latitude in vertices)
+        key = 'within', vertices, _freeze(filter_data)
+        entry = self._get(key)
+        if entry is not None:
+            return entry.raw_items
+
+        raw_items = list(query_fn())
+        longitudes = [longitude for longitude, _ in vertices]
+        latitudes = [latitude for _, latitude in vertices]
+        self._put(key, raw_items, lambda lon, lat: (
+            min(longitudes) <= lon <= max(longitudes) and min(latitudes) <= lat <= max(latitudes)
+        ))
+        return raw_items
+
+    def sync(self, generation):
+        """drops all entries if the collection was written since they were built, e.g. by another process"""
+        with self.lock:
+            if generation != self.generation:
+                self.entries.clear()
+                self.generation = generation
+
+    def advance(self, generation):
+        """
+        generation is the write generation after writes of this process, which invalidated their entries.
+        if other processes wrote in between, all entries are dropped.
+        """
+        with self.lock:
+            if self.generation is None or generation != self.generation + 1:
+                self.entries.clear()
+            self.generation = generation
+
+    def invalidate(self, _id, coordinates=None):
+        """drops all entries containing the item or covering its (new) coordinates"""
+        _id = _hex_id(_id)
+        with self.lock:
+            stale_keys = [
+                key for key, entry in self.entries.items()
+                if _id in entry.ids or (coordinates is not None and entry.covers(*coordinates))
+            ]
+            for key in stale_keys:
+                del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
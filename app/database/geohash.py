@@ -0,0 +1,50 @@
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# ~4.8m x 4.8m cells
+DEFAULT_PRECISION = 9
+
+
+def encode(longitude, latitude, precision=DEFAULT_PRECISION):
+    """geohash of the coordinates, every prefix of it is the hash of a cell containing them"""
+    longitude_range = [-180.0, 180.0]
+    latitude_range = [-90.0, 90.0]
+    chars = []
+    bits, bit_count, is_longitude = 0, 0, True
+    while len(chars) < precision:
+        value, value_range = (longitude, longitude_range) if is_longitude else (latitude, latitude_range)
+        middle = (value_range[0] + value_range[1]) / 2
+        if value >= middle:
+            bits = (bits << 1) | 1
+            value_range[0] = middle
+        else:
+            bits <<= 1
+            value_range[1] = middle
+        is_longitude = not is_longitude
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+
+def decode_bbox(geohash):
+    """(min_longitude, min_latitude, max_longitude, max_latitude) of the cell"""
+    longitude_range = [-180.0, 180.0]
+    latitude_range = [-90.0, 90.0]
+    is_longitude = True
+    for char in geohash:
+        bits = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            value_range = longitude_range if is_longitude else latitude_range
+            middle = (value_range[0] + value_range[1]) / 2
+            if bits >> shift & 1:
+                value_range[0] = middle
+            else:
+                value_range[1] = middle
+            is_longitude = not is_longitude
+    return longitude_range[0], latitude_range[0], longitude_range[1], latitude_range[1]
+
+
+def prefix_filter(prefix):
+    """range filter matching all hashes starting with prefix, served by an ascending index"""
+    return {"$gte": prefix, "$lt": prefix + "~"}
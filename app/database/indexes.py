@@ -0,0 +1,47 @@
+from pymongo import ASCENDING, IndexModel
+
+
+class Index(object):
+    def __init__(self, keys, name=None, **options):
+        self.keys = [
+            (key, ASCENDING) if isinstance(key, str) else tuple(key) for key in keys
+        ]
+        # same naming scheme as mongodb uses for indexes without an explicit name
+        self.name = name or "_".join(
+            "{}_{}".format(field, direction) for field, direction in self.keys
+        )
+        self.options = options
+
+    def __eq__(self, other):
+        return isinstance(other, Index) and (self.keys, self.name, self.options) == (
+            other.keys, other.name, other.options
+        )
+
+    def __repr__(self):
+        return "{classname}({keys})".format(classname=self.__class__.__name__, keys=self.keys)
+
+    def to_index_model(self, background=True):
+        return IndexModel(self.keys, name=self.name, background=background, **self.options)
+
+
+def missing_indexes(declared, existing_index_information):
+    existing_keys = [
+        [tuple(key) for key in info['key']] for info in existing_index_information.values()
+    ]
+    return [
+        index for index in declared if index.keys not in existing_keys
+    ]
+
+
+def ensure_indexes(collection, declared, background=True):
+    """
+    creates all declared indexes which do not exist on the collection yet.
+    indexes are compared by their keys, so an existing index with another name is not rebuilt.
+    returns the names of the created indexes.
+    """
+    missing = missing_indexes(declared, collection.index_information())
+    if not missing:
+        return []
+    return collection.create_indexes([
+        index.to_index_model(background=background) for index in missing
+    ])
@@ -1,21 +1,375 @@
-from pymongo import GEOSPHERE
+import threading
 
+from bson import SON
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+
+from database import geohash
+
+from database.clusters import ClusterGrid
+from database.exceptions import SpatialIndexFullError
+from database.geo import BBOX_EDGE_MARGIN, EARTH_RADIUS, bbox_polygons, split_bbox
 from database.manager import Manager
+from database.pagination import Page, decode_distance_cursor, encode_distance_cursor
+from database.utils import hex_str_to_id_obj, id_obj_to_hex_str
+
+# distances computed here and by mongodb may differ slightly,
+# items this close to the last distance of a page are excluded by id instead.
+DISTANCE_TOLERANCE = 0.5
+# the spatial index holds the items matching this filter, the default filter of the views
+SPATIAL_INDEX_FILTER = {'deleted': False}
 
 
 class LocationManager(Manager):
-    def __init__(self, content_class, location_field="loc", *args, **kwargs):
+    def __init__(self, content_class, location_field="loc", *args, distance_field="distance", score_field="score",
+                 cell_field=None, cell_precision=geohash.DEFAULT_PRECISION, query_cache=None, spatial_index=None,
+                 cluster_cache=None, **kwargs):
         super().__init__(content_class, *args, **kwargs)
         self.location_field = location_field
-        self.collection.create_index([
-            (location_field, GEOSPHERE)
-        ])
+        # ranks the items when a result has to be capped, see get_in_bbox
+        self.score_field = score_field
+        # optional geohash of the location, written on every save
+        self.cell_field = cell_field
+        self.cell_precision = cell_precision
+        # set on the items returned by get_near_with_distance and get_near_page
+        self.distance_field = distance_field
+        # optional GeoQueryCache for get_near / get_within
+        self.query_cache = query_cache
+        if query_cache is not None:
+            self.add_write_listener(self._invalidate_query_cache)
+            self.add_write_done_listener(self._advance_query_cache)
+        self.spatial_index = None
+        self._spatial_index_lock = threading.Lock()
+        # writes during a refresh of the spatial index, replayed on the refreshed one. None if no refresh runs.
+        self._spatial_index_writes = None
+        self.spatial_index_refresh = None
+        if spatial_index is not None:
+            self.enable_spatial_index(spatial_index)
+        # optional ClusterCache for get_clusters
+        self.cluster_cache = cluster_cache
+        self.cluster_grid = cluster_cache.grid if cluster_cache is not None else ClusterGrid()
+        if cluster_cache is not None:
+            self.add_write_listener(self._invalidate_cluster_cache)
+
+    def reset(self):
+        super().reset()
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        if self.spatial_index is not None:
+            self.spatial_index.clear()
+        if self.cluster_cache is not None:
+            self.cluster_cache.clear()
+
+    def enable_spatial_index(self, spatial_index):
+        """answer candidate lookups from an in-process GridSpatialIndex, see warm_up_spatial_index"""
+        if self.spatial_index is None:
+            self.add_write_listener(self._update_spatial_index)
+        self.spatial_index = spatial_index
+
+    def _load_spatial_index(self, collection):
+        """a new index like the current one holding the locations of all indexed items"""
+        spatial_index = self.spatial_index.new_empty()
+        raw_items = collection.find(
+            SPATIAL_INDEX_FILTER, projection={self.location_field: True, self.score_field: True}
+        )
+        try:
+            spatial_index.warm_up(raw_items, location_field=self.location_field, score_field=self.score_field)
+        except SpatialIndexFullError:
+            pass
+        return spatial_index
+
+    def _replace_spatial_index(self, spatial_index):
+        with self._spatial_index_lock:
+            for _id, item in self._spatial_index_writes or ():
+                self._write_to_spatial_index(spatial_index, _id, item)
+            self._spatial_index_writes = None
+            self.spatial_index = spatial_index
+
+    def warm_up_spatial_index(self):
+        """loads the locations of all indexed items, returns their count or None if the index is full"""
+        with self._spatial_index_lock:
+            self._spatial_index_writes = []
+        try:
+            spatial_index = self._load_spatial_index(self.collection)
+        except Exception:
+            with self._spatial_index_lock:
+                self._spatial_index_writes = None
+            raise
+        self._replace_spatial_index(spatial_index)
+        return None if spatial_index.full else len(spatial_index)
+
+    def _refresh_spatial_index(self):
+        """warms up a new index in a background thread, queries use the current one meanwhile"""
+        with self._spatial_index_lock:
+            if self._spatial_index_writes is not None:
+                # a refresh is running already
+                return
+            self._spatial_index_writes = []
+        # the database is only reachable from the request, the thread gets the collection
+        collection = self.collection
+
+        def refresh():
+            try:
+                spatial_index = self._load_spatial_index(collection)
+            except Exception:
+                with self._spatial_index_lock:
+                    self._spatial_index_writes = None
+                raise
+            self._replace_spatial_index(spatial_index)
+
+        self.spatial_index_refresh = threading.Thread(target=refresh, daemon=True)
+        self.spatial_index_refresh.start()
+
+    def _write_to_spatial_index(self, spatial_index, _id, item):
+        if item is None or item.deleted():
+            spatial_index.remove(_id)
+            return
+        location = getattr(item, self.location_field)
+        try:
+            spatial_index.add(_id, location.longitude, location.latitude, getattr(item, self.score_field, 0) or 0)
+        except SpatialIndexFullError:
+            pass
+
+    def _update_spatial_index(self, manager, _id, item):
+        with self._spatial_index_lock:
+            if self._spatial_index_writes is not None:
+                self._spatial_index_writes.append((_id, item))
+            self._write_to_spatial_index(self.spatial_index, _id, item)
+
+    def _uses_spatial_index(self, additional_filter_data, kwargs):
+        if self.spatial_index is None or not set(kwargs) <= {'fields'} or \
+                additional_filter_data != SPATIAL_INDEX_FILTER:
+            return False
+        # a full index is not warmed up again by itself, it would fill up again
+        if not self.spatial_index.full and self.spatial_index.is_stale():
+            self._refresh_spatial_index()
+        # a stale index answers until the refreshed one replaces it
+        return self.spatial_index.ready
+
+    def _spatial_index_near(self, longitude, latitude, max_distance, min_distance):
+        # writes change the cells of the index, queries iterate them
+        with self._spatial_index_lock:
+            return self.spatial_index.near(longitude, latitude, max_distance, min_distance)
+
+    def _spatial_index_within(self, vertices):
+        with self._spatial_index_lock:
+            return self.spatial_index.within(vertices)
+
+    def _find_by_ids(self, ids, fields=None):
+        """raw documents of the ids in the order of ids, the index may still list removed items"""
+        filter_data = SPATIAL_INDEX_FILTER.copy()
+        filter_data['_id'] = {'$in': ids}
+        raw_items = {
+            raw_item['_id']: raw_item for raw_item in
+            self.collection.find(filter_data, projection=self._projection(fields))
+        } if ids else {}
+        return [raw_items[_id] for _id in ids if _id in raw_items]
+
+    def _cell_of(self, location):
+        return geohash.encode(location.longitude, location.latitude, self.cell_precision)
+
+    def _set_cell(self, item):
+        if self.cell_field is None:
+            return
+        location = getattr(item, self.location_field, None)
+        setattr(item, self.cell_field, self._cell_of(location) if location is not None else None)
+
+    def _prepare_save(self, item):
+        self._set_cell(item)
+
+    def backfill_cells(self, batch_size=500):
+        """writes the cell of all documents without one, returns their count"""
+        raw_items = self.collection.find(
+            {self.cell_field: {"$exists": False}, self.location_field: {"$exists": True}},
+            projection={self.location_field: True}
+        )
+        count, updates = 0, []
+        for raw_item in raw_items:
+            longitude, latitude = raw_item[self.location_field]['coordinates']
+            updates.append(UpdateOne(
+                {'_id': raw_item['_id']},
+                {'$set': {self.cell_field: geohash.encode(longitude, latitude, self.cell_precision)}}
+            ))
+            if len(updates) >= batch_size:
+                count += self.collection.bulk_write(updates, ordered=False).modified_count
+                updates = []
+        if updates:
+            count += self.collection.bulk_write(updates, ordered=False).modified_count
+        return count
+
+    def get_in_cell(self, prefix, additional_filter_data={}, **kwargs):
+        """items whose cell starts with the geohash prefix, a range query on the cell index"""
+        filter_data = additional_filter_data.copy()
+        filter_data[self.cell_field] = geohash.prefix_filter(prefix)
+        return super().get(filter_data, **kwargs)
+
+    def _invalidate_query_cache(self, manager, _id, item):
+        location = getattr(item, self.location_field, None) if item is not None else None
+        coordinates = (location.longitude, location.latitude) if location is not None else None
+        self.query_cache.invalidate(_id, coordinates)
+
+    def _advance_query_cache(self, manager):
+        self.query_cache.advance(self.bump_write_generation())
+
+    def _invalidate_cluster_cache(self, manager, _id, item):
+        if item is None:
+            # the location of a removed item is unknown
+            self.cluster_cache.clear()
+            return
+        location = getattr(item, self.location_field)
+        self.cluster_cache.invalidate(location.longitude, location.latitude)
+
+    def _uses_query_cache(self, kwargs):
+        # the cache serves plain queries, streams and other find options go to the database
+        if self.query_cache is None or not set(kwargs) <= {'fields'}:
+            return False
+        # a primary key lookup, which drops the entries if another process wrote
+        self.query_cache.sync(self.write_generation())
+        return True
+
+    def _get_near_cached(self, location, max_distance, min_distance, additional_filter_data, kwargs={}):
+        """
+        list of (distance, raw_item) sorted by (distance, _id), filtered out of the cached superset.
+        None if the query cache does not serve the query.
+        """
+        if self.query_cache is None or max_distance is None or not self.query_cache.is_cacheable_near(max_distance) \
+                or not self._uses_query_cache(kwargs):
+            return None
+
+        def query_superset(longitude, latitude, radius):
+            return self.collection.find(self._build_sphere_filter(longitude, latitude, radius, additional_filter_data))
+
+        return self.query_cache.get_near(
+            location.longitude, location.latitude, max_distance, min_distance,
+            additional_filter_data, query_superset
+        )
+
+    @staticmethod
+    def _sort_cached(near, sort):
+        """
+        sorts (distance, raw_item) sorted by (distance, _id) by the fields of sort first, like mongodb
+        sorts with missing values first. raises TypeError if the values of a field can not be compared.
+        """
+        for field_name, direction in reversed(list(sort)):
+            near.sort(
+                key=lambda distance_and_item: (
+                    distance_and_item[1].get(field_name) is not None, distance_and_item[1].get(field_name)
+                ),
+                reverse=direction == DESCENDING
+            )
+        return near
 
     def _build_filter_data(self, base_filter, location_filter):
         filter_data = base_filter.copy()
         filter_data[self.location_field] = location_filter
         return filter_data
 
+    def _build_sphere_filter(self, longitude, latitude, max_distance, additional_filter_data, min_distance=0):
+        """unsorted filter for the items between min_distance and max_distance, usable with limits and counts"""
+        location_filter = {
+            "$geoWithin": {
+                "$centerSphere": [[longitude, latitude], max_distance / EARTH_RADIUS]
+            }
+        }
+        if min_distance:
+            location_filter["$not"] = {
+                "$geoWithin": {
+                    "$centerSphere": [[longitude, latitude], min_distance / EARTH_RADIUS]
+                }
+            }
+        return self._build_filter_data(additional_filter_data, location_filter)
+
+    def _build_near_filter(self, location, max_distance, additional_filter_data, min_distance):
+        return self._build_filter_data(
+            additional_filter_data,
+            {
+                "$near": {
+                    "$geometry": {
+                        "type": "Point",
+                        "coordinates": [location.longitude, location.latitude]
+                    },
+                    "$maxDistance": max_distance,
+                    "$minDistance": min_distance
+                }
+            }
+
+        )
+
+    def _fields_with_distance(self, fields):
+        return None if fields is None else set(fields) | {self.distance_field}
+
+    def _without_added_fields(self, items, fields):
+        """the distance is loaded for sorting and cursors, it is only serialized if it was requested"""
+        if fields is not None:
+            for item in items:
+                item.serialize_only(fields)
+        return items
+
+    def _with_distance(self, raw_item, distance):
+        # cached documents are shared between queries, so the distance goes to a copy
+        raw_item = dict(raw_item)
+        raw_item[self.distance_field] = distance
+        return raw_item
+
+    def _build_geo_near_pipeline(self, location, max_distance, additional_filter_data, min_distance,
+                                 limit=None, sort=None, fields=None):
+        pipeline = [{
+            "$geoNear": {
+                "near": {
+                    "type": "Point",
+                    "coordinates": [location.longitude, location.latitude]
+                },
+                # there is a second 2dsphere index on (deleted, location), so the key is required
+                "key": self.location_field,
+                "distanceField": self.distance_field,
+                "minDistance": min_distance,
+                "query": additional_filter_data,
+                "spherical": True
+            }
+        }]
+        if max_distance is not None:
+            pipeline[0]["$geoNear"]["maxDistance"] = max_distance
+        if limit is not None:
+            pipeline.append({"$limit": limit})
+        if sort:
+            pipeline.append({"$sort": SON(
+                list(sort) + [(self.distance_field, ASCENDING), ("_id", ASCENDING)]
+            )})
+        if fields is not None:
+            pipeline.append({"$project": self._projection(fields)})
+        return pipeline
+
+    def get_near_with_distance(self, location, max_distance, limit=None, sort=None, additional_filter_data={},
+                               min_distance=None, fields=None):
+        """
+        items near location carrying their distance in meters, computed by a $geoNear aggregation.
+        limit keeps the nearest items, sort, e.g. [('score', DESCENDING)], orders them afterwards.
+        """
+        near = self._get_near_cached(location, max_distance, min_distance or 0, additional_filter_data)
+        if near is not None:
+            try:
+                near = self._sort_cached(near[:limit], sort or [])
+            except TypeError:
+                # values of different types, mongodb orders them by type
+                near = None
+        if near is not None:
+            return self._without_added_fields(self._load(
+                [self._with_distance(raw_item, distance) for distance, raw_item in near],
+                many=True, fields=self._fields_with_distance(fields)
+            ), fields)
+        pipeline = self._build_geo_near_pipeline(
+            location, max_distance, additional_filter_data, min_distance or 0, limit=limit, sort=sort,
+            fields=self._fields_with_distance(fields)
+        )
+        return self._without_added_fields(self._load(
+            list(self.collection.aggregate(pipeline)), many=True, fields=self._fields_with_distance(fields)
+        ), fields)
+
+    def get_k_nearest(self, location, k, max_distance=None, additional_filter_data={}, fields=None):
+        """the k items closest to location with their distance, optionally not farther than max_distance"""
+        return self.get_near_with_distance(
+            location, max_distance, limit=k, additional_filter_data=additional_filter_data, fields=fields
+        )
+
     def get_within(self, vertices, additional_filter_data={}, **kwargs):
         filter_data = self._build_filter_data(
             additional_filter_data,
@@ -28,24 +382,322 @@ class LocationManager(Manager):
                 }
             }
         )
+        if self._uses_spatial_index(additional_filter_data, kwargs):
+            ids = self._spatial_index_within([(vertex.longitude, vertex.latitude) for vertex in vertices])
+            return self._load(self._find_by_ids(ids, kwargs.get('fields')), many=True, fields=kwargs.get('fields'))
+        if self._uses_query_cache(kwargs):
+            raw_items = self.query_cache.get_within(
+                [(vertex.longitude, vertex.latitude) for vertex in vertices],
+                additional_filter_data,
+                lambda: self.collection.find(filter_data)
+            )
+            return self._load(raw_items, many=True, fields=kwargs.get('fields'))
         return super().get(filter_data, **kwargs)
 
-    def get_near(self, location, max_distance, additional_filter_data={}, min_distance=None, **kwargs):
-        # min_distance is optional. set it to 0 if None is given.
-        # required to do this way in order to allow to pass min_distance=None.
-        min_distance = min_distance or 0
+    def get_within_geometry(self, geometry, additional_filter_data={}, **kwargs):
+        """items inside a GeoJSON Polygon or MultiPolygon, on the sphere and using the 2dsphere index"""
         filter_data = self._build_filter_data(
             additional_filter_data,
             {
-                "$near": {
-                    "$geometry": {
-                        "type": "Point",
-                        "coordinates": [location.longitude, location.latitude]
-                    },
-                    "$maxDistance": max_distance,
-                    "$minDistance": min_distance
+                "$geoWithin": {
+                    "$geometry": geometry.serialize()
                 }
             }
+        )
+        return super().get(filter_data, **kwargs)
 
+    def _build_bbox_filter(self, boxes, additional_filter_data):
+        """
+        filter for the items inside any of the boxes, None if the boxes are empty.
+        legacy $box shapes can not use the 2dsphere index, the boxes become densified GeoJSON polygons.
+        """
+        location_filters = [
+            {"$geoWithin": {"$geometry": {"type": "Polygon", "coordinates": coordinates}}}
+            for box in boxes for coordinates in bbox_polygons(*box)
+        ]
+        if not location_filters:
+            return None
+        if len(location_filters) == 1:
+            return self._build_filter_data(additional_filter_data, location_filters[0])
+        filter_data = additional_filter_data.copy()
+        filter_data["$or"] = [
+            {self.location_field: location_filter} for location_filter in location_filters
+        ]
+        return filter_data
+
+    def get_in_bbox(self, min_longitude, min_latitude, max_longitude, max_latitude, additional_filter_data={},
+                    limit=None, **kwargs):
+        """
+        items inside the bounding box, a box with min_longitude > max_longitude crosses the antimeridian.
+        with a limit, the highest scored items of a dense box are returned.
+        """
+        boxes = split_bbox(min_longitude, min_latitude, max_longitude, max_latitude)
+        if self._uses_spatial_index(additional_filter_data, kwargs):
+            ids = self.spatial_index.in_boxes(boxes, limit=limit)
+            return self._load(self._find_by_ids(ids, kwargs.get('fields')), many=True, fields=kwargs.get('fields'))
+
+        filter_data = self._build_bbox_filter(boxes, additional_filter_data)
+        if filter_data is None:
+            return iter(()) if kwargs.get('stream') else []
+        if limit is None:
+            return super().get(filter_data, **kwargs)
+        return self._find_and_load(
+            filter_data, sort=[(self.score_field, DESCENDING), ('_id', ASCENDING)], limit=limit, **kwargs
         )
+
+    def _aggregate_clusters(self, zoom, boxes, additional_filter_data):
+        cell_size = self.cluster_grid.cell_size(zoom)
+        coordinates = "$" + self.location_field + ".coordinates"
+        longitude = {"$arrayElemAt": [coordinates, 0]}
+        latitude = {"$arrayElemAt": [coordinates, 1]}
+        # the index finds the items of slightly larger polygons, the planar boxes decide the border
+        filter_data = self._build_bbox_filter([
+            (box[0], max(box[1] - BBOX_EDGE_MARGIN, -90), box[2], min(box[3] + BBOX_EDGE_MARGIN, 90))
+            for box in boxes
+        ], additional_filter_data)
+        if filter_data is None:
+            return []
+        in_boxes = {"$or": [
+            {"$and": [
+                {"$gte": [longitude, box[0]]}, {"$lte": [longitude, box[2]]},
+                {"$gte": [latitude, box[1]]}, {"$lte": [latitude, box[3]]}
+            ]} for box in boxes
+        ]}
+        pipeline = [
+            {"$match": filter_data},
+            {"$match": {"$expr": in_boxes}},
+            {"$group": {
+                "_id": {
+                    "x": {"$floor": {"$divide": [{"$add": [longitude, 180]}, cell_size]}},
+                    "y": {"$floor": {"$divide": [{"$add": [latitude, 90]}, cell_size]}}
+                },
+                "count": {"$sum": 1},
+                "longitude": {"$avg": longitude},
+                "latitude": {"$avg": latitude},
+                # documents compare field by field, so this is the highest score and the newest _id of it
+                "top": {"$max": {"score": "$" + self.score_field, "_id": "$_id"}}
+            }}
+        ]
+        count_x, count_y = self.cluster_grid.tile_counts(zoom)
+        max_cell_x = count_x * self.cluster_grid.cells_per_tile - 1
+        max_cell_y = count_y * self.cluster_grid.cells_per_tile - 1
+        return [
+            {
+                "cell": [zoom, min(int(raw["_id"]["x"]), max_cell_x), min(int(raw["_id"]["y"]), max_cell_y)],
+                "count": raw["count"],
+                "longitude": raw["longitude"],
+                "latitude": raw["latitude"],
+                "top_id": id_obj_to_hex_str(raw["top"]["_id"])
+            } for raw in self.collection.aggregate(pipeline)
+        ]
+
+    def get_clusters(self, min_longitude, min_latitude, max_longitude, max_latitude, zoom,
+                     additional_filter_data={}):
+        """
+        clusters of the items in the bounding box as dicts with the cell [zoom, x, y], the item count,
+        the centroid and the _id of the top scored item, see database.clusters.ClusterGrid.
+        clusters are computed for whole tiles, so cells at the border count their items outside the box, too.
+        """
+        grid = self.cluster_grid
+        boxes = split_bbox(min_longitude, min_latitude, max_longitude, max_latitude)
+        tiles_per_box = [grid.tiles(zoom, box) for box in boxes]
+
+        clusters_per_tile = {}
+        if self.cluster_cache is not None:
+            for tiles in tiles_per_box:
+                for tile in tiles:
+                    cached = self.cluster_cache.get(zoom, tile, additional_filter_data)
+                    if cached is not None:
+                        clusters_per_tile[tile] = cached
+
+        missing_per_box = [[tile for tile in tiles if tile not in clusters_per_tile] for tiles in tiles_per_box]
+        query_boxes = [grid.tiles_box(zoom, missing) for missing in missing_per_box if missing]
+        if query_boxes:
+            fetched_per_tile = {}
+            for cluster in self._aggregate_clusters(zoom, query_boxes, additional_filter_data):
+                fetched_per_tile.setdefault(grid.tile_of_cell(*cluster["cell"][1:]), []).append(cluster)
+            for missing in missing_per_box:
+                for tile in missing:
+                    clusters_per_tile[tile] = fetched_per_tile.get(tile, [])
+                    if self.cluster_cache is not None:
+                        self.cluster_cache.put(zoom, tile, additional_filter_data, clusters_per_tile[tile])
+
+        return [
+            cluster for tiles in tiles_per_box for tile in tiles for cluster in clusters_per_tile[tile]
+            if any(grid.cell_in_box(zoom, cluster["cell"][1], cluster["cell"][2], box) for box in boxes)
+        ]
+
+    def count_near(self, location, max_distance, additional_filter_data={}, min_distance=None, limit=None):
+        """number of items in the distance range, counting stops at limit"""
+        near = self._get_near_cached(location, max_distance, min_distance or 0, additional_filter_data)
+        if near is not None:
+            return min(len(near), limit) if limit else len(near)
+        return self.count(self._build_sphere_filter(
+            location.longitude, location.latitude, max_distance, additional_filter_data, min_distance or 0
+        ), limit=limit)
+
+    def get_near(self, location, max_distance, additional_filter_data={}, min_distance=None, sort_by_distance=True,
+                 **kwargs):
+        # min_distance is optional. set it to 0 if None is given.
+        # required to do this way in order to allow to pass min_distance=None.
+        min_distance = min_distance or 0
+        if self._uses_spatial_index(additional_filter_data, kwargs):
+            near = self._spatial_index_near(location.longitude, location.latitude, max_distance, min_distance)
+            distances = dict((_id, distance) for distance, _id in near)
+            raw_items = [
+                self._with_distance(raw_item, distances[raw_item['_id']]) for raw_item in
+                self._find_by_ids([_id for _, _id in near], kwargs.get('fields'))
+            ]
+            return self._without_added_fields(self._load(
+                raw_items, many=True, fields=self._fields_with_distance(kwargs.get('fields'))
+            ), kwargs.get('fields'))
+        near = self._get_near_cached(location, max_distance, min_distance, additional_filter_data, {
+            key: value for key, value in kwargs.items() if key != 'stream'
+        })
+        if near is not None:
+            items = self._without_added_fields(self._load(
+                [self._with_distance(raw_item, distance) for distance, raw_item in near],
+                many=True, fields=self._fields_with_distance(kwargs.get('fields'))
+            ), kwargs.get('fields'))
+            # cached results are bounded by max_items, a stream of them is a plain iterator
+            return iter(items) if kwargs.get('stream') else items
+
+        if not sort_by_distance:
+            # $near always sorts by distance, which is expensive for large radii
+            filter_data = self._build_sphere_filter(
+                location.longitude, location.latitude, max_distance, additional_filter_data, min_distance
+            )
+        else:
+            filter_data = self._build_near_filter(location, max_distance, additional_filter_data, min_distance)
         return super().get(filter_data, **kwargs)
+
+    def _near_items(self, location, max_distance, min_distance, additional_filter_data, exclude_ids, limit, fields,
+                    by_id=False, after_id=None):
+        """
+        up to limit items between min_distance and max_distance carrying their distance, sorted by distance.
+        by_id sorts them by _id instead, starting behind after_id.
+        """
+        def is_wanted(_id):
+            return _id not in exclude_ids and (after_id is None or _id > after_id)
+
+        if self._uses_spatial_index(additional_filter_data, {}):
+            near = [
+                (distance, _id) for distance, _id in
+                self._spatial_index_near(location.longitude, location.latitude, max_distance, min_distance)
+                if is_wanted(_id)
+            ]
+            if by_id:
+                near.sort(key=lambda distance_and_id: distance_and_id[1])
+            distances = dict((_id, distance) for distance, _id in near)
+            ids = [_id for _, _id in near]
+            raw_items, offset = [], 0
+            # ids of items removed by other processes come back empty, the gap is filled by the next ids
+            while len(raw_items) < limit and offset < len(ids):
+                chunk = ids[offset:offset + limit - len(raw_items)]
+                offset += len(chunk)
+                raw_items += self._find_by_ids(chunk, fields)
+            return self._load([
+                self._with_distance(raw_item, distances[raw_item['_id']]) for raw_item in raw_items
+            ], many=True, fields=fields)
+        near = self._get_near_cached(location, max_distance, min_distance, additional_filter_data)
+        if near is not None:
+            # the page is cut out of the cached superset
+            near = [(distance, raw_item) for distance, raw_item in near if is_wanted(raw_item['_id'])]
+            if by_id:
+                near.sort(key=lambda distance_and_item: distance_and_item[1]['_id'])
+            return self._load([
+                self._with_distance(raw_item, distance) for distance, raw_item in near[:limit]
+            ], many=True, fields=fields)
+
+        query = additional_filter_data.copy()
+        id_filter = {}
+        if exclude_ids:
+            id_filter['$nin'] = exclude_ids
+        if after_id is not None:
+            id_filter['$gt'] = after_id
+        if id_filter:
+            query['_id'] = id_filter
+        if not by_id:
+            pipeline = self._build_geo_near_pipeline(
+                location, max_distance, query, min_distance, limit=limit, fields=fields
+            )
+        else:
+            pipeline = self._build_geo_near_pipeline(location, max_distance, query, min_distance)
+            pipeline += [{"$sort": {"_id": ASCENDING}}, {"$limit": limit}]
+            if fields is not None:
+                pipeline.append({"$project": self._projection(fields)})
+        return self._load(list(self.collection.aggregate(pipeline)), many=True, fields=fields)
+
+    def get_near_page(self, location, max_distance, limit, after=None, additional_filter_data={}, min_distance=None,
+                      fields=None, sort_by_distance=True):
+        """
+        one page of the items near location, sorted by distance.
+        the next page continues at the distance of the last item by moving $minDistance forward,
+        so every page costs the same no matter how many pages were read before.
+        items sharing the distance of a whole page are paged by _id, so a cursor holds at most one page of ids.
+        unsorted pages are paged by _id instead.
+        """
+        min_distance = min_distance or 0
+        if not sort_by_distance:
+            return self.get_page(self._build_sphere_filter(
+                location.longitude, location.latitude, max_distance, additional_filter_data, min_distance
+            ), limit, after=after, fields=fields)
+        cursor = decode_distance_cursor(after) if after is not None else None
+        floor_distance = None
+        if cursor is not None:
+            floor_distance = cursor.min_distance
+            min_distance = max(min_distance, cursor.distance - DISTANCE_TOLERANCE, floor_distance or 0)
+
+        requested_fields = fields
+        # the distance of the last item is needed for the cursor
+        fields = self._fields_with_distance(fields)
+
+        band = None
+        if cursor is not None:
+            band_max_distance = min(cursor.distance + DISTANCE_TOLERANCE, max_distance)
+        if cursor is not None and cursor.after_id is not None:
+            band = self._near_items(
+                location, band_max_distance, min_distance, additional_filter_data, cursor.ids, limit + 1, fields,
+                by_id=True, after_id=cursor.after_id
+            )
+        else:
+            items = self._near_items(
+                location, max_distance, min_distance, additional_filter_data, cursor.ids if cursor else [],
+                limit + 1, fields
+            )
+            if cursor is not None and len(items) > limit and \
+                    getattr(items[limit - 1], self.distance_field) - cursor.distance <= DISTANCE_TOLERANCE:
+                # the whole page is at the distance of the previous cursor. paging on by distance would need
+                # the ids of every item at it in the cursor, so the items at it are paged by _id instead.
+                band = self._near_items(
+                    location, band_max_distance, min_distance, additional_filter_data, cursor.ids, limit + 1,
+                    fields, by_id=True
+                )
+        if band is not None:
+            if len(band) > limit:
+                return Page(self._without_added_fields(band[:limit], requested_fields), encode_distance_cursor(
+                    cursor.distance, cursor.ids, after_id=band[limit - 1]._id, min_distance=floor_distance
+                ))
+            # every item at the distance was returned, the page goes on behind them
+            items = band
+            floor_distance = band_max_distance
+            if band_max_distance < max_distance:
+                items = items + self._near_items(
+                    location, max_distance, band_max_distance, additional_filter_data,
+                    [hex_str_to_id_obj(item._id) for item in band], limit + 1 - len(band), fields
+                )
+        if len(items) <= limit:
+            return Page(self._without_added_fields(items, requested_fields), None)
+
+        items = items[:limit]
+        distances = [getattr(item, self.distance_field) for item in items]
+        # the items of a band are not sorted by distance
+        page_last_distance = max(distances)
+        boundary_ids = [
+            item._id for item, distance in zip(items, distances)
+            if distance >= page_last_distance - DISTANCE_TOLERANCE
+        ]
+        return Page(
+            self._without_added_fields(items, requested_fields),
+            encode_distance_cursor(page_last_distance, boundary_ids, min_distance=floor_distance)
+        )
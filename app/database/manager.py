@@ -1,25 +1,106 @@
 from copy import copy
 
-from database.exceptions import LoadError, InsertFailedError, UpdateFailedError, NotFoundError
+from bson import ObjectId
+from pymongo import ASCENDING, DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from database.exceptions import (
+    DeletionFailedException, LoadError, InsertFailedError, UpdateFailedError, NotFoundError
+)
+from database.indexes import ensure_indexes
+from database.pagination import Page, decode_cursor, encode_cursor
+from database.unit_of_work import current_unit_of_work
 from database.utils import hex_str_to_id_obj, id_obj_to_hex_str
+from models.batch_loader import batch_loading
 from models.db import get_db
+from models.reference_validation import referenceValidator
+
+
+# one write counter per collection, see Manager.bump_write_generation
+WRITE_GENERATIONS_COLLECTION = "write_generations"
 
 
 class Manager(object):
+    # documents per round trip and per batch of resolved references when streaming
+    stream_batch_size = 200
+    # documents per round trip of save_many, update_many_items and delete_many_ids
+    bulk_batch_size = 1000
 
     @property
     def collection(self):
-        return get_db()[self.collection_name]
+        if self._collection is None:
+            self._collection = get_db()[self.collection_name]
+        return self._collection
 
     def __init__(self, content_class, table_name=None):
         self.collection_name = table_name or content_class.__name__
         self.content_class = content_class
+        self._collection = None
+        self.write_listeners = []
+        self.write_done_listeners = []
+
+    def reset(self):
+        self._collection = None
+
+    def add_write_listener(self, listener):
+        """
+        listener(manager, _id, item) is called after an item was written.
+        item is None if it was deleted, _id is a hex string.
+        """
+        self.write_listeners.append(listener)
+
+    def add_write_done_listener(self, listener):
+        """listener(manager) is called once after each call which wrote items, after the write listeners"""
+        self.write_done_listeners.append(listener)
+
+    def _notify_write(self, _id, item=None):
+        if not isinstance(_id, str):
+            _id = id_obj_to_hex_str(_id)
+        for listener in self.write_listeners:
+            listener(self, _id, item)
+
+    def _notify_write_done(self):
+        for listener in self.write_done_listeners:
+            listener(self)
+
+    def write_generation(self):
+        """number of write calls counted by bump_write_generation, shared by all processes"""
+        raw = get_db()[WRITE_GENERATIONS_COLLECTION].find_one({'_id': self.collection_name})
+        return raw['generation'] if raw is not None else 0
+
+    def bump_write_generation(self):
+        """counts a write call of any process, returns the new generation"""
+        raw = get_db()[WRITE_GENERATIONS_COLLECTION].find_one_and_update(
+            {'_id': self.collection_name}, {'$inc': {'generation': 1}},
+            upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return raw['generation']
+
+    def ensure_indexes(self, background=True):
+        return ensure_indexes(
+            self.collection, self.content_class.get_indexes(), background=background
+        )
 
-    def _load(self, raw_data, many=False):
-        schema = self.content_class.get_scheme_cls()(many=many)
-        loaded = schema.load(raw_data)
+    def _projection(self, fields):
+        if fields is None:
+            return None
+        return dict.fromkeys(fields, True)
+
+    def _load(self, raw_data, many=False, fields=None):
+        schema = self.content_class.get_schema(many=many, only=fields)
+        if many:
+            raw_data = list(raw_data)
+        # references of all loaded items are resolved together, see models.batch_loader
+        with batch_loading():
+            loaded = schema.load(raw_data)
         if loaded.errors:
             raise LoadError(loaded.errors)
+        # the raw documents tell which fields an update has to write
+        if many:
+            for item, raw_item in zip(loaded.data, raw_data):
+                item.snapshot(raw_item)
+        else:
+            loaded.data.snapshot(raw_data)
         return loaded.data
 
     def get_one_by_id(self, _id, filter_data={}, **kwargs):
@@ -27,52 +108,324 @@ class Manager(object):
         filter_data['_id'] = hex_str_to_id_obj(_id)
         return self.get_one(filter_data, **kwargs)
 
-    def get_one(self, filter_data, **kwargs):
+    def get_one(self, filter_data, fields=None, **kwargs):
+        if fields is not None:
+            kwargs['projection'] = self._projection(fields)
         raw_data = self.collection.find_one(filter_data, **kwargs)
         if not raw_data:
             raise NotFoundError(self.collection, filter_data)
-        return self._load(raw_data)
+        return self._load(raw_data, fields=fields)
+
+    def _build_after_filter(self, filter_data, after):
+        after_filter = {'_id': {'$gt': decode_cursor(after)}}
+        if '_id' in filter_data:
+            return {'$and': [filter_data, after_filter]}
+        return dict(filter_data, **after_filter)
 
-    def get(self, filter_data, **kwargs):
+    def get(self, filter_data, limit=None, after=None, stream=False, **kwargs):
+        # limit / after switch to keyset pagination on _id: the cost of a page does not depend on its depth
+        if limit is not None or after is not None:
+            if after is not None:
+                filter_data = self._build_after_filter(filter_data, after)
+            kwargs.setdefault('sort', [('_id', ASCENDING)])
+            if limit is not None:
+                kwargs['limit'] = limit
+        if stream:
+            return self._find_and_iterate(filter_data, **kwargs)
+        return self._find_and_load(filter_data, **kwargs)
+
+    def _find_and_load(self, filter_data, fields=None, **kwargs):
+        if fields is not None:
+            kwargs['projection'] = self._projection(fields)
         raw_data = self.collection.find(filter_data, show_record_id=True, **kwargs)
-        return self._load(raw_data, many=True)
+        return self._load(raw_data, many=True, fields=fields)
+
+    def _find_and_iterate(self, filter_data, batch_size=None, fields=None, **kwargs):
+        """
+        generator over the matching items, which holds at most one batch of documents in memory.
+        the references of each batch are resolved together.
+        """
+        batch_size = batch_size or self.stream_batch_size
+        if fields is not None:
+            kwargs['projection'] = self._projection(fields)
+        raw_data = self.collection.find(filter_data, show_record_id=True, batch_size=batch_size, **kwargs)
+        batch = []
+        for raw_item in raw_data:
+            batch.append(raw_item)
+            if len(batch) >= batch_size:
+                yield from self._load(batch, many=True, fields=fields)
+                batch = []
+        if batch:
+            yield from self._load(batch, many=True, fields=fields)
+
+    def get_page(self, filter_data, limit, after=None, **kwargs):
+        # one item more than requested tells whether there is a next page
+        items = self.get(filter_data, limit=limit + 1, after=after, **kwargs)
+        if len(items) > limit:
+            items = items[:limit]
+            return Page(items, encode_cursor(items[-1]._id))
+        return Page(items, None)
+
+    def count(self, filter_data, limit=None):
+        if limit is not None:
+            return self.collection.count_documents(filter_data, limit=limit)
+        return self.collection.count_documents(filter_data)
 
     def exists(self, filter_data, **kwargs):
-        raw_data = self.collection.find(filter_data, **kwargs).limit(1)
-        return raw_data.count() == 1
+        return self.collection.find_one(filter_data, projection={'_id': True}, **kwargs) is not None
+
+    def existing_values(self, field, values):
+        raw_data = self.collection.find({field: {"$in": list(values)}}, projection={field: True})
+        return set(raw_item.get(field) for raw_item in raw_data)
+
+    def validate_references(self, items):
+        referenceValidator.validate(items)
 
     def save(self, item):
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None:
+            # written when the unit of work is flushed, new items get their _id now
+            self._prepare_save(item)
+            return unit_of_work.save(item)
+        self.validate_references([item])
         if item.is_new():
             return self._save(item)
         else:
             return self._update(item)
 
-    def _default_exclude_in_save_fn(self, field):
-        meta = getattr(field, 'meta', {})
-        meta_data = getattr(field, 'metaData', {})
+    @staticmethod
+    def _default_exclude_in_save_fn(field):
+        # marshmallow keeps unknown field kwargs like internal=False in metadata
+        metas = [getattr(field, name, {}) for name in ('metadata', 'meta', 'metaData')]
         # exclude all fields which are marked as external or not internal
-        is_external = meta.get('external', False) or meta_data.get('external', False)
-        is_internal = meta.get('internal', True) or meta_data.get('internal', True)
+        is_external = any(meta.get('external', False) for meta in metas)
+        is_internal = all(meta.get('internal', True) for meta in metas)
         return not is_internal or is_external
 
+    def _prepare_save(self, item):
+        """sets fields derived from others before an item is written"""
+
+    def _serialize_new(self, item):
+        self._prepare_save(item)
+        return item.serialize(exclude=['_id'], field_filter_fn=self._default_exclude_in_save_fn)
+
     def _save(self, item):
-        data = item.serialize(exclude=['_id'], field_filter_fn=self._default_exclude_in_save_fn)
+        data = self._serialize_new(item)
         insert_result = self.collection.insert_one(data)
         if not insert_result.inserted_id:
             raise InsertFailedError(self.collection, item)
         item._id = id_obj_to_hex_str(insert_result.inserted_id)
+        item.snapshot(data)
+        self._notify_write(item._id, item)
+        self._notify_write_done()
         return item
 
+    @staticmethod
+    def _flush_unit_of_work():
+        """
+        bulk writes and increments are written at once, they report their result per item.
+        the writes recorded by an active unit of work before are flushed first, so the order of the writes is kept.
+        """
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.flush()
+
+    def save_many(self, items, batch_size=None):
+        """
+        inserts new items with one unordered insert_many per batch_size items and assigns the ids.
+        the references of all items are validated together.
+        returns {index: error} of the items which were not inserted, all others are saved.
+        written at once, also in a unit of work, see _flush_unit_of_work.
+        """
+        self._flush_unit_of_work()
+        batch_size = batch_size or self.bulk_batch_size
+        errors = referenceValidator.find_invalid(items)
+        pending = []
+        for index, item in enumerate(items):
+            if index in errors:
+                continue
+            if not item.is_new():
+                errors[index] = InsertFailedError(self.collection, item, "item has an _id already")
+                continue
+            data = self._serialize_new(item)
+            # ids are created here, so the inserted items of a partially failed batch are known
+            data['_id'] = ObjectId()
+            pending.append((index, item, data))
+
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            failed = self._insert_batch([data for _, _, data in batch])
+            for position, (index, item, data) in enumerate(batch):
+                if position in failed:
+                    errors[index] = InsertFailedError(self.collection, item, failed[position])
+                    continue
+                item._id = id_obj_to_hex_str(data['_id'])
+                item.snapshot(data)
+                self._notify_write(item._id, item)
+        if len(errors) < len(items):
+            self._notify_write_done()
+        return errors
+
+    @staticmethod
+    def _write_errors(bulk_write_error):
+        """{position: error message} of the failed operations of an unordered bulk write"""
+        return {
+            write_error['index']: write_error.get('errmsg')
+            for write_error in bulk_write_error.details.get('writeErrors', [])
+        }
+
+    def _insert_batch(self, documents):
+        """{position: error message} of the documents which were not inserted"""
+        try:
+            self.collection.insert_many(documents, ordered=False)
+        except BulkWriteError as bulk_write_error:
+            return self._write_errors(bulk_write_error)
+        return {}
+
+    def _write_batch(self, operations):
+        """the raw result (nMatched, nModified, nRemoved, ...) of an unordered bulk_write and its failed operations"""
+        try:
+            return self.collection.bulk_write(operations, ordered=False).bulk_api_result, {}
+        except BulkWriteError as bulk_write_error:
+            return bulk_write_error.details, self._write_errors(bulk_write_error)
+
+    @staticmethod
+    def _to_id_obj(_id):
+        return _id if isinstance(_id, ObjectId) else hex_str_to_id_obj(_id)
+
+    def update_many_items(self, items, batch_size=None):
+        """
+        updates existing items with one unordered bulk_write per batch_size items,
+        items which did not change since they were loaded are skipped, see _build_update.
+        returns {index: error} like save_many, NotFoundError for missing items and UpdateFailedError
+        for failed writes. matched documents which already held the data count as updated.
+        written at once, also in a unit of work, see _flush_unit_of_work.
+        """
+        self._flush_unit_of_work()
+        batch_size = batch_size or self.bulk_batch_size
+        errors = referenceValidator.find_invalid(items)
+        pending = []
+        for index, item in enumerate(items):
+            if index in errors:
+                continue
+            if item.is_new():
+                errors[index] = NotFoundError(self.collection, None)
+                continue
+            update = self._build_update(item, self._serialize_update(item))
+            if update is None:
+                continue
+            _id = self._to_id_obj(item._id)
+            pending.append((index, item, _id, update))
+
+        written = False
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            result, failed = self._write_batch([UpdateOne({'_id': _id}, update) for _, _, _id, update in batch])
+            for position, (index, item, _, _) in enumerate(batch):
+                if position in failed:
+                    errors[index] = UpdateFailedError(self.collection, item, failed[position])
+            batch = [entry for position, entry in enumerate(batch) if position not in failed]
+
+            if result.get('nMatched', 0) < len(batch):
+                # only looked up if some items are missing
+                existing = self.existing_values('_id', [_id for _, _, _id, _ in batch])
+                for index, _, _id, _ in batch:
+                    if _id not in existing:
+                        errors[index] = NotFoundError(self.collection, _id)
+                batch = [entry for entry in batch if entry[2] in existing]
+
+            for index, item, _, update in batch:
+                self._apply_to_snapshot(item, update)
+                self._notify_write(item._id, item)
+                written = True
+        if written:
+            self._notify_write_done()
+        return errors
+
+    def increment(self, _id, field, amount=1):
+        """
+        atomic $inc of a numeric field. write listeners are not notified, they expect the written item,
+        cached values of the field catch up when the caches expire.
+        written at once, also in a unit of work, see _flush_unit_of_work.
+        """
+        self._flush_unit_of_work()
+        update_result = self.collection.update_one({'_id': self._to_id_obj(_id)}, {'$inc': {field: amount}})
+        if not update_result.matched_count:
+            raise NotFoundError(self.collection, _id)
+
+    def increment_many(self, increments, field, batch_size=None):
+        """
+        {_id: amount} as one unordered bulk_write of $inc per batch_size ids, see increment.
+        returns {_id: error} of the missing ids and failed writes.
+        written at once, also in a unit of work, see _flush_unit_of_work.
+        """
+        self._flush_unit_of_work()
+        batch_size = batch_size or self.bulk_batch_size
+        errors = {}
+        increments = [(_id, self._to_id_obj(_id), amount) for _id, amount in increments.items()]
+        for start in range(0, len(increments), batch_size):
+            batch = increments[start:start + batch_size]
+            result, failed = self._write_batch([
+                UpdateOne({'_id': id_obj}, {'$inc': {field: amount}}) for _, id_obj, amount in batch
+            ])
+            for position, (_id, _, _) in enumerate(batch):
+                if position in failed:
+                    errors[_id] = UpdateFailedError(self.collection, _id, failed[position])
+            batch = [entry for position, entry in enumerate(batch) if position not in failed]
+
+            if result.get('nMatched', 0) < len(batch):
+                existing = self.existing_values('_id', [id_obj for _, id_obj, _ in batch])
+                for _id, id_obj, _ in batch:
+                    if id_obj not in existing:
+                        errors[_id] = NotFoundError(self.collection, _id)
+        return errors
+
+    def _serialize_update(self, item):
+        self._prepare_save(item)
+        # _id is immutable, a $set of it fails unless it is the stored ObjectId
+        return item.serialize(exclude=['_id'], field_filter_fn=self._default_exclude_in_save_fn)
+
+    @staticmethod
+    def _build_update(item, data):
+        """
+        update operators writing the serialized data. items loaded from the database only write
+        their changed fields, changed fields which are None now are removed with $unset.
+        None if nothing changed.
+        """
+        changed_fields = item.changed_fields(data)
+        if changed_fields is None:
+            return {"$set": data}
+        update = {}
+        for field_name in sorted(changed_fields):
+            if data[field_name] is None:
+                update.setdefault("$unset", {})[field_name] = ""
+            else:
+                update.setdefault("$set", {})[field_name] = data[field_name]
+        return update or None
+
+    @staticmethod
+    def _apply_to_snapshot(item, update):
+        stored_data = dict(item.stored_data or {})
+        stored_data.update(update.get("$set", {}))
+        for field_name in update.get("$unset", {}):
+            stored_data.pop(field_name, None)
+        item.snapshot(stored_data)
+
     def _update(self, item):
-        data = item.serialize(field_filter_fn=self._default_exclude_in_save_fn)
-        update_data_with_operator = {"$set": data}
-        filter_data = {'_id': item._id}
+        data = self._serialize_update(item)
+        update_data_with_operator = self._build_update(item, data)
+        if update_data_with_operator is None:
+            # nothing changed since the item was loaded
+            return item
+        filter_data = {'_id': self._to_id_obj(item._id)}
         update_result = self.collection.update_one(filter_data, update=update_data_with_operator)
 
+        # a matched document which held the data already is not modified, the update succeeded all the same
         if not update_result.matched_count:
             raise NotFoundError(self.collection, item._id)
-        if not update_result.modified_count:
-            raise UpdateFailedError(self.collection, item)
+        self._apply_to_snapshot(item, update_data_with_operator)
+        self._notify_write(item._id, item)
+        self._notify_write_done()
         return item
 
     def delete(self, _id):
@@ -81,6 +434,114 @@ class Manager(object):
         )
 
     def delete_by_id(self, item_id):
+        unit_of_work = current_unit_of_work()
+        if unit_of_work is not None:
+            unit_of_work.delete(self, item_id)
+            return
         delete_result = self.collection.delete_one({'_id': item_id})
         if not delete_result.deleted_count:
             raise NotFoundError(self.collection, item_id)
+        self._notify_write(item_id)
+        self._notify_write_done()
+
+    def delete_many_ids(self, ids, batch_size=None):
+        """
+        deletes items by id, hex strings or ObjectIds, with one unordered bulk_write per batch_size ids.
+        the existing ids of a batch are looked up first, the result is {index: NotFoundError} of the missing ones.
+        written at once, also in a unit of work, see _flush_unit_of_work.
+        """
+        self._flush_unit_of_work()
+        batch_size = batch_size or self.bulk_batch_size
+        errors = {}
+        ids = [self._to_id_obj(_id) for _id in ids]
+        written = False
+        for start in range(0, len(ids), batch_size):
+            batch = list(enumerate(ids[start:start + batch_size], start))
+            existing = self.existing_values('_id', [_id for _, _id in batch])
+            for index, _id in batch:
+                if _id not in existing:
+                    errors[index] = NotFoundError(self.collection, _id)
+            batch = [(index, _id) for index, _id in batch if _id in existing]
+            if not batch:
+                continue
+
+            _, failed = self._write_batch([DeleteOne({'_id': _id}) for _, _id in batch])
+            for position, (index, _id) in enumerate(batch):
+                if position in failed:
+                    errors[index] = DeletionFailedException(self.collection, _id, failed[position])
+                    continue
+                self._notify_write(_id)
+                written = True
+        if written:
+            self._notify_write_done()
+        return errors
+
+    def write_changes(self, new_items=(), changed_items=(), deleted_ids=()):
+        """
+        writes the changes of a unit of work with one ordered bulk_write, see database.unit_of_work.
+        new items have their _id already and changed items only write their changed fields.
+        references have to be validated before.
+        a failed write stops the following ones and raises like save, updates and deletes of missing items
+        raise NotFoundError after the other writes.
+        """
+        missing_ids = set()
+        if deleted_ids:
+            # a delete does not tell which ids were missing, they are looked up before
+            deleted_ids = [self._to_id_obj(_id) for _id in deleted_ids]
+            missing_ids = set(deleted_ids) - self.existing_values('_id', deleted_ids)
+        writes = []
+        for item in new_items:
+            data = self._serialize_new(item)
+            data['_id'] = self._to_id_obj(item._id)
+            writes.append((InsertOne(data), item, data))
+        for item in changed_items:
+            update = self._build_update(item, self._serialize_update(item))
+            if update is not None:
+                writes.append((UpdateOne({'_id': self._to_id_obj(item._id)}, update), item, update))
+        for _id in deleted_ids:
+            if _id not in missing_ids:
+                writes.append((DeleteOne({'_id': _id}), None, _id))
+        if not writes and missing_ids:
+            raise NotFoundError(self.collection, sorted(missing_ids)[0])
+        if not writes:
+            return
+
+        failed_write = None
+        try:
+            result = self.collection.bulk_write(
+                [operation for operation, _, _ in writes], ordered=True
+            ).bulk_api_result
+        except BulkWriteError as bulk_write_error:
+            result = bulk_write_error.details
+            write_error = bulk_write_error.details['writeErrors'][0]
+            failed_write = writes[write_error['index']] + (write_error.get('errmsg'),)
+            writes = writes[:write_error['index']]
+
+        updates = [(operation, item) for operation, item, _ in writes if isinstance(operation, UpdateOne)]
+        if result.get('nMatched', 0) < len(updates):
+            ids = [self._to_id_obj(item._id) for _, item in updates]
+            missing_ids |= set(ids) - self.existing_values('_id', ids)
+
+        for operation, item, payload in writes:
+            if isinstance(operation, InsertOne):
+                item.snapshot(payload)
+            elif isinstance(operation, UpdateOne):
+                if self._to_id_obj(item._id) in missing_ids:
+                    continue
+                self._apply_to_snapshot(item, payload)
+            else:
+                self._notify_write(payload)
+                continue
+            self._notify_write(item._id, item)
+        if writes:
+            self._notify_write_done()
+
+        if failed_write is not None:
+            operation, item, payload, message = failed_write
+            if isinstance(operation, InsertOne):
+                raise InsertFailedError(self.collection, item, message)
+            if isinstance(operation, UpdateOne):
+                raise UpdateFailedError(self.collection, item, message)
+            raise DeletionFailedException(self.collection, payload, message)
+        if missing_ids:
+            raise NotFoundError(self.collection, sorted(missing_ids)[0])
@@ -0,0 +1,58 @@
+import base64
+import binascii
+import json
+from collections import namedtuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+from database.exceptions import InvalidCursorError
+from database.utils import hex_str_to_id_obj, id_obj_to_hex_str
+
+Page = namedtuple('Page', ['items', 'next_cursor'])
+DistanceCursor = namedtuple('DistanceCursor', ['distance', 'ids', 'after_id', 'min_distance'])
+
+
+def encode_cursor(_id):
+    if not isinstance(_id, ObjectId):
+        _id = hex_str_to_id_obj(_id)
+    return base64.urlsafe_b64encode(_id.binary).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(cursor + padding))
+    except (TypeError, ValueError, binascii.Error, InvalidId):
+        raise InvalidCursorError(cursor)
+
+
+def encode_distance_cursor(distance, ids, after_id=None, min_distance=None):
+    """
+    cursor for results sorted by distance: the last distance and the ids already returned at it.
+    after_id continues the items at the distance by _id, min_distance is the distance all items below were returned.
+    """
+    data = {
+        'd': distance,
+        'ids': [id_obj_to_hex_str(_id) if isinstance(_id, ObjectId) else _id for _id in ids]
+    }
+    if after_id is not None:
+        data['a'] = id_obj_to_hex_str(after_id) if isinstance(after_id, ObjectId) else after_id
+    if min_distance is not None:
+        data['m'] = min_distance
+    data = json.dumps(data, separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_distance_cursor(cursor):
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(cursor + padding).decode('utf-8'))
+        return DistanceCursor(
+            float(data['d']),
+            [hex_str_to_id_obj(_id) for _id in data['ids']],
+            hex_str_to_id_obj(data['a']) if 'a' in data else None,
+            float(data['m']) if 'm' in data else None
+        )
+    except (TypeError, ValueError, KeyError, binascii.Error, InvalidId, OverflowError):
+        raise InvalidCursorError(cursor)
@@ -0,0 +1,22 @@
+class ManagerRegistry(object):
+    """
+    one manager per model class for the whole process.
+    managers keep their collection handle, reset() drops both, e.g. when the database connection changes.
+    """
+
+    def __init__(self):
+        self.managers = {}
+
+    def get(self, model_cls):
+        try:
+            return self.managers[model_cls]
+        except KeyError:
+            return self.managers.setdefault(model_cls, model_cls.create_manager())
+
+    def reset(self):
+        for manager in self.managers.values():
+            manager.reset()
+        self.managers.clear()
+
+
+managerRegistry = ManagerRegistry()
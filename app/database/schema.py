@@ -1,3 +1,5 @@
+from functools import wraps
+
 from marshmallow import Schema
 
 
@@ -13,3 +15,56 @@ class BaseSchema(Schema):
                 if field_filter_fn(field)
             )
             self.exclude = set(super_exclude + internal_exclude)
+
+
+class SchemaRegistry(object):
+    """
+    process wide store for compiled schema classes and configured schema instances.
+    schema classes are keyed by the building function, the model class and the class to create,
+    schema instances by the model class and the options they are created with.
+    marshmallow creates a new (un)marshaller per dump / load, so instances can be shared.
+    """
+
+    def __init__(self):
+        self.schema_classes = {}
+        self.schemas = {}
+
+    def get_schema_cls(self, builder, model_cls, class_to_create):
+        key = (builder, model_cls, class_to_create)
+        try:
+            return self.schema_classes[key]
+        except KeyError:
+            schema_cls = self.schema_classes[key] = builder(model_cls, class_to_create)
+            return schema_cls
+
+    def get_schema(self, model_cls, many=False, exclude=(), only=None, field_filter_fn=None):
+        key = (
+            model_cls,
+            bool(many),
+            frozenset(exclude or ()),
+            None if only is None else frozenset(only),
+            field_filter_fn
+        )
+        try:
+            return self.schemas[key]
+        except KeyError:
+            schema = self.schemas[key] = model_cls.get_scheme_cls()(
+                many=many, exclude=exclude, only=only, field_filter_fn=field_filter_fn
+            )
+            return schema
+
+    def reset(self):
+        self.schema_classes.clear()
+        self.schemas.clear()
+
+
+schemaRegistry = SchemaRegistry()
+
+
+def cached_schema_cls(builder):
+    # every level of the get_scheme_cls chain keeps its own entries, because the builder is part of the key.
+    @wraps(builder)
+    def wrapper(cls, class_to_create=None):
+        return schemaRegistry.get_schema_cls(builder, cls, class_to_create or cls)
+
+    return wrapper
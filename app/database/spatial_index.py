@@ -0,0 +1,196 @@
+import heapq
+import time
+from array import array
+from math import cos, degrees, floor, radians
+
+from bson import ObjectId
+
+from database.exceptions import SpatialIndexFullError
+from database.geo import EARTH_RADIUS, haversine_distance
+from database.utils import BYTE_LENGTH, hex_str_to_id_obj
+
+
+def point_in_polygon(longitude, latitude, vertices):
+    # ray casting on the plane, like the legacy $polygon operator
+    inside = False
+    previous_longitude, previous_latitude = vertices[-1]
+    for vertex_longitude, vertex_latitude in vertices:
+        if (vertex_latitude > latitude) != (previous_latitude > latitude):
+            crossing = (previous_longitude - vertex_longitude) * (latitude - vertex_latitude) / \
+                (previous_latitude - vertex_latitude) + vertex_longitude
+            if longitude < crossing:
+                inside = not inside
+        previous_longitude, previous_latitude = vertex_longitude, vertex_latitude
+    return inside
+
+
+class GridSpatialIndex(object):
+    """
+    in-memory grid over (longitude, latitude, _id, score) of one collection, stored in flat arrays.
+    it only answers which ids are where, the documents are fetched by id afterwards.
+
+    the index is ready after warm_up() and becomes stale after max_age seconds,
+    because writes of other processes do not reach it. an index exceeding max_size stops
+    answering queries until the next warm up, a partial index would return wrong results.
+    refreshed indexes are warmed up as a new_empty() copy, so queries keep using the current one.
+    """
+
+    def __init__(self, cell_size=0.01, max_size=200000, max_age=60, clock=time.monotonic):
+        # in degrees
+        self.cell_size = cell_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.clock = clock
+        self.warmed_up_at = None
+        self.clear()
+
+    def new_empty(self):
+        """an empty index with the same settings"""
+        return GridSpatialIndex(self.cell_size, self.max_size, self.max_age, self.clock)
+
+    def clear(self):
+        self.longitudes = array('d')
+        self.latitudes = array('d')
+        self.scores = array('d')
+        self.ids = bytearray()
+        self.slots = {}
+        self.free_slots = []
+        self.cells = {}
+        self.warmed_up_at = None
+        self.full = False
+
+    def __len__(self):
+        return len(self.slots)
+
+    @property
+    def ready(self):
+        return self.warmed_up_at is not None and not self.full
+
+    def is_stale(self):
+        return self.warmed_up_at is None or self.clock() - self.warmed_up_at > self.max_age
+
+    def _cell(self, longitude, latitude):
+        return floor(longitude / self.cell_size), floor(latitude / self.cell_size)
+
+    def _id_at(self, slot):
+        return ObjectId(bytes(self.ids[slot * BYTE_LENGTH:(slot + 1) * BYTE_LENGTH]))
+
+    def add(self, _id, longitude, latitude, score=0):
+        if not isinstance(_id, ObjectId):
+            _id = hex_str_to_id_obj(_id)
+        self.remove(_id)
+        if len(self.slots) >= self.max_size:
+            self.full = True
+            raise SpatialIndexFullError(self.max_size)
+
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.longitudes[slot] = longitude
+            self.latitudes[slot] = latitude
+            self.scores[slot] = score
+            self.ids[slot * BYTE_LENGTH:(slot + 1) * BYTE_LENGTH] = _id.binary
+        else:
+            slot = len(self.longitudes)
+            self.longitudes.append(longitude)
+            self.latitudes.append(latitude)
+            self.scores.append(score)
+            self.ids.extend(_id.binary)
+        self.slots[_id.binary] = slot
+        self.cells.setdefault(self._cell(longitude, latitude), array('L')).append(slot)
+
+    def remove(self, _id):
+        if not isinstance(_id, ObjectId):
+            _id = hex_str_to_id_obj(_id)
+        slot = self.slots.pop(_id.binary, None)
+        if slot is None:
+            return False
+        cell = self._cell(self.longitudes[slot], self.latitudes[slot])
+        self.cells[cell].remove(slot)
+        if not self.cells[cell]:
+            del self.cells[cell]
+        self.free_slots.append(slot)
+        return True
+
+    def warm_up(self, raw_items, location_field="loc", score_field="score"):
+        """replaces the content with raw documents holding at least _id and the location"""
+        self.clear()
+        try:
+            for raw_item in raw_items:
+                longitude, latitude = raw_item[location_field]['coordinates']
+                self.add(raw_item['_id'], longitude, latitude, raw_item.get(score_field) or 0)
+        finally:
+            self.warmed_up_at = self.clock()
+        return len(self)
+
+    def _slots_in_box(self, min_longitude, min_latitude, max_longitude, max_latitude):
+        min_x, min_y = self._cell(min_longitude, min_latitude)
+        max_x, max_y = self._cell(max_longitude, max_latitude)
+        if (max_x - min_x + 1) * (max_y - min_y + 1) > len(self.cells):
+            # the box covers more grid cells than there are occupied ones
+            for (x, y), slots in self.cells.items():
+                if min_x <= x <= max_x and min_y <= y <= max_y:
+                    yield from slots
+            return
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                yield from self.cells.get((x, y), ())
+
+    def near(self, longitude, latitude, max_distance, min_distance=0):
+        """list of (distance, _id) within the distance range, sorted by distance and _id"""
+        delta_latitude = degrees(max_distance / EARTH_RADIUS)
+        min_latitude, max_latitude = latitude - delta_latitude, latitude + delta_latitude
+        cos_latitude = min(cos(radians(max(abs(min_latitude), abs(max_latitude)))), 1)
+        if max_latitude >= 90 or min_latitude <= -90 or cos_latitude <= 0 or \
+                delta_latitude / cos_latitude >= 180:
+            boxes = [(-180, max(min_latitude, -90), 180, min(max_latitude, 90))]
+        else:
+            delta_longitude = delta_latitude / cos_latitude
+            min_longitude, max_longitude = longitude - delta_longitude, longitude + delta_longitude
+            boxes = [(max(min_longitude, -180), min_latitude, min(max_longitude, 180), max_latitude)]
+            # circles crossing the antimeridian continue on the other side
+            if min_longitude < -180:
+                boxes.append((min_longitude + 360, min_latitude, 180, max_latitude))
+            if max_longitude > 180:
+                boxes.append((-180, min_latitude, max_longitude - 360, max_latitude))
+
+        result = []
+        longitudes, latitudes = self.longitudes, self.latitudes
+        for min_box_longitude, min_box_latitude, max_box_longitude, max_box_latitude in boxes:
+            for slot in self._slots_in_box(min_box_longitude, min_box_latitude, max_box_longitude, max_box_latitude):
+                slot_longitude, slot_latitude = longitudes[slot], latitudes[slot]
+                # the bounding box is cheaper to check than the distance
+                if not (min_box_latitude <= slot_latitude <= max_box_latitude and
+                        min_box_longitude <= slot_longitude <= max_box_longitude):
+                    continue
+                distance = haversine_distance(longitude, latitude, slot_longitude, slot_latitude)
+                if min_distance <= distance <= max_distance:
+                    result.append((distance, self._id_at(slot)))
+        result.sort()
+        return result
+
+    def within(self, vertices):
+        """ids of the points inside the polygon"""
+        longitudes = [longitude for longitude, _ in vertices]
+        latitudes = [latitude for _, latitude in vertices]
+        return [
+            self._id_at(slot) for slot in
+            self._slots_in_box(min(longitudes), min(latitudes), max(longitudes), max(latitudes))
+            if point_in_polygon(self.longitudes[slot], self.latitudes[slot], vertices)
+        ]
+
+    def in_boxes(self, boxes, limit=None):
+        """
+        ids of the points inside any of the (min_longitude, min_latitude, max_longitude, max_latitude) boxes.
+        with a limit only the highest scored ones.
+        """
+        longitudes, latitudes = self.longitudes, self.latitudes
+        slots = [
+            slot for min_longitude, min_latitude, max_longitude, max_latitude in boxes
+            for slot in self._slots_in_box(min_longitude, min_latitude, max_longitude, max_latitude)
+            if min_longitude <= longitudes[slot] <= max_longitude and min_latitude <= latitudes[slot] <= max_latitude
+        ]
+        if limit is not None:
+            slots = heapq.nsmallest(limit, slots, key=lambda slot: (
+                -self.scores[slot], self.ids[slot * BYTE_LENGTH:(slot + 1) * BYTE_LENGTH]
+            ))
+        return [self._id_at(slot) for slot in slots]
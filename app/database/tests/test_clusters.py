@@ -0,0 +1,56 @@
+import unittest
+
+from database.clusters import ClusterCache, ClusterGrid, MAX_ZOOM
+
+
+class TestClusterGrid(unittest.TestCase):
+    def setUp(self):
+        self.grid = ClusterGrid(cells_per_tile=4)
+
+    def test_sizes(self):
+        self.assertEqual(self.grid.tile_size(1), 180)
+        self.assertEqual(self.grid.cell_size(1), 45)
+        self.assertEqual(self.grid.tile_counts(2), (4, 2))
+
+    def test_tile_of_world_edges(self):
+        self.assertEqual(self.grid.tile_of(2, -180, -90), (0, 0))
+        self.assertEqual(self.grid.tile_of(2, 180, 90), (3, 1))
+
+    def test_tiles_of_box(self):
+        self.assertEqual(self.grid.tiles(3, (-10, -10, 10, 10)), [(3, 1), (3, 2), (4, 1), (4, 2)])
+        self.assertEqual(self.grid.tile_count(3, (-10, -10, 10, 10)), 4)
+
+    def test_tiles_box(self):
+        self.assertEqual(self.grid.tiles_box(3, [(3, 1), (4, 2)]), (-45, -45, 45, 45))
+
+    def test_cell_in_box(self):
+        # cell 17 at zoom 3 spans longitude 11.25 to 22.5
+        self.assertTrue(self.grid.cell_in_box(3, 17, 8, (20, 0, 30, 1)))
+        self.assertFalse(self.grid.cell_in_box(3, 17, 8, (23, 0, 30, 1)))
+
+
+class TestClusterCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = ClusterCache(ttl=30, clock=lambda: self.now)
+        self.filter_data = {'deleted': False}
+        self.tile = self.cache.grid.tile_of(5, 13.4, 52.5)
+        self.cache.put(5, self.tile, self.filter_data, [{'count': 1}])
+
+    def test_get(self):
+        self.assertEqual(self.cache.get(5, self.tile, self.filter_data), [{'count': 1}])
+        self.assertIsNone(self.cache.get(5, self.tile, {}))
+        self.assertIsNone(self.cache.get(6, self.tile, self.filter_data))
+
+    def test_expires(self):
+        self.now = 31
+        self.assertIsNone(self.cache.get(5, self.tile, self.filter_data))
+
+    def test_write_invalidates_tile_on_every_zoom(self):
+        other_tile = self.cache.grid.tile_of(5, -70, -30)
+        self.cache.put(5, other_tile, self.filter_data, [])
+        self.cache.put(MAX_ZOOM, self.cache.grid.tile_of(MAX_ZOOM, 13.4, 52.5), self.filter_data, [])
+        self.cache.invalidate(13.4, 52.5)
+        self.assertIsNone(self.cache.get(5, self.tile, self.filter_data))
+        self.assertEqual(self.cache.get(5, other_tile, self.filter_data), [])
+        self.assertEqual(len(self.cache.entries), 1)
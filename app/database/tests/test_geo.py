@@ -0,0 +1,87 @@
+import unittest
+
+from database.geo import bbox_polygons, haversine_distance, is_simple_ring, simplify_ring, split_bbox, EARTH_RADIUS
+from math import pi
+
+
+class TestHaversineDistance(unittest.TestCase):
+    def test_same_point(self):
+        self.assertEqual(haversine_distance(13.4, 52.5, 13.4, 52.5), 0)
+
+    def test_one_degree_on_equator(self):
+        self.assertAlmostEqual(
+            haversine_distance(0, 0, 1, 0), EARTH_RADIUS * pi / 180
+        )
+
+    def test_antipodes(self):
+        self.assertAlmostEqual(
+            haversine_distance(0, 0, 180, 0), EARTH_RADIUS * pi
+        )
+
+
+class TestSimplifyRing(unittest.TestCase):
+    def setUp(self):
+        # a square with a slightly bent edge, ~1m off the straight line
+        self.ring = [(0, 0), (0.005, 0.00001), (0.01, 0), (0.01, 0.01), (0, 0.01), (0, 0)]
+
+    def test_removes_vertices_within_tolerance(self):
+        self.assertEqual(simplify_ring(self.ring, 5), [(0, 0), (0.01, 0), (0.01, 0.01), (0, 0.01), (0, 0)])
+
+    def test_keeps_vertices_beyond_tolerance(self):
+        self.assertEqual(simplify_ring(self.ring, 0.5), self.ring)
+
+    def test_does_not_collapse_ring(self):
+        self.assertEqual(simplify_ring(self.ring, 100000), self.ring)
+
+    def test_ring_crossing_the_antimeridian(self):
+        ring = [(179.99, 0), (180, 0.00001), (-179.99, 0), (-179.99, 0.01), (179.99, 0.01), (179.99, 0)]
+        self.assertEqual(
+            simplify_ring(ring, 5), [(179.99, 0), (-179.99, 0), (-179.99, 0.01), (179.99, 0.01), (179.99, 0)]
+        )
+
+    def test_keeps_ring_which_would_intersect_itself(self):
+        # a notch from the top ends in a dip of the bottom edge, without the dip it crosses the bottom edge
+        ring = [
+            (0, 0), (0.004, -0.00003), (0.006, -0.00003), (0.01, 0), (0.01, 0.01),
+            (0.0051, 0.01), (0.005, -0.00001), (0.0049, 0.01), (0, 0.01), (0, 0)
+        ]
+        self.assertEqual(simplify_ring(ring, 5), ring)
+
+
+class TestIsSimpleRing(unittest.TestCase):
+    def test_square(self):
+        self.assertTrue(is_simple_ring([(0, 0), (1, 0), (1, 1), (0, 1), (0, 0)]))
+
+    def test_bow_tie(self):
+        self.assertFalse(is_simple_ring([(0, 0), (1, 1), (1, 0), (0, 1), (0, 0)]))
+
+    def test_touching_edges(self):
+        self.assertFalse(is_simple_ring([(0, 0), (2, 0), (2, 2), (1, 0), (0, 2), (0, 0)]))
+
+
+class TestSplitBbox(unittest.TestCase):
+    def test_regular_box(self):
+        self.assertEqual(split_bbox(10, 20, 11, 21), [(10, 20, 11, 21)])
+
+    def test_box_crossing_antimeridian(self):
+        self.assertEqual(split_bbox(170, -10, -170, 10), [(170, -10, 180, 10), (-180, -10, -170, 10)])
+
+
+class TestBboxPolygons(unittest.TestCase):
+    def test_densifies_parallels(self):
+        polygons = bbox_polygons(10, 20, 11, 21, max_edge=0.5)
+        self.assertEqual(polygons, [[[
+            [10, 20], [10.5, 20], [11, 20], [11, 21], [10.5, 21], [10, 21], [10, 20]
+        ]]])
+
+    def test_splits_wide_boxes(self):
+        polygons = bbox_polygons(-180, -10, 180, 10, max_edge=90)
+        self.assertEqual(len(polygons), 4)
+        self.assertEqual(polygons[0][0], [[-180, -10], [-90, -10], [-90, 10], [-180, 10], [-180, -10]])
+
+    def test_pole_is_one_vertex(self):
+        polygons = bbox_polygons(0, 80, 10, 90, max_edge=5)
+        self.assertEqual(polygons[0][0], [[0, 80], [5, 80], [10, 80], [10, 90], [0, 80]])
+
+    def test_empty_box(self):
+        self.assertEqual(bbox_polygons(10, 20, 10, 21), [])
@@ -0,0 +1,167 @@
+import threading
+import unittest
+import unittest.mock as mock
+
+from database.geo import haversine_distance
+from database.geo_cache import GeoQueryCache
+from database.utils import int_to_id_obj, id_obj_to_hex_str
+
+
+def raw_item(idx, longitude, latitude):
+    return {
+        '_id': int_to_id_obj(idx),
+        'loc': {'type': 'Point', 'coordinates': [longitude, latitude]}
+    }
+
+
+class GeoQueryCacheBase(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = GeoQueryCache(ttl=10, max_entries=2, clock=lambda: self.now)
+        self.raw_items = [
+            raw_item(1, 13.4001, 52.5001),
+            raw_item(2, 13.4030, 52.5001),
+            raw_item(3, 13.4200, 52.5001),
+        ]
+        self.query_fn = mock.MagicMock(return_value=self.raw_items)
+
+    def get_near(self, longitude=13.4, latitude=52.5, max_distance=1000, min_distance=0, filter_data=None):
+        return self.cache.get_near(
+            longitude, latitude, max_distance, min_distance, filter_data or {}, self.query_fn
+        )
+
+
+class TestGetNear(GeoQueryCacheBase):
+    def test_filters_exact_result_sorted_by_distance(self):
+        result = self.get_near(max_distance=500)
+        self.assertEqual([item['_id'] for _, item in result], [int_to_id_obj(1), int_to_id_obj(2)])
+        self.assertEqual(result[0][0], haversine_distance(13.4, 52.5, 13.4001, 52.5001))
+
+    def test_superset_contains_every_query_of_the_cell(self):
+        center_longitude, center_latitude, radius = self.cache.near_superset(13.4, 52.5, 400)
+        self.assertGreaterEqual(
+            radius,
+            500 + haversine_distance(center_longitude, center_latitude, 13.40, 52.50)
+        )
+
+    def test_nearby_queries_share_one_entry(self):
+        self.get_near(13.4001, 52.5001, max_distance=300)
+        self.get_near(13.4002, 52.5003, max_distance=450, min_distance=10)
+        self.query_fn.assert_called_once()
+
+    def test_other_filter_is_other_entry(self):
+        self.get_near(filter_data={'deleted': False})
+        self.get_near(filter_data={'deleted': True})
+        self.assertEqual(self.query_fn.call_count, 2)
+
+    def test_entries_expire(self):
+        self.get_near()
+        self.now = 11
+        self.get_near()
+        self.assertEqual(self.query_fn.call_count, 2)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        self.get_near(10, 10)
+        self.get_near(20, 20)
+        self.get_near(10, 10)
+        self.get_near(30, 30)
+        self.get_near(10, 10)
+        self.assertEqual(self.query_fn.call_count, 3)
+        self.get_near(20, 20)
+        self.assertEqual(self.query_fn.call_count, 4)
+
+    def test_large_results_are_not_cached(self):
+        self.cache.max_items = 2
+        self.assertEqual(len(self.get_near(max_distance=5000)), 3)
+        self.get_near(max_distance=5000)
+        self.assertEqual(self.query_fn.call_count, 2)
+
+
+class TestInvalidate(GeoQueryCacheBase):
+    def test_drops_entry_containing_the_item(self):
+        self.get_near()
+        self.cache.invalidate(id_obj_to_hex_str(int_to_id_obj(2)))
+        self.get_near()
+        self.assertEqual(self.query_fn.call_count, 2)
+
+    def test_drops_entry_covering_the_new_location(self):
+        self.get_near()
+        self.cache.invalidate(id_obj_to_hex_str(int_to_id_obj(10)), (13.4005, 52.5005))
+        self.get_near()
+        self.assertEqual(self.query_fn.call_count, 2)
+
+    def test_keeps_entries_far_away(self):
+        self.get_near()
+        self.cache.invalidate(id_obj_to_hex_str(int_to_id_obj(10)), (-70, -30))
+        self.get_near()
+        self.query_fn.assert_called_once()
+
+
+class TestGenerations(GeoQueryCacheBase):
+    def setUp(self):
+        super().setUp()
+        self.cache.sync(5)
+        self.get_near()
+
+    def test_same_generation_keeps_entries(self):
+        self.cache.sync(5)
+        self.get_near()
+        self.query_fn.assert_called_once()
+
+    def test_writes_of_other_processes_drop_entries(self):
+        self.cache.sync(6)
+        self.get_near()
+        self.assertEqual(self.query_fn.call_count, 2)
+
+    def test_own_write_keeps_entries_far_away(self):
+        self.cache.invalidate(id_obj_to_hex_str(int_to_id_obj(10)), (-70, -30))
+        self.cache.advance(6)
+        self.get_near()
+        self.query_fn.assert_called_once()
+        self.assertEqual(self.cache.generation, 6)
+
+    def test_own_write_after_other_writes_drops_entries(self):
+        self.cache.invalidate(id_obj_to_hex_str(int_to_id_obj(10)), (-70, -30))
+        self.cache.advance(7)
+        self.get_near()
+        self.assertEqual(self.query_fn.call_count, 2)
+
+
+class TestGetWithin(GeoQueryCacheBase):
+    def setUp(self):
+        super().setUp()
+        self.vertices = [(13.3, 52.4), (13.5, 52.4), (13.5, 52.6)]
+
+    def test_caches_result(self):
+        self.assertEqual(self.cache.get_within(self.vertices, {}, self.query_fn), self.raw_items)
+        self.cache.get_within(self.vertices, {}, self.query_fn)
+        self.query_fn.assert_called_once()
+
+    def test_write_inside_bounding_box_invalidates(self):
+        self.cache.get_within(self.vertices, {}, self.query_fn)
+        self.cache.invalidate('other', (13.45, 52.45))
+        self.cache.get_within(self.vertices, {}, self.query_fn)
+        self.assertEqual(self.query_fn.call_count, 2)
+
+
+
+class TestThreads(GeoQueryCacheBase):
+    def test_put_waits_for_invalidate(self):
+        self.get_near(10, 10)
+        self.get_near(30, 30)
+        putting = []
+
+        def covers(longitude, latitude):
+            # another request stores an entry while the entries are iterated
+            thread = threading.Thread(target=self.get_near, args=(20, 20))
+            thread.start()
+            thread.join(0.1)
+            putting.append(thread)
+            return False
+
+        for entry in self.cache.entries.values():
+            entry.covers = covers
+        self.cache.invalidate(int_to_id_obj(9), (0, 0))
+        for thread in putting:
+            thread.join()
+        self.assertEqual(len(self.cache.entries), 2)
@@ -0,0 +1,24 @@
+import unittest
+
+from database import geohash
+
+
+class TestEncode(unittest.TestCase):
+    def test_known_hashes(self):
+        self.assertEqual(geohash.encode(-5.6, 42.6, 5), 'ezs42')
+        self.assertEqual(geohash.encode(10.40744, 57.64911, 11), 'u4pruydqqvj')
+
+    def test_prefix_is_containing_cell(self):
+        full = geohash.encode(13.4, 52.5, 9)
+        self.assertEqual(geohash.encode(13.4, 52.5, 4), full[:4])
+
+    def test_decode_bbox_contains_point(self):
+        min_longitude, min_latitude, max_longitude, max_latitude = geohash.decode_bbox(geohash.encode(13.4, 52.5))
+        self.assertTrue(min_longitude <= 13.4 <= max_longitude)
+        self.assertTrue(min_latitude <= 52.5 <= max_latitude)
+        self.assertLess(max_longitude - min_longitude, 0.0001)
+
+    def test_prefix_filter(self):
+        prefix_filter = geohash.prefix_filter('u33')
+        self.assertTrue(prefix_filter['$gte'] <= geohash.encode(13.4, 52.5) < prefix_filter['$lt'])
+        self.assertFalse(prefix_filter['$gte'] <= 'u34' < prefix_filter['$lt'])
@@ -0,0 +1,57 @@
+import unittest
+import unittest.mock as mock
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE
+
+from database.indexes import Index, ensure_indexes, missing_indexes
+
+
+class TestIndex(unittest.TestCase):
+    def test_normalizes_plain_field_names(self):
+        index = Index(['deleted', ('score', DESCENDING)])
+        self.assertEqual(index.keys, [('deleted', ASCENDING), ('score', DESCENDING)])
+
+    def test_uses_mongodb_default_name(self):
+        self.assertEqual(Index([('loc', GEOSPHERE)]).name, 'loc_2dsphere')
+        self.assertEqual(Index(['deleted', '_id']).name, 'deleted_1__id_1')
+
+    def test_explicit_name(self):
+        self.assertEqual(Index(['deleted'], name='foo').name, 'foo')
+
+
+class TestMissingIndexes(unittest.TestCase):
+    def test_compares_by_keys(self):
+        existing = {
+            '_id_': {'key': [('_id', 1)]},
+            'custom_name': {'key': [('loc', '2dsphere')]}
+        }
+        geo_index = Index([('loc', GEOSPHERE)])
+        deleted_index = Index(['deleted'])
+
+        self.assertEqual(
+            missing_indexes([geo_index, deleted_index], existing),
+            [deleted_index]
+        )
+
+
+class TestEnsureIndexes(unittest.TestCase):
+    def setUp(self):
+        self.collection = mock.MagicMock()
+        self.collection.index_information.return_value = {
+            '_id_': {'key': [('_id', 1)]},
+        }
+
+    def test_creates_missing_indexes_in_background(self):
+        self.collection.create_indexes.return_value = ['deleted_1']
+        created = ensure_indexes(self.collection, [Index(['_id']), Index(['deleted'])])
+
+        self.assertEqual(created, ['deleted_1'])
+        index_models = self.collection.create_indexes.call_args[0][0]
+        self.assertEqual(len(index_models), 1)
+        self.assertEqual(index_models[0].document['key'], {'deleted': 1})
+        self.assertTrue(index_models[0].document['background'])
+
+    def test_does_nothing_if_all_indexes_exist(self):
+        created = ensure_indexes(self.collection, [Index(['_id'])])
+        self.assertEqual(created, [])
+        self.collection.create_indexes.assert_not_called()
@@ -1,8 +1,18 @@
 import random
+import threading
 from copy import copy
 
+from pymongo import DESCENDING, GEOSPHERE
+
+from database import geohash
+from database.geo import BBOX_EDGE_MARGIN, EARTH_RADIUS, distance_between
+from database.indexes import Index
+from database.location_manager import DISTANCE_TOLERANCE
+from database.pagination import decode_distance_cursor
+from database.spatial_index import GridSpatialIndex
 from database.tests.test_manager import BaseManagerTest
-from models.geojsonp import Point
+from database.utils import int_to_id_obj, id_obj_to_hex_str
+from models.geojsonp import Point, Polygon
 from models.location_model import LocationBasedModel
 
 
@@ -11,6 +21,24 @@ class BaseLocationTest(BaseManagerTest):
         locationField = "location"
 
 
+class TestEnsureIndexes(BaseLocationTest):
+    def test_init_does_not_create_indexes(self):
+        self.Model.manager()
+        collection = self.get_db_mock.return_value.__getitem__.return_value
+        collection.create_index.assert_not_called()
+        collection.create_indexes.assert_not_called()
+
+    def test_creates_declared_geo_indexes(self):
+        self.manager.collection.index_information.return_value = {}
+        self.manager.ensure_indexes()
+        created_keys = [
+            index_model.document['key'] for index_model in
+            self.manager.collection.create_indexes.call_args[0][0]
+        ]
+        self.assertIn({'location': GEOSPHERE}, created_keys)
+        self.assertIn({'deleted': 1, 'location': GEOSPHERE}, created_keys)
+
+
 class TestGetWithIn(BaseLocationTest):
     def setUp(self):
         super().setUp()
@@ -71,6 +99,136 @@ class TestGetWithIn(BaseLocationTest):
         self.manager.collection.find.assert_called_once()
 
 
+class TestGetWithinGeometry(BaseLocationTest):
+    def test_uses_spherical_geo_within(self):
+        self.manager.collection.find.return_value = []
+        polygon = Polygon([[[0, 0], [1, 0], [1, 1], [0, 0]]])
+        self.manager.get_within_geometry(polygon, additional_filter_data={'deleted': False})
+        self.assertEqual(self.manager.collection.find.call_args[0][0], {
+            'deleted': False,
+            'location': {'$geoWithin': {'$geometry': polygon.serialize()}}
+        })
+
+
+class TestGetInBbox(BaseLocationTest):
+    def setUp(self):
+        super().setUp()
+        self.manager.collection.find.return_value = []
+
+    def test_uses_indexable_polygon(self):
+        self.manager.get_in_bbox(10, 20, 11, 21, additional_filter_data={'deleted': False})
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data['deleted'], False)
+        geometry = filter_data['location']['$geoWithin']['$geometry']
+        self.assertEqual(geometry['type'], 'Polygon')
+        ring = geometry['coordinates'][0]
+        self.assertEqual(ring[0], ring[-1])
+        for corner in ([10, 20], [11, 20], [11, 21], [10, 21]):
+            self.assertIn(corner, ring)
+        # the edges along the parallels are densified
+        self.assertEqual(len(ring), 7)
+
+    def test_splits_at_antimeridian(self):
+        self.manager.get_in_bbox(170, -10, -170, 10)
+        location_filters = self.manager.collection.find.call_args[0][0]['$or']
+        self.assertEqual(
+            [location_filter['location']['$geoWithin']['$geometry']['coordinates'][0][:2]
+             for location_filter in location_filters],
+            [[[170, -10], [170.5, -10]], [[-180, -10], [-179.5, -10]]]
+        )
+
+    def test_empty_box_matches_nothing(self):
+        self.assertEqual(self.manager.get_in_bbox(10, 20, 11, 20), [])
+        self.manager.collection.find.assert_not_called()
+
+    def test_limit_returns_highest_scores(self):
+        self.manager.get_in_bbox(10, 20, 11, 21, limit=50)
+        self.assertEqual(self.manager.collection.find.call_args[1]['limit'], 50)
+        self.assertEqual(self.manager.collection.find.call_args[1]['sort'], [('score', -1), ('_id', 1)])
+
+
+class TestGetClusters(BaseManagerTest):
+    class Model(LocationBasedModel):
+        cache_geo_queries = True
+
+    def setUp(self):
+        super().setUp()
+        self.manager.collection.aggregate.side_effect = lambda pipeline: [
+            {'_id': {'x': 275.0, 'y': 202.0}, 'count': 3, 'longitude': 13.4, 'latitude': 52.5,
+             'top': {'score': 5, '_id': int_to_id_obj(1)}},
+        ]
+
+    def get_clusters(self):
+        return self.manager.get_clusters(13, 52, 14, 53, zoom=7, additional_filter_data={'deleted': False})
+
+    def test_groups_by_cell(self):
+        self.assertEqual(self.get_clusters(), [{
+            'cell': [7, 275, 202], 'count': 3, 'longitude': 13.4, 'latitude': 52.5,
+            'top_id': id_obj_to_hex_str(int_to_id_obj(1))
+        }])
+        match, match_in_boxes, group = self.manager.collection.aggregate.call_args[0][0]
+        self.assertEqual(match['$match']['deleted'], False)
+        # an indexable polygon around the tiles
+        ring = match['$match']['loc']['$geoWithin']['$geometry']['coordinates'][0]
+        self.assertEqual(ring[0], [11.25, 50.625 - BBOX_EDGE_MARGIN])
+        self.assertIn([14.0625, 53.4375 + BBOX_EDGE_MARGIN], ring)
+        coordinates = {'$arrayElemAt': ['$loc.coordinates', 0]}
+        self.assertIn({'$gte': [coordinates, 11.25]}, match_in_boxes['$match']['$expr']['$or'][0]['$and'])
+        self.assertEqual(group['$group']['top'], {'$max': {'score': '$score', '_id': '$_id'}})
+
+    def test_tiles_are_cached(self):
+        self.get_clusters()
+        self.assertEqual(len(self.get_clusters()), 1)
+        self.manager.collection.aggregate.assert_called_once()
+
+    def test_write_invalidates_tile(self):
+        self.get_clusters()
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(2)
+        self.manager.save(self.Model(loc=Point([13.5, 52.5])))
+        self.get_clusters()
+        self.assertEqual(self.manager.collection.aggregate.call_count, 2)
+
+
+class TestCells(BaseManagerTest):
+    class Model(LocationBasedModel):
+        pass
+
+    def test_save_writes_cell(self):
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(1)
+        self.manager.save(self.Model(loc=Point([13.4, 52.5])))
+        self.assertEqual(self.manager.collection.insert_one.call_args[0][0]['cell'], geohash.encode(13.4, 52.5))
+
+    def test_update_writes_cell(self):
+        self.manager.collection.update_one.return_value.matched_count = 1
+        self.manager.collection.update_one.return_value.modified_count = 1
+        item = self.Model(_id=id_obj_to_hex_str(int_to_id_obj(1)), loc=Point([13.4, 52.5]), cell='stale')
+        self.manager.save(item)
+        self.assertEqual(
+            self.manager.collection.update_one.call_args[1]['update']['$set']['cell'], geohash.encode(13.4, 52.5)
+        )
+
+    def test_declares_cell_index(self):
+        self.assertIn(Index(['cell']), self.Model.get_indexes())
+
+    def test_backfill(self):
+        self.manager.collection.find.return_value = [
+            {'_id': int_to_id_obj(idx), 'loc': {'type': 'Point', 'coordinates': [13.4, 52.5]}} for idx in range(3)
+        ]
+        self.manager.collection.bulk_write.return_value.modified_count = 2
+        self.assertEqual(self.manager.backfill_cells(batch_size=2), 4)
+        self.assertEqual(self.manager.collection.bulk_write.call_count, 2)
+        update = self.manager.collection.bulk_write.call_args_list[0][0][0][0]
+        self.assertEqual(update._doc, {'$set': {'cell': geohash.encode(13.4, 52.5)}})
+        self.assertEqual(self.manager.collection.find.call_args[0][0]['cell'], {'$exists': False})
+
+    def test_get_in_cell(self):
+        self.manager.collection.find.return_value = []
+        self.manager.get_in_cell('u33', additional_filter_data={'deleted': False})
+        self.assertEqual(self.manager.collection.find.call_args[0][0], {
+            'deleted': False, 'cell': {'$gte': 'u33', '$lt': 'u33~'}
+        })
+
+
 class TestGetNear(BaseLocationTest):
     def setUp(self):
         super().setUp()
@@ -132,3 +290,398 @@ class TestGetNear(BaseLocationTest):
             **self.kwarg
         )
         self.manager.collection.find.assert_called_once()
+
+
+class TestUnsortedNear(BaseLocationTest):
+    def setUp(self):
+        super().setUp()
+        self.location = Point([13.4, 52.5])
+        self.manager.collection.find.return_value = []
+
+    def test_uses_center_sphere(self):
+        self.manager.get_near(
+            self.location, 1000, additional_filter_data={'deleted': False}, sort_by_distance=False, limit=5
+        )
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data, {
+            'deleted': False,
+            'location': {'$geoWithin': {'$centerSphere': [[13.4, 52.5], 1000 / EARTH_RADIUS]}}
+        })
+
+    def test_min_distance_excludes_inner_circle(self):
+        self.manager.get_near(self.location, 1000, min_distance=100, sort_by_distance=False)
+        location_filter = self.manager.collection.find.call_args[0][0]['location']
+        self.assertEqual(location_filter['$not'], {'$geoWithin': {'$centerSphere': [[13.4, 52.5], 100 / EARTH_RADIUS]}})
+
+    def test_count(self):
+        self.manager.collection.count_documents.return_value = 3
+        self.assertEqual(self.manager.count_near(self.location, 1000, limit=100), 3)
+        filter_data = self.manager.collection.count_documents.call_args[0][0]
+        self.assertIn('$centerSphere', filter_data['location']['$geoWithin'])
+        self.assertEqual(self.manager.collection.count_documents.call_args[1], {'limit': 100})
+
+    def test_page_is_paged_by_id(self):
+        self.manager.get_near_page(self.location, 1000, limit=10, sort_by_distance=False)
+        self.assertEqual(self.manager.collection.find.call_args[1]['sort'], [('_id', 1)])
+        self.assertEqual(self.manager.collection.find.call_args[1]['limit'], 11)
+
+
+class TestGetNearPage(BaseLocationTest):
+    def setUp(self):
+        super().setUp()
+        self.location = Point([0, 0])
+        # one item every 0.001 degree (~111m) east of location, two items share the third distance
+        self.raw_items = [
+            self.build_raw_item(idx, longitude) for idx, longitude in
+            enumerate([0.001, 0.002, 0.003, 0.003, 0.004], start=1)
+        ]
+
+        def side_effect(pipeline):
+            geo_near = pipeline[0]['$geoNear']
+            id_filter = geo_near['query'].get('_id', {})
+            matching = []
+            for raw_item in self.raw_items:
+                distance = distance_between(self.location, Point(raw_item['location']['coordinates']))
+                if raw_item['_id'] in id_filter.get('$nin', []) or raw_item['_id'] <= id_filter.get('$gt', int_to_id_obj(0)) or \
+                        not geo_near['minDistance'] <= distance <= geo_near.get('maxDistance', distance):
+                    continue
+                matching.append(dict(raw_item, **{geo_near['distanceField']: distance}))
+            matching.sort(key=lambda raw_item: raw_item['distance'])
+            for stage in pipeline[1:]:
+                if '$sort' in stage:
+                    matching.sort(key=lambda raw_item: raw_item['_id'])
+                if '$limit' in stage:
+                    matching = matching[:stage['$limit']]
+            return matching
+
+        self.manager.collection.aggregate.side_effect = side_effect
+
+    def build_raw_item(self, idx, longitude):
+        return {
+            '_id': int_to_id_obj(idx),
+            'deleted': False,
+            'location': {
+                'type': 'Point',
+                'coordinates': [longitude, 0]
+            }
+        }
+
+    def read_all_pages(self, limit):
+        pages = [self.manager.get_near_page(self.location, 10000, limit=limit)]
+        while pages[-1].next_cursor:
+            pages.append(self.manager.get_near_page(
+                self.location, 10000, limit=limit, after=pages[-1].next_cursor
+            ))
+        return pages
+
+    def test_returns_every_item_exactly_once(self):
+        for limit in range(1, 6):
+            pages = self.read_all_pages(limit)
+            ids = [item._id for page in pages for item in page.items]
+            self.assertEqual(
+                ids,
+                [id_obj_to_hex_str(raw_item['_id']) for raw_item in self.raw_items]
+            )
+
+    def test_items_sharing_a_distance_are_paged_by_id(self):
+        self.raw_items = [
+            self.build_raw_item(idx, longitude) for idx, longitude in
+            enumerate([0.001] + [0.002] * 7 + [0.003], start=1)
+        ]
+        self.raw_items[3], self.raw_items[6] = self.raw_items[6], self.raw_items[3]
+        for limit in range(1, 5):
+            pages = self.read_all_pages(limit)
+            ids = [item._id for page in pages for item in page.items]
+            self.assertEqual(sorted(ids), [id_obj_to_hex_str(int_to_id_obj(idx)) for idx in range(1, 10)])
+            for page in pages[:-1]:
+                self.assertLessEqual(len(decode_distance_cursor(page.next_cursor).ids), limit)
+
+    def test_moves_min_distance_forward(self):
+        page = self.manager.get_near_page(self.location, 10000, limit=2)
+        self.manager.get_near_page(self.location, 10000, limit=2, after=page.next_cursor)
+
+        geo_near, limit = self.manager.collection.aggregate.call_args[0][0][:2]
+        expected_min_distance = distance_between(self.location, Point([0.002, 0])) - DISTANCE_TOLERANCE
+        self.assertAlmostEqual(geo_near['$geoNear']['minDistance'], expected_min_distance)
+        self.assertEqual(geo_near['$geoNear']['query'], {'_id': {'$nin': [int_to_id_obj(2)]}})
+        self.assertEqual(geo_near['$geoNear']['key'], 'location')
+        self.assertEqual(limit, {'$limit': 3})
+
+    def test_items_carry_distance(self):
+        page = self.manager.get_near_page(self.location, 10000, limit=2)
+        self.assertEqual(page.items[0].distance, distance_between(self.location, Point([0.001, 0])))
+        self.assertEqual(page.items[0].serialize()['distance'], page.items[0].distance)
+
+    def test_distance_is_only_serialized_if_requested(self):
+        page = self.manager.get_near_page(self.location, 10000, limit=2, fields=('_id',))
+        self.assertEqual(page.items[0].serialize(), {'_id': id_obj_to_hex_str(int_to_id_obj(1))})
+        self.assertIsNotNone(page.next_cursor)
+
+        page = self.manager.get_near_page(self.location, 10000, limit=2, fields=('_id', 'distance'))
+        self.assertIn('distance', page.items[0].serialize())
+
+    def test_with_distance_projects_distance(self):
+        self.manager.collection.aggregate.side_effect = None
+        self.manager.collection.aggregate.return_value = []
+        self.manager.get_near_with_distance(self.location, 10000, fields=('_id',))
+        pipeline = self.manager.collection.aggregate.call_args[0][0]
+        self.assertEqual(pipeline[-1], {'$project': {'_id': True, 'distance': True}})
+
+    def test_k_nearest(self):
+        items = self.manager.get_k_nearest(self.location, 3)
+        self.assertEqual([item._id for item in items], [
+            id_obj_to_hex_str(int_to_id_obj(idx)) for idx in range(1, 4)
+        ])
+        geo_near, limit = self.manager.collection.aggregate.call_args[0][0]
+        self.assertNotIn('maxDistance', geo_near['$geoNear'])
+        self.assertEqual(limit, {'$limit': 3})
+
+    def test_k_nearest_with_distance_cap(self):
+        self.manager.get_k_nearest(self.location, 3, max_distance=150)
+        geo_near = self.manager.collection.aggregate.call_args[0][0][0]
+        self.assertEqual(geo_near['$geoNear']['maxDistance'], 150)
+
+    def test_distance_is_not_saved(self):
+        item = self.Model(location=Point([0, 0]), distance=10.0)
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(9)
+        self.manager.save(item)
+        self.assertNotIn('distance', self.manager.collection.insert_one.call_args[0][0])
+
+    def test_last_page_has_no_cursor(self):
+        page = self.manager.get_near_page(self.location, 10000, limit=5)
+        self.assertEqual(len(page.items), 5)
+        self.assertIsNone(page.next_cursor)
+
+
+class TestQueryCache(BaseManagerTest):
+    class Model(LocationBasedModel):
+        cache_geo_queries = True
+
+    def setUp(self):
+        super().setUp()
+        self.location = Point([13.4, 52.5])
+        self.manager.collection.find.return_value = [
+            {
+                '_id': int_to_id_obj(1),
+                'deleted': False,
+                'loc': {'type': 'Point', 'coordinates': [13.4001, 52.5001]}
+            }
+        ]
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(2)
+        # write generation shared by all processes
+        self.generation = 0
+        self.manager.write_generation = lambda: self.generation
+        self.manager.bump_write_generation = self.bump_write_generation
+
+    def bump_write_generation(self):
+        self.generation += 1
+        return self.generation
+
+    def get_near(self):
+        return self.manager.get_near(self.location, 500, additional_filter_data={'deleted': False})
+
+    def test_repeated_queries_are_served_from_cache(self):
+        self.assertEqual(len(self.get_near()), 1)
+        self.assertEqual(len(self.get_near()), 1)
+        self.manager.collection.find.assert_called_once()
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data['deleted'], False)
+        self.assertIn('$centerSphere', filter_data['loc']['$geoWithin'])
+
+    def test_save_nearby_invalidates(self):
+        self.get_near()
+        self.manager.save(self.Model(loc=Point([13.4002, 52.5002])))
+        self.get_near()
+        self.assertEqual(self.manager.collection.find.call_count, 2)
+
+    def test_delete_of_cached_item_invalidates(self):
+        self.get_near()
+        self.manager.collection.delete_one.return_value.deleted_count = 1
+        self.manager.delete_by_id(int_to_id_obj(1))
+        self.get_near()
+        self.assertEqual(self.manager.collection.find.call_count, 2)
+
+    def test_save_far_away_keeps_entries(self):
+        self.get_near()
+        self.manager.save(self.Model(loc=Point([-70, -30])))
+        self.get_near()
+        self.manager.collection.find.assert_called_once()
+        self.assertEqual(self.generation, 1)
+
+    def test_write_of_other_process_invalidates(self):
+        self.get_near()
+        self.generation += 1
+        self.get_near()
+        self.assertEqual(self.manager.collection.find.call_count, 2)
+
+    def set_cached_items(self, coordinates):
+        self.manager.collection.find.return_value = [
+            {'_id': int_to_id_obj(idx), 'deleted': False, 'score': idx, 'loc': {'type': 'Point', 'coordinates': point}}
+            for idx, point in enumerate(coordinates, 1)
+        ]
+
+    def test_pages_are_cut_out_of_the_cache(self):
+        self.set_cached_items([[13.4003, 52.5], [13.4001, 52.5], [13.4002, 52.5]])
+        page = self.manager.get_near_page(self.location, 500, limit=2)
+        self.assertEqual([item._id for item in page.items], [id_obj_to_hex_str(int_to_id_obj(idx)) for idx in (2, 3)])
+        page = self.manager.get_near_page(self.location, 500, limit=2, after=page.next_cursor)
+        self.assertEqual([item._id for item in page.items], [id_obj_to_hex_str(int_to_id_obj(1))])
+        self.assertIsNone(page.next_cursor)
+
+        self.manager.collection.find.assert_called_once()
+        self.manager.collection.aggregate.assert_not_called()
+
+    def test_pages_of_items_at_one_distance_are_cut_out_of_the_cache(self):
+        self.set_cached_items([[13.4001, 52.5]] * 5)
+        ids, after = [], None
+        while True:
+            page = self.manager.get_near_page(self.location, 500, limit=2, after=after)
+            ids += [item._id for item in page.items]
+            after = page.next_cursor
+            if after is None:
+                break
+        self.assertEqual(ids, [id_obj_to_hex_str(int_to_id_obj(idx)) for idx in range(1, 6)])
+        self.manager.collection.aggregate.assert_not_called()
+
+    def test_count_and_sort_use_the_cache(self):
+        self.set_cached_items([[13.4001, 52.5], [13.4002, 52.5], [13.5, 52.5]])
+        self.assertEqual(self.manager.count_near(self.location, 500), 2)
+        self.assertEqual(self.manager.count_near(self.location, 500, limit=1), 1)
+        items = self.manager.get_near_with_distance(self.location, 500, limit=2, sort=[('score', DESCENDING)])
+
+        self.assertEqual([item._id for item in items], [id_obj_to_hex_str(int_to_id_obj(idx)) for idx in (2, 1)])
+        self.manager.collection.find.assert_called_once()
+        self.manager.collection.count_documents.assert_not_called()
+        self.manager.collection.aggregate.assert_not_called()
+
+    def test_stream_uses_the_cache(self):
+        self.assertEqual(len(list(self.manager.get_near(self.location, 500, stream=True))), 1)
+        self.assertEqual(len(list(self.manager.get_near(self.location, 500, stream=True))), 1)
+        self.manager.collection.find.assert_called_once()
+        self.assertIn('$centerSphere', self.manager.collection.find.call_args[0][0]['loc']['$geoWithin'])
+
+    def test_large_radius_bypasses_cache(self):
+        self.manager.collection.aggregate.return_value = []
+        self.manager.get_near_page(self.location, 50000, limit=10)
+        self.manager.collection.find.assert_not_called()
+        self.manager.collection.aggregate.assert_called_once()
+
+
+class TestSpatialIndex(BaseManagerTest):
+    class Model(LocationBasedModel):
+        pass
+
+    def setUp(self):
+        super().setUp()
+        self.location = Point([13.4, 52.5])
+        self.raw_items = [
+            {
+                '_id': int_to_id_obj(idx),
+                'deleted': False,
+                'loc': {'type': 'Point', 'coordinates': [13.4 + idx / 10000, 52.5]}
+            } for idx in range(1, 4)
+        ]
+        self.manager.collection.find.side_effect = self.find
+        self.manager.enable_spatial_index(GridSpatialIndex())
+        self.manager.warm_up_spatial_index()
+        self.manager.collection.find.reset_mock()
+
+    def find(self, filter_data, projection=None, **kwargs):
+        if '_id' not in filter_data:
+            return self.raw_items
+        return [raw_item for raw_item in self.raw_items if raw_item['_id'] in filter_data['_id']['$in']]
+
+    def get_near(self, max_distance=10):
+        return self.manager.get_near(self.location, max_distance, additional_filter_data={'deleted': False})
+
+    def test_fetches_candidates_by_id(self):
+        items = self.get_near()
+        self.assertEqual([item._id for item in items], [id_obj_to_hex_str(int_to_id_obj(1))])
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data, {'deleted': False, '_id': {'$in': [int_to_id_obj(1)]}})
+
+    def test_other_filters_go_to_the_database(self):
+        self.manager.get_near(self.location, 15, additional_filter_data={})
+        self.assertIn('$near', self.manager.collection.find.call_args[0][0]['loc'])
+
+    def test_queries_hold_the_lock_of_the_writes(self):
+        near, within = self.manager.spatial_index.near, self.manager.spatial_index.within
+        locked = []
+
+        def locked_near(*args):
+            locked.append(self.manager._spatial_index_lock.locked())
+            return near(*args)
+
+        def locked_within(*args):
+            locked.append(self.manager._spatial_index_lock.locked())
+            return within(*args)
+
+        self.manager.spatial_index.near, self.manager.spatial_index.within = locked_near, locked_within
+        self.get_near()
+        self.manager.get_near_page(self.location, 100, limit=1, additional_filter_data={'deleted': False})
+        self.manager.get_within(
+            [Point([13, 52]), Point([14, 52]), Point([14, 53])], additional_filter_data={'deleted': False}
+        )
+        self.assertEqual(locked, [True, True, True])
+
+    def test_save_adds_to_index(self):
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(4)
+        self.manager.save(self.Model(loc=Point([13.4, 52.5])))
+        self.assertIn(int_to_id_obj(4), [_id for _, _id in self.manager.spatial_index.near(13.4, 52.5, 1)])
+
+    def test_delete_removes_from_index(self):
+        self.manager.collection.delete_one.return_value.deleted_count = 1
+        self.manager.delete_by_id(int_to_id_obj(1))
+        self.assertEqual(len(self.manager.spatial_index), 2)
+
+    def test_page_skips_items_removed_elsewhere(self):
+        del self.raw_items[0]
+        page = self.manager.get_near_page(self.location, 100, limit=1, additional_filter_data={'deleted': False})
+        self.assertEqual([item._id for item in page.items], [id_obj_to_hex_str(int_to_id_obj(2))])
+        self.assertIsNotNone(page.next_cursor)
+
+    def test_bbox_is_answered_by_index(self):
+        items = self.manager.get_in_bbox(13.40015, 52, 14, 53, additional_filter_data={'deleted': False}, limit=5)
+        self.assertEqual(len(items), 2)
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data['_id'], {'$in': [int_to_id_obj(2), int_to_id_obj(3)]})
+
+    def test_stale_index_is_refreshed_in_background(self):
+        loading = threading.Event()
+        find = self.find
+
+        def blocking_find(filter_data, projection=None, **kwargs):
+            if '_id' not in filter_data:
+                loading.wait(5)
+            return find(filter_data, projection=projection, **kwargs)
+
+        self.manager.collection.find.side_effect = blocking_find
+        stale_index = self.manager.spatial_index
+        stale_index.max_age = -1
+        # the stale index answers while the new one loads
+        self.assertEqual(len(self.get_near()), 1)
+        self.assertIs(self.manager.spatial_index, stale_index)
+
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(4)
+        self.manager.save(self.Model(loc=Point([13.4, 52.5])))
+        loading.set()
+        self.manager.spatial_index_refresh.join(5)
+        self.assertIsNot(self.manager.spatial_index, stale_index)
+        # the write during the refresh is kept
+        self.assertEqual(len(self.manager.spatial_index), 4)
+
+    def test_refresh_runs_once_at_a_time(self):
+        self.manager.spatial_index.max_age = -1
+        self.manager.collection.find.side_effect = lambda filter_data, **kwargs: []
+        self.manager._spatial_index_writes = []
+        self.get_near()
+        self.assertIsNone(self.manager.spatial_index_refresh)
+
+    def test_full_index_is_not_warmed_up_again(self):
+        self.manager.spatial_index.max_size = 2
+        self.assertIsNone(self.manager.warm_up_spatial_index())
+        self.manager.spatial_index.max_age = -1
+        self.manager.collection.find.reset_mock()
+        self.get_near()
+        self.assertIsNone(self.manager.spatial_index_refresh)
+        self.assertIn('$near', self.manager.collection.find.call_args[0][0]['loc'])
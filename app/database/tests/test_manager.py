@@ -3,11 +3,15 @@ import unittest
 import unittest.mock as mock
 from copy import copy
 
+from marshmallow import fields
 from marshmallow.fields import Field
+from pymongo.errors import BulkWriteError
 
 import models.model_base as model_base
 from database import manager, utils
-from database.exceptions import NotFoundError, InsertFailedError, UpdateFailedError
+from database.exceptions import DeletionFailedException, NotFoundError, InsertFailedError, UpdateFailedError
+from database.pagination import encode_cursor, decode_cursor
+from database.registry import managerRegistry
 from database.utils import int_to_id_obj, id_obj_to_hex_str
 
 
@@ -24,12 +28,14 @@ class BaseManagerTest(unittest.TestCase):
 
     def setUp(self):
         db_mock = self.DbMock()
+        managerRegistry.reset()
         self.patcher = mock.patch('database.manager.get_db')
         self.get_db_mock = self.patcher.start()
         self.manager = self.Model.manager()
 
     def tearDown(self):
         self.patcher.stop()
+        managerRegistry.reset()
 
 
 class TestGetOneById(BaseManagerTest):
@@ -193,20 +199,100 @@ class TestGet(BaseManagerTest):
         )
 
 
-class TestExist(BaseManagerTest):
-    def build_mock(self, count):
-        class ResultMock:
-            class WithCount:
-                def __init__(self):
-                    self.count = mock.MagicMock(return_value=count)
+class TestGetPaginated(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.raw_items = [
+            {'_id': int_to_id_obj(idx), 'deleted': False} for idx in range(1, 5)
+        ]
+        self.manager.collection.find.side_effect = lambda _filter_data, **kwargs: self.raw_items[:kwargs['limit']]
+
+    def test_sorts_by_id_and_limits(self):
+        self.manager.get({'deleted': False}, limit=2)
+        self.manager.collection.find.assert_called_once_with(
+            {'deleted': False}, show_record_id=True, sort=[('_id', 1)], limit=2
+        )
 
-            def __init__(self):
-                self.limit = mock.Mock(return_value=self.__class__.WithCount()
-                                       )
+    def test_continues_after_cursor(self):
+        cursor = encode_cursor(int_to_id_obj(2))
+        self.manager.get({'deleted': False}, limit=2, after=cursor)
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data, {'deleted': False, '_id': {'$gt': int_to_id_obj(2)}})
+
+    def test_combines_cursor_with_id_filter(self):
+        cursor = encode_cursor(int_to_id_obj(2))
+        self.manager.get({'_id': {'$ne': int_to_id_obj(3)}}, limit=2, after=cursor)
+        filter_data = self.manager.collection.find.call_args[0][0]
+        self.assertEqual(filter_data, {'$and': [
+            {'_id': {'$ne': int_to_id_obj(3)}},
+            {'_id': {'$gt': int_to_id_obj(2)}}
+        ]})
+
+    def test_page_with_more_items_has_next_cursor(self):
+        page = self.manager.get_page({}, limit=2)
+        self.assertEqual(len(page.items), 2)
+        self.assertEqual(decode_cursor(page.next_cursor), int_to_id_obj(2))
+        self.assertEqual(self.manager.collection.find.call_args[1]['limit'], 3)
+
+    def test_last_page_has_no_next_cursor(self):
+        page = self.manager.get_page({}, limit=4)
+        self.assertEqual(len(page.items), 4)
+        self.assertIsNone(page.next_cursor)
+
+
+class TestGetStream(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.raw_items = [
+            {'_id': int_to_id_obj(idx), 'deleted': False} for idx in range(1, 6)
+        ]
+        self.manager.collection.find.return_value = iter(self.raw_items)
 
-        return ResultMock()
+    def test_is_lazy(self):
+        self.manager.get({'deleted': False}, stream=True)
+        self.manager.collection.find.assert_not_called()
 
-    def test_calls_find(self):
+    def test_yields_all_items_with_batch_size(self):
+        items = list(self.manager.get({'deleted': False}, stream=True, batch_size=2))
+
+        self.assertEqual(
+            [item._id for item in items],
+            [id_obj_to_hex_str(raw_item['_id']) for raw_item in self.raw_items]
+        )
+        self.manager.collection.find.assert_called_once_with(
+            {'deleted': False}, show_record_id=True, batch_size=2
+        )
+
+    def test_loads_one_batch_at_a_time(self):
+        with mock.patch.object(self.manager, '_load', wraps=self.manager._load) as load_mock:
+            list(self.manager.get({}, stream=True, batch_size=2))
+        self.assertEqual(
+            [len(call[0][0]) for call in load_mock.call_args_list], [2, 2, 1]
+        )
+
+
+class TestGetWithFields(BaseManagerTest):
+    def test_get_projects_fields(self):
+        self.manager.collection.find.return_value = [{'_id': int_to_id_obj(1)}]
+        items = self.manager.get({}, fields=('_id',))
+
+        self.manager.collection.find.assert_called_once_with(
+            {}, show_record_id=True, projection={'_id': True}
+        )
+        self.assertEqual(items[0]._only_, {'_id'})
+
+    def test_get_one_projects_fields(self):
+        self.manager.collection.find_one.return_value = {'_id': int_to_id_obj(1)}
+        item = self.manager.get_one({}, fields=('_id', 'deleted'))
+
+        self.manager.collection.find_one.assert_called_once_with(
+            {}, projection={'_id': True, 'deleted': True}
+        )
+        self.assertEqual(item._only_, {'_id', 'deleted'})
+
+
+class TestExist(BaseManagerTest):
+    def test_calls_find_one_with_id_projection(self):
         filter_data = {
             'foo': 'bar'
         }
@@ -214,44 +300,44 @@ class TestExist(BaseManagerTest):
             'bam': 'baz'
         }
 
-        def side_effect(_filter_data, **kwargs):
+        def side_effect(_filter_data, projection, **kwargs):
             self.assertEqual(filter_data, _filter_data)
+            self.assertEqual(projection, {'_id': True})
             self.assertEqual(kwargs['bam'], kwarg['bam'])
+            return {'_id': int_to_id_obj(1)}
 
-            self.resultMock = self.build_mock(1)
-            return self.resultMock
-
-        self.manager.collection.find.side_effect = side_effect
+        self.manager.collection.find_one.side_effect = side_effect
 
         exists = self.manager.exists(
             filter_data, **kwarg
         )
 
-        self.resultMock.limit.assert_called_with(1)
+        self.manager.collection.find_one.assert_called_once()
         self.assertTrue(exists)
 
-    def test_return_empty_array_for_no_data(self):
-        def side_effect(_filter_data, **kwargs):
-            self.assertEqual(filter_data, _filter_data)
-            self.assertEqual(kwargs['bam'], kwarg['bam'])
+    def test_returns_false_for_no_data(self):
+        self.manager.collection.find_one.return_value = None
 
-            self.resultMock = self.build_mock(0)
-            return self.resultMock
+        exists = self.manager.exists({
+            'foo': 'bar'
+        })
 
-        self.manager.collection.find.side_effect = side_effect
+        self.assertFalse(exists)
 
-        filter_data = {
-            'foo': 'bar'
-        }
-        kwarg = {
-            'bam': 'baz'
-        }
 
-        exists = self.manager.exists(
-            filter_data, **kwarg
-        )
+class TestExistingValues(BaseManagerTest):
+    def test_returns_found_values_of_one_in_query(self):
+        self.manager.collection.find.return_value = [
+            {'_id': int_to_id_obj(1), 'foo': 1},
+            {'_id': int_to_id_obj(2), 'foo': 3},
+        ]
 
-        self.assertFalse(exists)
+        existing = self.manager.existing_values('foo', [1, 2, 3])
+
+        self.assertEqual(existing, {1, 3})
+        self.manager.collection.find.assert_called_once_with(
+            {'foo': {'$in': [1, 2, 3]}}, projection={'foo': True}
+        )
 
 
 class TestSaveForNewItems(BaseManagerTest):
@@ -307,6 +393,14 @@ class TestSaveForNewItems(BaseManagerTest):
         self.assertEqual(saved_item._id, hex_str_from_id)
         self.assert_function_calls()
 
+    def test_validates_references_before_insert(self):
+        with mock.patch('database.manager.referenceValidator') as validator_mock:
+            validator_mock.validate.side_effect = NotFoundError('table', 1)
+            with self.assertRaises(NotFoundError):
+                self.manager.save(self.item)
+        validator_mock.validate.assert_called_once_with([self.item])
+        self.manager.collection.insert_one.assert_not_called()
+
     def test_throws_insert_fails_exception_if_no_inserted_id_is_returned(self):
         self.some_id = None
 
@@ -328,7 +422,7 @@ class TestSaveForExistingItems(BaseManagerTest):
 
         self.item = self.Model(_id=int_to_id_obj(self.some_id))
         self.item_json = self.item.serialize(
-            field_filter_fn=self.manager._default_exclude_in_save_fn
+            exclude=['_id'], field_filter_fn=self.manager._default_exclude_in_save_fn
         )
 
         def side_effect(filter_data, update):
@@ -373,12 +467,382 @@ class TestSaveForExistingItems(BaseManagerTest):
         with self.assertRaises(NotFoundError):
             self.manager.save(self.item)
 
-    def test_throws_updated_failed_exception_if_no_item_gets_updated(self):
+    def test_unmodified_item_is_saved(self):
         self.matched_count = 1
         self.modified_count = 0
 
+        self.assertEqual(self.manager.save(self.item), self.item)
+        self.assertEqual(self.item.stored_data, self.item_json)
+
+
+class TestSaveMany(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.items = [self.Model() for _ in range(5)]
+        self.validator_patcher = mock.patch('database.manager.referenceValidator')
+        self.validator_mock = self.validator_patcher.start()
+        self.validator_mock.find_invalid.return_value = {}
+
+    def tearDown(self):
+        self.validator_patcher.stop()
+        super().tearDown()
+
+    def inserted_documents(self):
+        return [
+            document for call in self.manager.collection.insert_many.call_args_list for document in call[0][0]
+        ]
+
+    def test_inserts_in_unordered_batches(self):
+        errors = self.manager.save_many(self.items, batch_size=2)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(self.manager.collection.insert_many.call_count, 3)
+        self.assertTrue(all(
+            call[1] == {'ordered': False} for call in self.manager.collection.insert_many.call_args_list
+        ))
+        self.assertEqual(len(self.inserted_documents()), 5)
+        self.manager.collection.insert_one.assert_not_called()
+
+    def test_assigns_ids(self):
+        self.manager.save_many(self.items)
+
+        self.assertEqual(
+            [item._id for item in self.items],
+            [id_obj_to_hex_str(document['_id']) for document in self.inserted_documents()]
+        )
+
+    def test_validates_references_of_all_items_at_once(self):
+        self.validator_mock.find_invalid.return_value = {1: NotFoundError('table', 1)}
+        errors = self.manager.save_many(self.items)
+
+        self.validator_mock.find_invalid.assert_called_once_with(self.items)
+        self.assertEqual(list(errors), [1])
+        self.assertIsNone(self.items[1]._id)
+        self.assertEqual(len(self.inserted_documents()), 4)
+
+    def test_reports_failed_writes_per_item(self):
+        self.manager.collection.insert_many.side_effect = BulkWriteError({
+            'writeErrors': [{'index': 1, 'code': 11000, 'errmsg': 'duplicate key'}]
+        })
+        errors = self.manager.save_many(self.items, batch_size=3)
+
+        self.assertEqual(sorted(errors), [1, 4])
+        self.assertIsInstance(errors[1], InsertFailedError)
+        self.assertEqual([item._id is None for item in self.items], [False, True, False, False, True])
+
+    def test_existing_items_are_not_inserted(self):
+        self.items[0]._id = int_to_id_obj(1)
+        errors = self.manager.save_many(self.items)
+
+        self.assertIsInstance(errors[0], InsertFailedError)
+        self.assertEqual(len(self.inserted_documents()), 4)
+
+    def test_notifies_write_listeners(self):
+        listener = mock.MagicMock()
+        self.manager.add_write_listener(listener)
+        self.manager.save_many(self.items)
+
+        self.assertEqual(listener.call_count, 5)
+
+
+class TestUpdateManyItems(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.ids = [int_to_id_obj(idx) for idx in range(1, 5)]
+        self.items = [self.Model(_id=id_obj_to_hex_str(_id)) for _id in self.ids]
+        self.validator_patcher = mock.patch('database.manager.referenceValidator')
+        self.validator_mock = self.validator_patcher.start()
+        self.validator_mock.find_invalid.return_value = {}
+        self.set_result(matched=4, modified=4)
+        self.manager.collection.find.return_value = [{'_id': _id} for _id in self.ids]
+
+    def tearDown(self):
+        self.validator_patcher.stop()
+        super().tearDown()
+
+    def set_result(self, matched, modified):
+        self.manager.collection.bulk_write.return_value.bulk_api_result = {
+            'nMatched': matched, 'nModified': modified
+        }
+
+    def test_sends_one_bulk_write_of_update_one(self):
+        errors = self.manager.update_many_items(self.items)
+
+        self.assertEqual(errors, {})
+        self.manager.collection.bulk_write.assert_called_once()
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertEqual([operation._filter for operation in operations], [{'_id': _id} for _id in self.ids])
+        self.assertTrue(all('$set' in operation._doc for operation in operations))
+        self.manager.collection.update_one.assert_not_called()
+        self.manager.collection.find.assert_not_called()
+
+    def test_reports_missing_items(self):
+        self.set_result(matched=3, modified=3)
+        self.manager.collection.find.return_value = [{'_id': _id} for _id in self.ids if _id != self.ids[2]]
+        errors = self.manager.update_many_items(self.items)
+
+        self.assertEqual(list(errors), [2])
+        self.assertIsInstance(errors[2], NotFoundError)
+
+    def test_does_not_set_the_id(self):
+        self.manager.update_many_items(self.items)
+
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertTrue(all('_id' not in operation._doc['$set'] for operation in operations))
+
+    def test_unmodified_items_are_updated(self):
+        self.set_result(matched=4, modified=0)
+        errors = self.manager.update_many_items(self.items)
+
+        self.assertEqual(errors, {})
+
+    def test_result_does_not_depend_on_the_batch(self):
+        # one of two items held the data already, it is updated in either batch size
+        self.set_result(matched=2, modified=1)
+        self.assertEqual(self.manager.update_many_items(self.items[:2]), {})
+        self.set_result(matched=1, modified=0)
+        self.assertEqual(self.manager.update_many_items(self.items[:2], batch_size=1), {})
+
+    def test_reports_failed_writes(self):
+        self.manager.collection.bulk_write.side_effect = BulkWriteError({
+            'nMatched': 3, 'nModified': 3, 'writeErrors': [{'index': 0, 'errmsg': 'duplicate key'}]
+        })
+        errors = self.manager.update_many_items(self.items)
+
+        self.assertEqual(list(errors), [0])
+        self.assertIsInstance(errors[0], UpdateFailedError)
+
+    def test_new_items_are_not_found(self):
+        errors = self.manager.update_many_items([self.Model()])
+
+        self.assertIsInstance(errors[0], NotFoundError)
+        self.manager.collection.bulk_write.assert_not_called()
+
+    def test_notifies_write_listeners(self):
+        listener = mock.MagicMock()
+        self.manager.add_write_listener(listener)
+        self.manager.update_many_items(self.items)
+
+        self.assertEqual(listener.call_count, 4)
+
+
+class TestDeleteManyIds(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.ids = [int_to_id_obj(idx) for idx in range(1, 5)]
+        self.manager.collection.find.return_value = [{'_id': _id} for _id in self.ids[:3]]
+
+    def test_deletes_existing_ids_with_one_bulk_write(self):
+        errors = self.manager.delete_many_ids(self.ids)
+
+        self.assertEqual(list(errors), [3])
+        self.assertIsInstance(errors[3], NotFoundError)
+        self.manager.collection.find.assert_called_once_with(
+            {'_id': {'$in': self.ids}}, projection={'_id': True}
+        )
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertEqual([operation._filter for operation in operations], [{'_id': _id} for _id in self.ids[:3]])
+        self.manager.collection.delete_one.assert_not_called()
+
+    def test_accepts_hex_strings(self):
+        self.manager.delete_many_ids([id_obj_to_hex_str(_id) for _id in self.ids])
+
+        self.manager.collection.find.assert_called_once_with(
+            {'_id': {'$in': self.ids}}, projection={'_id': True}
+        )
+
+    def test_reports_failed_writes(self):
+        self.manager.collection.bulk_write.side_effect = BulkWriteError({
+            'writeErrors': [{'index': 1, 'errmsg': 'failed'}]
+        })
+        errors = self.manager.delete_many_ids(self.ids)
+
+        self.assertIsInstance(errors[1], DeletionFailedException)
+
+    def test_notifies_write_listeners_of_deleted_ids(self):
+        listener = mock.MagicMock()
+        self.manager.add_write_listener(listener)
+        self.manager.delete_many_ids(self.ids)
+
+        self.assertEqual(
+            [call[0][1] for call in listener.call_args_list], [id_obj_to_hex_str(_id) for _id in self.ids[:3]]
+        )
+
+
+class TestIncrement(BaseManagerTest):
+    def test_increments_with_inc(self):
+        self.manager.collection.update_one.return_value.matched_count = 1
+        self.manager.increment(id_obj_to_hex_str(int_to_id_obj(1)), 'score', -1)
+
+        self.manager.collection.update_one.assert_called_once_with(
+            {'_id': int_to_id_obj(1)}, {'$inc': {'score': -1}}
+        )
+
+    def test_throws_not_found_exception_if_no_item_was_found(self):
+        self.manager.collection.update_one.return_value.matched_count = 0
+        with self.assertRaises(NotFoundError):
+            self.manager.increment(int_to_id_obj(1), 'score')
+
+    def test_increment_many_sends_one_bulk_write(self):
+        self.manager.collection.bulk_write.return_value.bulk_api_result = {'nMatched': 2, 'nModified': 2}
+        errors = self.manager.increment_many({int_to_id_obj(1): 3, int_to_id_obj(2): -1}, 'score')
+
+        self.assertEqual(errors, {})
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertEqual([operation._doc for operation in operations], [{'$inc': {'score': 3}}, {'$inc': {'score': -1}}])
+        self.manager.collection.find.assert_not_called()
+
+    def test_increment_many_reports_missing_ids(self):
+        self.manager.collection.bulk_write.return_value.bulk_api_result = {'nMatched': 1, 'nModified': 1}
+        self.manager.collection.find.return_value = [{'_id': int_to_id_obj(1)}]
+        errors = self.manager.increment_many({int_to_id_obj(1): 3, int_to_id_obj(2): -1}, 'score')
+
+        self.assertEqual(list(errors), [int_to_id_obj(2)])
+        self.assertIsInstance(errors[int_to_id_obj(2)], NotFoundError)
+
+
+class TestDirtyTracking(BaseManagerTest):
+    class Model(model_base.ModelBase):
+        @classmethod
+        def get_scheme_cls(cls, class_to_create=None):
+            base_schema = super(TestDirtyTracking.Model, cls).get_scheme_cls(class_to_create)
+
+            class Schema(base_schema):
+                topic = fields.String(allow_none=True)
+                score = fields.Integer(default=0)
+
+            return Schema
+
+    def setUp(self):
+        super().setUp()
+        self.manager.collection.update_one.return_value.matched_count = 1
+        self.manager.collection.update_one.return_value.modified_count = 1
+        self.item = self.manager._load({'_id': int_to_id_obj(1), 'deleted': False, 'topic': 'topic', 'score': 1})
+
+    def test_loaded_items_keep_the_raw_document(self):
+        self.assertEqual(self.item.stored_data['topic'], 'topic')
+
+    def test_sets_only_changed_fields(self):
+        self.item.score = 2
+        self.manager.save(self.item)
+
+        self.manager.collection.update_one.assert_called_once_with(
+            {'_id': int_to_id_obj(1)}, update={'$set': {'score': 2}}
+        )
+
+    def test_unsets_fields_changed_to_none(self):
+        self.item.topic = None
+        self.manager.save(self.item)
+
+        self.manager.collection.update_one.assert_called_once_with(
+            {'_id': int_to_id_obj(1)}, update={'$unset': {'topic': ''}}
+        )
+
+    def test_skips_unchanged_items(self):
+        listener = mock.MagicMock()
+        self.manager.add_write_listener(listener)
+        self.assertIs(self.manager.save(self.item), self.item)
+
+        self.manager.collection.update_one.assert_not_called()
+        listener.assert_not_called()
+
+    def test_updates_the_snapshot(self):
+        self.item.score = 2
+        self.manager.save(self.item)
+        self.manager.save(self.item)
+
+        self.manager.collection.update_one.assert_called_once()
+
+    def test_update_many_items_skips_unchanged_items(self):
+        self.manager.collection.bulk_write.return_value.bulk_api_result = {'nMatched': 1, 'nModified': 1}
+        other = self.manager._load({'_id': int_to_id_obj(2), 'deleted': False, 'topic': 'topic', 'score': 1})
+        other.topic = 'changed'
+        with mock.patch('database.manager.referenceValidator') as validator_mock:
+            validator_mock.find_invalid.return_value = {}
+            errors = self.manager.update_many_items([self.item, other])
+
+        self.assertEqual(errors, {})
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertEqual([operation._doc for operation in operations], [{'$set': {'topic': 'changed'}}])
+
+
+class TestWriteChanges(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.manager.collection.bulk_write.return_value.bulk_api_result = {'nMatched': 1, 'nModified': 1}
+        self.manager.collection.find.return_value = [{'_id': int_to_id_obj(3)}]
+        self.new_item = self.Model(_id=id_obj_to_hex_str(int_to_id_obj(1)))
+        self.changed_item = self.Model(_id=id_obj_to_hex_str(int_to_id_obj(2)))
+        self.listener = mock.MagicMock()
+        self.manager.add_write_listener(self.listener)
+
+    def write(self):
+        self.manager.write_changes([self.new_item], [self.changed_item], [int_to_id_obj(3)])
+
+    def test_sends_one_ordered_bulk_write(self):
+        self.write()
+
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertEqual(self.manager.collection.bulk_write.call_args[1], {'ordered': True})
+        self.assertEqual(operations[0]._doc['_id'], int_to_id_obj(1))
+        self.assertEqual(operations[1]._filter, {'_id': int_to_id_obj(2)})
+        self.assertEqual(operations[2]._filter, {'_id': int_to_id_obj(3)})
+        self.assertEqual(self.listener.call_count, 3)
+
+    def test_unchanged_items_are_skipped(self):
+        self.changed_item.snapshot({'deleted': False})
+        self.manager.write_changes(changed_items=[self.changed_item])
+
+        self.manager.collection.bulk_write.assert_not_called()
+
+    def test_raises_for_the_failed_write(self):
+        self.manager.collection.bulk_write.side_effect = BulkWriteError({
+            'nInserted': 1, 'writeErrors': [{'index': 1, 'errmsg': 'failed'}]
+        })
         with self.assertRaises(UpdateFailedError):
-            self.manager.save(self.item)
+            self.write()
+        self.listener.assert_called_once_with(self.manager, self.new_item._id, self.new_item)
+
+    def test_raises_not_found_for_missing_items(self):
+        self.manager.collection.bulk_write.return_value.bulk_api_result = {'nMatched': 0, 'nModified': 0}
+        self.manager.collection.find.return_value = []
+        with self.assertRaises(NotFoundError):
+            self.write()
+        # the new item is written, the missing ones are not
+        self.assertEqual(self.listener.call_count, 1)
+        operations = self.manager.collection.bulk_write.call_args[0][0]
+        self.assertEqual([type(operation).__name__ for operation in operations], ['InsertOne', 'UpdateOne'])
+
+    def test_raises_not_found_for_a_missing_delete(self):
+        self.manager.collection.find.return_value = []
+        with self.assertRaises(NotFoundError) as context:
+            self.manager.write_changes(deleted_ids=[int_to_id_obj(3)])
+
+        self.assertEqual(context.exception._id, int_to_id_obj(3))
+        self.manager.collection.bulk_write.assert_not_called()
+
+
+class TestWriteListeners(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.listener = mock.MagicMock()
+        self.manager.add_write_listener(self.listener)
+
+    def test_notified_after_insert(self):
+        self.manager.collection.insert_one.return_value.inserted_id = int_to_id_obj(1)
+        item = self.manager.save(self.Model())
+        self.listener.assert_called_once_with(self.manager, item._id, item)
+
+    def test_notified_after_delete(self):
+        self.manager.collection.delete_one.return_value.deleted_count = 1
+        self.manager.delete_by_id(int_to_id_obj(1))
+        self.listener.assert_called_once_with(self.manager, id_obj_to_hex_str(int_to_id_obj(1)), None)
+
+    def test_not_notified_if_delete_fails(self):
+        self.manager.collection.delete_one.return_value.deleted_count = 0
+        with self.assertRaises(NotFoundError):
+            self.manager.delete_by_id(int_to_id_obj(1))
+        self.listener.assert_not_called()
 
 
 class TestDelete(BaseManagerTest):
@@ -422,3 +886,29 @@ class TestDelete(BaseManagerTest):
 
         with self.assertRaises(NotFoundError):
             self.manager.delete_by_id(int_to_id_obj(self.some_id))
+
+
+class TestWriteGeneration(BaseManagerTest):
+    def setUp(self):
+        super().setUp()
+        self.generations = self.get_db_mock.return_value.__getitem__.return_value
+
+    def test_missing_generation_is_zero(self):
+        self.generations.find_one.return_value = None
+        self.assertEqual(self.manager.write_generation(), 0)
+
+    def test_bump_counts_per_collection(self):
+        self.generations.find_one_and_update.return_value = {'_id': 'Model', 'generation': 3}
+        self.assertEqual(self.manager.bump_write_generation(), 3)
+        filter_data, update = self.generations.find_one_and_update.call_args[0]
+        self.assertEqual(filter_data, {'_id': self.manager.collection_name})
+        self.assertEqual(update, {'$inc': {'generation': 1}})
+        self.assertTrue(self.generations.find_one_and_update.call_args[1]['upsert'])
+        self.get_db_mock.return_value.__getitem__.assert_called_with(manager.WRITE_GENERATIONS_COLLECTION)
+
+    def test_write_done_listener_is_called_once_per_call(self):
+        listener = mock.Mock()
+        self.manager.add_write_done_listener(listener)
+        self.manager.collection.insert_many.return_value = None
+        self.manager.save_many([self.Model(), self.Model()])
+        listener.assert_called_once_with(self.manager)
@@ -0,0 +1,44 @@
+import random
+import unittest
+
+from database.exceptions import InvalidCursorError
+from database.pagination import encode_cursor, decode_cursor, encode_distance_cursor, decode_distance_cursor
+from database.utils import int_to_id_obj, id_obj_to_hex_str
+
+
+class TestCursor(unittest.TestCase):
+    def setUp(self):
+        self.id_obj = int_to_id_obj(random.randint(1, 10000))
+
+    def test_round_trip_from_id_obj(self):
+        self.assertEqual(decode_cursor(encode_cursor(self.id_obj)), self.id_obj)
+
+    def test_round_trip_from_hex_str(self):
+        self.assertEqual(decode_cursor(encode_cursor(id_obj_to_hex_str(self.id_obj))), self.id_obj)
+
+    def test_cursor_is_url_safe(self):
+        cursor = encode_cursor(self.id_obj)
+        self.assertRegex(cursor, r'^[A-Za-z0-9_-]+$')
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor('not a cursor')
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor('abcd')
+
+
+class TestDistanceCursor(unittest.TestCase):
+    def test_round_trip(self):
+        cursor = decode_distance_cursor(encode_distance_cursor(12.5, [int_to_id_obj(1)]))
+        self.assertEqual(cursor, (12.5, [int_to_id_obj(1)], None, None))
+
+    def test_round_trip_of_id_paged_cursor(self):
+        cursor = decode_distance_cursor(encode_distance_cursor(
+            12.5, [], after_id=id_obj_to_hex_str(int_to_id_obj(2)), min_distance=10
+        ))
+        self.assertEqual(cursor.after_id, int_to_id_obj(2))
+        self.assertEqual(cursor.min_distance, 10)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursorError):
+            decode_distance_cursor(encode_cursor(int_to_id_obj(1)))
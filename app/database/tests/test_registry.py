@@ -0,0 +1,39 @@
+import unittest
+import unittest.mock as mock
+
+from database.manager import Manager
+from database.registry import ManagerRegistry
+
+
+class TestManagerRegistry(unittest.TestCase):
+    class Model:
+        @classmethod
+        def create_manager(cls):
+            return Manager(cls)
+
+    def setUp(self):
+        self.registry = ManagerRegistry()
+        self.patcher = mock.patch('database.manager.get_db')
+        self.get_db_mock = self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_creates_one_manager_per_class(self):
+        manager = self.registry.get(self.Model)
+        self.assertIs(manager, self.registry.get(self.Model))
+        self.assertEqual(manager.content_class, self.Model)
+
+    def test_manager_caches_collection_handle(self):
+        manager = self.registry.get(self.Model)
+        self.assertIs(manager.collection, manager.collection)
+        self.get_db_mock.assert_called_once()
+
+    def test_reset_drops_managers_and_collection_handles(self):
+        manager = self.registry.get(self.Model)
+        manager.collection
+        self.registry.reset()
+
+        self.assertIsNot(manager, self.registry.get(self.Model))
+        manager.collection
+        self.assertEqual(self.get_db_mock.call_count, 2)
@@ -2,7 +2,7 @@ import unittest
 
 from marshmallow.fields import Field
 
-from database.schema import BaseSchema
+from database.schema import BaseSchema, SchemaRegistry, cached_schema_cls
 
 
 class TestSchema(unittest.TestCase):
@@ -21,3 +21,72 @@ class TestSchema(unittest.TestCase):
         self.assertEqual(schema.exclude, set((
             'excluded1', 'excluded2', 'excluded3'
         )))
+
+
+class TestSchemaRegistry(unittest.TestCase):
+    class Model:
+        @classmethod
+        def get_scheme_cls(cls):
+            return TestSchemaRegistry.Schema
+
+    class Schema(BaseSchema):
+        included = Field()
+        excluded = Field(exclude_this=True)
+
+    def setUp(self):
+        self.registry = SchemaRegistry()
+
+    def test_builds_schema_cls_once_per_key(self):
+        built = []
+
+        def builder(model_cls, class_to_create):
+            built.append((model_cls, class_to_create))
+            return type('Built', (BaseSchema,), {})
+
+        first = self.registry.get_schema_cls(builder, self.Model, self.Model)
+        second = self.registry.get_schema_cls(builder, self.Model, self.Model)
+        other = self.registry.get_schema_cls(builder, self.Model, object)
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+        self.assertEqual(len(built), 2)
+
+    def test_reuses_schema_instances_per_option_set(self):
+        def field_filter_fn(field):
+            return field.metadata.get('exclude_this', False)
+
+        schema = self.registry.get_schema(self.Model, field_filter_fn=field_filter_fn)
+        self.assertIs(
+            schema, self.registry.get_schema(self.Model, field_filter_fn=field_filter_fn)
+        )
+        self.assertEqual(schema.exclude, {'excluded'})
+        self.assertIsNot(schema, self.registry.get_schema(self.Model))
+        self.assertIsNot(schema, self.registry.get_schema(self.Model, many=True))
+
+    def test_reset_drops_all_entries(self):
+        schema = self.registry.get_schema(self.Model)
+        self.registry.reset()
+        self.assertIsNot(schema, self.registry.get_schema(self.Model))
+
+
+class TestCachedSchemaCls(unittest.TestCase):
+    def test_each_level_of_the_chain_is_cached_separately(self):
+        class Base:
+            @classmethod
+            @cached_schema_cls
+            def get_scheme_cls(cls, class_to_create=None):
+                return type('BaseSchema', (BaseSchema,), {'base': Field()})
+
+        class Child(Base):
+            @classmethod
+            @cached_schema_cls
+            def get_scheme_cls(cls, class_to_create=None):
+                base_schema = super(Child, cls).get_scheme_cls(class_to_create)
+                return type('ChildSchema', (base_schema,), {'child': Field()})
+
+        child_schema_cls = Child.get_scheme_cls()
+        self.assertIs(child_schema_cls, Child.get_scheme_cls())
+        self.assertIsNot(child_schema_cls, Base.get_scheme_cls())
+        self.assertEqual(
+            set(child_schema_cls().fields), {'base', 'child'}
+        )
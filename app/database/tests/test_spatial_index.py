@@ -0,0 +1,111 @@
+import random
+import unittest
+
+from database.exceptions import SpatialIndexFullError
+from database.geo import haversine_distance
+from database.spatial_index import GridSpatialIndex, point_in_polygon
+from database.utils import int_to_id_obj, id_obj_to_hex_str
+
+
+def raw_item(idx, longitude, latitude, score=0):
+    return {
+        '_id': int_to_id_obj(idx),
+        'score': score,
+        'loc': {'type': 'Point', 'coordinates': [longitude, latitude]}
+    }
+
+
+class SpatialIndexBase(unittest.TestCase):
+    def setUp(self):
+        self.now = 0
+        self.index = GridSpatialIndex(max_size=1000, max_age=60, clock=lambda: self.now)
+        self.index.warm_up([
+            raw_item(1, 13.4001, 52.5001),
+            raw_item(2, 13.4030, 52.5001),
+            raw_item(3, 13.4200, 52.5001),
+        ])
+
+
+class TestNear(SpatialIndexBase):
+    def test_returns_ids_in_range_sorted_by_distance(self):
+        result = self.index.near(13.4, 52.5, 500)
+        self.assertEqual([_id for _, _id in result], [int_to_id_obj(1), int_to_id_obj(2)])
+        self.assertEqual(result[0][0], haversine_distance(13.4, 52.5, 13.4001, 52.5001))
+
+    def test_min_distance(self):
+        result = self.index.near(13.4, 52.5, 500, min_distance=50)
+        self.assertEqual([_id for _, _id in result], [int_to_id_obj(2)])
+
+    def test_matches_brute_force(self):
+        rng = random.Random(4)
+        points = [(rng.uniform(13, 14), rng.uniform(52, 53)) for _ in range(500)]
+        self.index.warm_up(raw_item(idx, *point) for idx, point in enumerate(points))
+        expected = sorted(
+            (haversine_distance(13.5, 52.5, *point), int_to_id_obj(idx)) for idx, point in enumerate(points)
+            if haversine_distance(13.5, 52.5, *point) <= 20000
+        )
+        self.assertEqual(self.index.near(13.5, 52.5, 20000), expected)
+
+    def test_crosses_antimeridian(self):
+        self.index.warm_up([raw_item(1, -179.999, 0), raw_item(2, 179.999, 0)])
+        result = self.index.near(179.9999, 0, 1000)
+        self.assertEqual(sorted(_id for _, _id in result), [int_to_id_obj(1), int_to_id_obj(2)])
+
+
+class TestWithin(SpatialIndexBase):
+    def test_point_in_polygon(self):
+        square = [(0, 0), (1, 0), (1, 1), (0, 1)]
+        self.assertTrue(point_in_polygon(0.5, 0.5, square))
+        self.assertFalse(point_in_polygon(1.5, 0.5, square))
+
+    def test_returns_ids_inside(self):
+        ids = self.index.within([(13.4, 52.5), (13.41, 52.5), (13.41, 52.51), (13.4, 52.51)])
+        self.assertEqual(sorted(ids), [int_to_id_obj(1), int_to_id_obj(2)])
+
+
+class TestWrites(SpatialIndexBase):
+    def test_add_moves_existing_item(self):
+        self.index.add(id_obj_to_hex_str(int_to_id_obj(1)), 13.42, 52.5001)
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual([_id for _, _id in self.index.near(13.4, 52.5, 100)], [])
+
+    def test_remove_reuses_slot(self):
+        self.assertTrue(self.index.remove(int_to_id_obj(1)))
+        self.assertFalse(self.index.remove(int_to_id_obj(1)))
+        self.index.add(int_to_id_obj(4), 13.4, 52.5)
+        self.assertEqual(len(self.index.longitudes), 3)
+        self.assertEqual([_id for _, _id in self.index.near(13.4, 52.5, 10)], [int_to_id_obj(4)])
+
+
+class TestLifecycle(SpatialIndexBase):
+    def test_becomes_stale(self):
+        self.assertTrue(self.index.ready)
+        self.assertFalse(self.index.is_stale())
+        self.now = 61
+        self.assertTrue(self.index.is_stale())
+
+    def test_full_index_is_not_ready(self):
+        index = GridSpatialIndex(max_size=2)
+        with self.assertRaises(SpatialIndexFullError):
+            index.warm_up([raw_item(idx, 0, 0) for idx in range(1, 4)])
+        self.assertFalse(index.ready)
+        self.assertFalse(index.is_stale())
+
+
+class TestInBoxes(SpatialIndexBase):
+    def setUp(self):
+        super().setUp()
+        self.index.warm_up([
+            raw_item(1, 179.5, 0, score=1),
+            raw_item(2, -179.5, 0, score=5),
+            raw_item(3, 0, 0, score=9),
+            raw_item(4, 179.9, 0, score=5),
+        ])
+
+    def test_returns_ids_inside(self):
+        ids = self.index.in_boxes([(170, -1, 180, 1), (-180, -1, -170, 1)])
+        self.assertEqual(sorted(ids), [int_to_id_obj(1), int_to_id_obj(2), int_to_id_obj(4)])
+
+    def test_limit_keeps_highest_scores(self):
+        ids = self.index.in_boxes([(170, -1, 180, 1), (-180, -1, -170, 1)], limit=2)
+        self.assertEqual(ids, [int_to_id_obj(2), int_to_id_obj(4)])
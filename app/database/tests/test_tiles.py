@@ -0,0 +1,25 @@
+import unittest
+
+from database.tiles import MAX_LATITUDE, is_valid_tile, quantize, tile_bbox, tile_of
+
+
+class TestTiles(unittest.TestCase):
+    def test_tile_of(self):
+        self.assertEqual(tile_of(10, 13.4, 52.5), (550, 335))
+        self.assertEqual(tile_of(0, 180, -90), (0, 0))
+
+    def test_tile_bbox(self):
+        self.assertEqual(tile_bbox(1, 1, 0)[0::2], (0, 180))
+        self.assertAlmostEqual(tile_bbox(0, 0, 0)[3], MAX_LATITUDE)
+        min_longitude, min_latitude, max_longitude, max_latitude = tile_bbox(10, 550, 335)
+        self.assertTrue(min_longitude <= 13.4 <= max_longitude and min_latitude <= 52.5 <= max_latitude)
+
+    def test_quantize_corners(self):
+        min_longitude, min_latitude, max_longitude, max_latitude = tile_bbox(10, 550, 335)
+        self.assertEqual(quantize(10, 550, 335, min_longitude, max_latitude), (0, 0))
+        self.assertEqual(quantize(10, 550, 335, max_longitude, min_latitude), (4096, 4096))
+
+    def test_is_valid_tile(self):
+        self.assertTrue(is_valid_tile(2, 3, 3))
+        self.assertFalse(is_valid_tile(2, 4, 0))
+        self.assertFalse(is_valid_tile(23, 0, 0))
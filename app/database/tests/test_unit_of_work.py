@@ -0,0 +1,166 @@
+import unittest
+import unittest.mock as mock
+
+from bson import ObjectId
+from flask import Flask
+
+import models.model_base as model_base
+from database import unit_of_work
+from database.exceptions import NotFoundError
+from database.registry import managerRegistry
+from database.unit_of_work import UnitOfWork, current_unit_of_work
+from database.utils import int_to_id_obj, id_obj_to_hex_str
+
+
+class UnitOfWorkBase(unittest.TestCase):
+    class Model(model_base.ModelBase):
+        pass
+
+    class OtherModel(model_base.ModelBase):
+        pass
+
+    def setUp(self):
+        managerRegistry.reset()
+        self.patcher = mock.patch('database.manager.get_db')
+        self.get_db_mock = self.patcher.start()
+        self.collections = {'Model': mock.MagicMock(), 'OtherModel': mock.MagicMock()}
+        self.get_db_mock.return_value = self.collections
+        for collection in self.collections.values():
+            collection.bulk_write.return_value.bulk_api_result = {'nMatched': 0, 'nModified': 0}
+        self.validator_patcher = mock.patch('database.unit_of_work.referenceValidator')
+        self.validator_mock = self.validator_patcher.start()
+        self.validator_mock.find_invalid.return_value = {}
+
+    def tearDown(self):
+        self.validator_patcher.stop()
+        self.patcher.stop()
+        managerRegistry.reset()
+
+    def operations(self, name):
+        return self.collections[name].bulk_write.call_args[0][0]
+
+
+class TestUnitOfWork(UnitOfWorkBase):
+    def test_writes_when_it_ends(self):
+        with UnitOfWork():
+            item = self.Model.manager().save(self.Model())
+            self.assertIsNotNone(item._id)
+            self.Model.manager().save(self.Model())
+            self.collections['Model'].bulk_write.assert_not_called()
+
+        self.collections['Model'].bulk_write.assert_called_once()
+        self.assertEqual(len(self.operations('Model')), 2)
+        self.assertEqual(self.operations('Model')[0]._doc['_id'], ObjectId(item._id))
+        self.collections['Model'].insert_one.assert_not_called()
+
+    def test_one_bulk_write_per_collection(self):
+        self.collections['Model'].bulk_write.return_value.bulk_api_result = {'nMatched': 1, 'nModified': 1}
+        self.collections['Model'].find.return_value = [{'_id': int_to_id_obj(2)}]
+        changed = self.Model(_id=id_obj_to_hex_str(int_to_id_obj(1)))
+        with UnitOfWork():
+            self.Model.manager().save(self.Model())
+            self.OtherModel.manager().save(self.OtherModel())
+            self.Model.manager().save(changed)
+            self.Model.manager().delete(id_obj_to_hex_str(int_to_id_obj(2)))
+
+        self.assertEqual(
+            [type(operation).__name__ for operation in self.operations('Model')],
+            ['InsertOne', 'UpdateOne', 'DeleteOne']
+        )
+        self.assertEqual(len(self.operations('OtherModel')), 1)
+        self.collections['Model'].delete_one.assert_not_called()
+
+    def test_validates_references_of_all_items_once(self):
+        with UnitOfWork():
+            items = [self.Model.manager().save(self.Model()) for _ in range(3)]
+
+        self.validator_mock.find_invalid.assert_called_once_with(items)
+
+    def test_missing_reference_stops_the_flush(self):
+        self.validator_mock.find_invalid.return_value = {0: NotFoundError('table', int_to_id_obj(1))}
+        with self.assertRaises(NotFoundError):
+            with UnitOfWork():
+                self.Model.manager().save(self.Model())
+
+        self.collections['Model'].bulk_write.assert_not_called()
+
+    def test_references_to_new_items_are_valid(self):
+        with UnitOfWork():
+            target = self.OtherModel.manager().save(self.OtherModel())
+            self.Model.manager().save(self.Model())
+            self.validator_mock.find_invalid.return_value = {1: NotFoundError('table', ObjectId(target._id))}
+
+        self.collections['Model'].bulk_write.assert_called_once()
+
+    def test_saving_an_item_twice_writes_it_once(self):
+        with UnitOfWork():
+            item = self.Model.manager().save(self.Model())
+            self.Model.manager().save(item)
+
+        self.assertEqual(len(self.operations('Model')), 1)
+
+    def test_bulk_writes_flush_the_writes_before_them(self):
+        calls = mock.Mock()
+        calls.attach_mock(self.collections['Model'].bulk_write, 'bulk_write')
+        calls.attach_mock(self.collections['Model'].insert_many, 'insert_many')
+        with mock.patch('database.manager.referenceValidator') as validator_mock:
+            validator_mock.find_invalid.return_value = {}
+            with UnitOfWork() as active:
+                self.Model.manager().save(self.Model())
+                self.Model.manager().save_many([self.Model()])
+                self.assertEqual(len(active), 0)
+                self.Model.manager().save(self.Model())
+
+        self.assertEqual([name for name, _, _ in calls.mock_calls], ['bulk_write', 'insert_many', 'bulk_write'])
+
+    def test_nothing_is_written_after_an_exception(self):
+        with self.assertRaises(RuntimeError):
+            with UnitOfWork():
+                self.Model.manager().save(self.Model())
+                raise RuntimeError()
+
+        self.collections['Model'].bulk_write.assert_not_called()
+        self.assertIsNone(current_unit_of_work())
+
+    def test_is_only_active_inside(self):
+        self.assertIsNone(current_unit_of_work())
+        with UnitOfWork() as active:
+            self.assertIs(current_unit_of_work(), active)
+        self.assertIsNone(current_unit_of_work())
+
+
+class TestRequestUnitOfWork(UnitOfWorkBase):
+    def setUp(self):
+        super().setUp()
+        app = Flask(__name__)
+        # the failing view is expected to fail
+        app.logger.disabled = True
+        unit_of_work.init_app(app)
+
+        @app.route('/save/<int:status>')
+        def save(status):
+            self.Model.manager().save(self.Model())
+            self.Model.manager().save(self.Model())
+            return '', status
+
+        @app.route('/fail')
+        def fail():
+            self.Model.manager().save(self.Model())
+            raise RuntimeError()
+
+        self.client = app.test_client()
+
+    def test_flushes_after_the_view(self):
+        self.client.get('/save/201')
+
+        self.collections['Model'].bulk_write.assert_called_once()
+        self.assertEqual(len(self.operations('Model')), 2)
+
+    def test_discards_error_responses(self):
+        self.client.get('/save/409')
+        self.collections['Model'].bulk_write.assert_not_called()
+
+    def test_discards_if_the_view_raises(self):
+        self.client.get('/fail')
+        self.collections['Model'].bulk_write.assert_not_called()
+        self.assertIsNone(current_unit_of_work())
@@ -0,0 +1,101 @@
+import unittest
+import unittest.mock as mock
+
+from database.vote_buffer import VoteBuffer
+
+
+class TestVoteBuffer(unittest.TestCase):
+    def setUp(self):
+        self.manager = mock.MagicMock()
+        self.manager.increment_many.return_value = {}
+        self.manager.bulk_batch_size = 1000
+        self.model_cls = mock.MagicMock()
+        self.model_cls.manager.return_value = self.manager
+        self.timer_patcher = mock.patch('database.vote_buffer.threading.Timer')
+        self.timer_mock = self.timer_patcher.start()
+        self.buffer = VoteBuffer(self.model_cls, interval=0.5, max_pending=3)
+
+    def tearDown(self):
+        self.timer_patcher.stop()
+
+    def test_sums_increments_per_id(self):
+        for _id, amount in (('a', 1), ('b', -1), ('a', 1), ('a', 1)):
+            self.buffer.add(_id, amount)
+        self.manager.increment_many.assert_not_called()
+
+        self.buffer.flush()
+        self.manager.increment_many.assert_called_once_with({'a': 3, 'b': -1}, 'score')
+        self.assertEqual(len(self.buffer), 0)
+
+    def test_starts_one_timer_per_flush(self):
+        self.buffer.add('a')
+        self.buffer.add('b')
+        self.timer_mock.assert_called_once_with(0.5, self.buffer.flush_and_log)
+        self.timer_mock.return_value.start.assert_called_once()
+
+        self.buffer.flush()
+        self.timer_mock.return_value.cancel.assert_called_once()
+        self.buffer.add('a')
+        self.assertEqual(self.timer_mock.call_count, 2)
+
+    def test_flushes_when_full(self):
+        for _id in ('a', 'b', 'c'):
+            self.buffer.add(_id)
+        self.manager.increment_many.assert_called_once_with({'a': 1, 'b': 1, 'c': 1}, 'score')
+
+    def test_skips_cancelled_out_votes(self):
+        self.buffer.add('a', 1)
+        self.buffer.add('a', -1)
+        self.assertEqual(self.buffer.flush(), {})
+        self.manager.increment_many.assert_not_called()
+
+    def test_keeps_increments_if_the_write_fails(self):
+        self.manager.increment_many.side_effect = ConnectionError()
+        self.buffer.add('a')
+        with self.assertRaises(ConnectionError):
+            self.buffer.flush()
+        self.buffer.add('a')
+
+        self.manager.increment_many.side_effect = None
+        self.buffer.flush()
+        self.manager.increment_many.assert_called_with({'a': 2}, 'score')
+
+    def test_keeps_only_the_batches_which_were_not_written(self):
+        self.manager.bulk_batch_size = 2
+        self.manager.increment_many.side_effect = [{'a': ValueError('not found')}, ConnectionError()]
+        for _id in ('a', 'b'):
+            self.buffer.add(_id)
+        self.buffer.max_pending = 10
+        self.buffer.add('c')
+        with self.assertRaises(ConnectionError):
+            self.buffer.flush()
+
+        self.assertEqual(self.manager.increment_many.call_args_list, [
+            mock.call({'a': 1, 'b': 1}, 'score'), mock.call({'c': 1}, 'score')
+        ])
+        self.assertEqual(self.buffer.pending, {'c': 1})
+
+    def test_flushes_in_app_context(self):
+        app = mock.MagicMock()
+        self.buffer.app = app
+        self.buffer.add('a')
+        self.buffer.flush()
+        app.app_context.assert_called_once()
+
+    def test_failed_timer_flush_is_retried(self):
+        self.manager.increment_many.side_effect = ConnectionError()
+        self.buffer.add('a')
+        with self.assertLogs('database.vote_buffer', 'ERROR'):
+            self.buffer.flush_and_log()
+
+        self.assertEqual(self.timer_mock.call_count, 2)
+        self.assertEqual(self.buffer.pending, {'a': 1})
+
+    def test_logs_failed_ids(self):
+        self.manager.increment_many.return_value = {'a': ValueError('not found')}
+        self.buffer.add('a')
+        with self.assertLogs('database.vote_buffer', 'WARNING') as logs:
+            self.buffer.flush_and_log()
+
+        self.assertIn('vote for a was not written', logs.output[0])
+        self.assertEqual(len(self.buffer), 0)
@@ -0,0 +1,46 @@
+from math import atan, cos, degrees, floor, log, pi, radians, sinh, tan
+
+# web mercator tiles, as used by the common map clients
+MAX_TILE_ZOOM = 22
+MAX_LATITUDE = 85.0511287798
+
+
+def tile_count(zoom):
+    return 2 ** zoom
+
+
+def is_valid_tile(zoom, x, y):
+    return 0 <= zoom <= MAX_TILE_ZOOM and 0 <= x < tile_count(zoom) and 0 <= y < tile_count(zoom)
+
+
+def _mercator(longitude, latitude):
+    """position in the world as fractions from the north west corner"""
+    latitude = max(-MAX_LATITUDE, min(MAX_LATITUDE, latitude))
+    latitude = radians(latitude)
+    return (longitude + 180) / 360, (1 - log(tan(latitude) + 1 / cos(latitude)) / pi) / 2
+
+
+def tile_of(zoom, longitude, latitude):
+    world_x, world_y = _mercator(longitude, latitude)
+    count = tile_count(zoom)
+    return min(int(floor(world_x * count)), count - 1), min(int(floor(world_y * count)), count - 1)
+
+
+def tile_bbox(zoom, x, y):
+    """(min_longitude, min_latitude, max_longitude, max_latitude) of the tile"""
+    count = tile_count(zoom)
+
+    def latitude(tile_y):
+        return degrees(atan(sinh(pi * (1 - 2 * tile_y / count))))
+
+    return x / count * 360 - 180, latitude(y + 1), (x + 1) / count * 360 - 180, latitude(y)
+
+
+def quantize(zoom, x, y, longitude, latitude, extent=4096):
+    """tile local integer coordinates, (0, 0) is the north west corner and extent the south east one"""
+    world_x, world_y = _mercator(longitude, latitude)
+    count = tile_count(zoom)
+    return (
+        max(0, min(extent, int(round((world_x * count - x) * extent)))),
+        max(0, min(extent, int(round((world_y * count - y) * extent))))
+    )
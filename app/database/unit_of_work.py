@@ -0,0 +1,132 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+
+from bson import ObjectId
+from flask import g
+from werkzeug.exceptions import NotFound
+
+from database.exceptions import NotFoundError
+
+from database.utils import id_obj_to_hex_str
+from models.reference_validation import referenceValidator
+
+_current_unit_of_work = ContextVar('unit_of_work', default=None)
+
+
+def current_unit_of_work():
+    return _current_unit_of_work.get()
+
+
+class UnitOfWork(object):
+    """
+    records the saves and deletes of Manager.save / Manager.delete_by_id while it is active
+    and writes them when it ends: the references of all items are validated together,
+    then every collection gets one ordered bulk_write, see Manager.write_changes.
+    new items get a client side _id when they are saved, so it can be used before the flush.
+    the collections are written one after the other, a failed write does not undo the previous ones.
+
+        with UnitOfWork():
+            question = QuestionModel.manager().save(question)
+            ...
+    """
+
+    def __init__(self):
+        # manager -> {id(item): item} in the order of the first save
+        self.new = OrderedDict()
+        self.changed = OrderedDict()
+        # manager -> [_id]
+        self.deleted = OrderedDict()
+        self._token = None
+
+    def __len__(self):
+        return sum(len(entries) for entries in (*self.new.values(), *self.changed.values(), *self.deleted.values()))
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.end(flush=exc_type is None)
+
+    def begin(self):
+        self._token = _current_unit_of_work.set(self)
+        return self
+
+    def end(self, flush=True):
+        _current_unit_of_work.reset(self._token)
+        self._token = None
+        try:
+            if flush:
+                self.flush()
+        finally:
+            self.discard()
+
+    def save(self, item):
+        manager = item.manager()
+        if item.is_new():
+            item._id = id_obj_to_hex_str(ObjectId())
+            self.new.setdefault(manager, OrderedDict())[id(item)] = item
+        elif id(item) not in self.new.get(manager, {}):
+            self.changed.setdefault(manager, OrderedDict())[id(item)] = item
+        return item
+
+    def delete(self, manager, _id):
+        self.deleted.setdefault(manager, []).append(_id)
+
+    def _validate_references(self):
+        items = [item for entries in (*self.new.values(), *self.changed.values()) for item in entries.values()]
+        # items new in this unit of work are not stored yet, but will be
+        pending_ids = set(ObjectId(item._id) for entries in self.new.values() for item in entries.values())
+        invalid = referenceValidator.find_invalid(items)
+        for index in sorted(invalid):
+            error = invalid[index]
+            referenced_id = error._id
+            if isinstance(referenced_id, str) and ObjectId.is_valid(referenced_id):
+                referenced_id = ObjectId(referenced_id)
+            if referenced_id not in pending_ids:
+                raise error
+
+    def flush(self):
+        self._validate_references()
+        managers = list(OrderedDict.fromkeys([*self.new, *self.changed, *self.deleted]))
+        for manager in managers:
+            manager.write_changes(
+                new_items=list(self.new.get(manager, {}).values()),
+                changed_items=list(self.changed.get(manager, {}).values()),
+                deleted_ids=self.deleted.get(manager, [])
+            )
+        self.discard()
+
+    def discard(self):
+        self.new.clear()
+        self.changed.clear()
+        self.deleted.clear()
+
+
+def init_app(app):
+    """
+    every request runs in a unit of work, which is written before the response unless it is an error.
+    a write of a missing item turns the response into a 404 like the view would have answered without it.
+    """
+
+    @app.before_request
+    def begin_unit_of_work():
+        g.unit_of_work = UnitOfWork().begin()
+
+    @app.after_request
+    def end_unit_of_work(response):
+        unit_of_work = g.pop('unit_of_work', None)
+        if unit_of_work is not None:
+            try:
+                unit_of_work.end(flush=response.status_code < 400)
+            except NotFoundError as not_found:
+                return NotFound(str(not_found._id)).get_response()
+        return response
+
+    @app.teardown_request
+    def discard_unit_of_work(exception=None):
+        # after_request does not run if the view raised
+        unit_of_work = g.pop('unit_of_work', None)
+        if unit_of_work is not None:
+            unit_of_work.end(flush=False)
+
+    return app
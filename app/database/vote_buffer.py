@@ -0,0 +1,90 @@
+import logging
+import threading
+from contextlib import nullcontext
+
+
+class VoteBuffer(object):
+    """
+    sums increments of one field per _id in process and writes them with Manager.increment_many,
+    interval seconds after the first pending one or as soon as max_pending ids are pending.
+    pending increments are lost if the process dies before the flush.
+    a flush failing in the middle keeps the increments of the batches which were not written.
+    a failed flush of the timer is retried interval seconds later, increments of ids which failed on their own
+    are logged and dropped.
+    """
+
+    def __init__(self, model_cls, field="score", interval=0.3, max_pending=10000, app=None):
+        # the manager is looked up on every flush, the registry may have been reset in between
+        self.model_cls = model_cls
+        self.field = field
+        self.interval = interval
+        self.max_pending = max_pending
+        # flushes of the timer thread need an app context for the database connection
+        self.app = app
+        self.logger = app.logger if app is not None else logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.timer = None
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, _id, amount=1):
+        with self.lock:
+            self.pending[_id] = self.pending.get(_id, 0) + amount
+            full = len(self.pending) >= self.max_pending
+            if not full:
+                self._start_timer()
+        if full:
+            self.flush()
+
+    def _start_timer(self):
+        """called with the lock held"""
+        if self.timer is None:
+            self.timer = threading.Timer(self.interval, self.flush_and_log)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """writes all pending increments, returns {_id: error} like Manager.increment_many"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        # votes cancelling each other out are not written at all
+        increments = {_id: amount for _id, amount in pending.items() if amount}
+        if not increments:
+            return {}
+
+        ids = list(increments)
+        errors = {}
+        written = 0
+        try:
+            with self.app.app_context() if self.app is not None else nullcontext():
+                manager = self.model_cls.manager()
+                # one call per bulk_write, so a failure only requeues the batches which were not written
+                for start in range(0, len(ids), manager.bulk_batch_size):
+                    batch = ids[start:start + manager.bulk_batch_size]
+                    errors.update(manager.increment_many({_id: increments[_id] for _id in batch}, self.field))
+                    written += len(batch)
+        except Exception:
+            # written with the next flush
+            with self.lock:
+                for _id in ids[written:]:
+                    self.pending[_id] = self.pending.get(_id, 0) + increments[_id]
+            raise
+        return errors
+
+    def flush_and_log(self):
+        """flush without a caller to raise to, the timer and the exit of the process"""
+        try:
+            errors = self.flush()
+        except Exception:
+            self.logger.exception("flushing %d votes failed, retrying in %ss", len(self), self.interval)
+            with self.lock:
+                if self.pending:
+                    self._start_timer()
+            return
+        for _id, error in errors.items():
+            self.logger.warning("vote for %s was not written: %s", _id, error)
@@ -1,5 +1,8 @@
 from marshmallow import fields
+from pymongo import DESCENDING
 
+from database.indexes import Index
+from database.schema import cached_schema_cls
 from database.schema_fields import ReverseIdField
 from database.utils import hex_str_to_id_obj
 from models.location_model import LocationBasedModel
@@ -12,6 +15,8 @@ def _get_question_model():
 
 
 class AnswerModel(LocationBasedModel):
+    cache_geo_queries = True
+
     fields = {
         "question": ReferenceTargetField(
             target_cls=_get_question_model,
@@ -22,6 +27,15 @@ class AnswerModel(LocationBasedModel):
     }
 
     @classmethod
+    def get_indexes(cls):
+        return super(AnswerModel, cls).get_indexes() + [
+            # lookup of the answers of a question (see QuestionModel.answers)
+            Index(['question_id']),
+            Index(['question_id', ('score', DESCENDING)]),
+        ]
+
+    @classmethod
+    @cached_schema_cls
     def get_scheme_cls(cls, class_to_create=None):
         class_to_create = class_to_create or cls
         base_schema = super(AnswerModel, cls).get_scheme_cls(class_to_create)
@@ -0,0 +1,97 @@
+import threading
+from contextlib import contextmanager
+
+from bson import ObjectId
+
+from database.utils import id_obj_to_hex_str
+from models.misc import CachedObj
+
+
+def _normalize_key(key):
+    # references are stored as ObjectId, but loaded models expose their _id as hex string
+    if isinstance(key, ObjectId):
+        return id_obj_to_hex_str(key)
+    return key
+
+
+class BatchLoader(object):
+    """
+    collects the keys referenced by the models of a result set and resolves all of them
+    with a single $in query as soon as the first value is accessed.
+    """
+
+    def __init__(self, target_cls, target_field, many=False):
+        self.target_cls = target_cls
+        self.target_field = target_field
+        self.many = many
+        self.pending = []
+        self.results = {}
+
+    def _empty(self):
+        return [] if self.many else None
+
+    def load(self, key):
+        if _normalize_key(key) not in self.results:
+            self.pending.append(key)
+        return CachedObj(lambda: self.get(key), key=key)
+
+    def get(self, key):
+        normalized_key = _normalize_key(key)
+        if normalized_key not in self.results:
+            self.dispatch()
+        return self.results.get(normalized_key, self._empty())
+
+    def dispatch(self):
+        keys, self.pending = self.pending, []
+        if not keys:
+            return
+        for key in keys:
+            self.results.setdefault(_normalize_key(key), self._empty())
+
+        items = self.target_cls.manager().get({
+            self.target_field: {"$in": keys}
+        })
+        for item in items:
+            normalized_key = _normalize_key(getattr(item, self.target_field))
+            if self.many:
+                self.results.setdefault(normalized_key, []).append(item)
+            elif self.results.get(normalized_key) is None:
+                self.results[normalized_key] = item
+
+
+class BatchScope(object):
+    def __init__(self):
+        self.loaders = {}
+
+    def loader(self, target_cls, target_field, many=False):
+        key = (target_cls, target_field, many)
+        try:
+            return self.loaders[key]
+        except KeyError:
+            loader = self.loaders[key] = BatchLoader(target_cls, target_field, many=many)
+            return loader
+
+
+_local = threading.local()
+
+
+def current_batch_scope():
+    return getattr(_local, 'scope', None)
+
+
+@contextmanager
+def batch_loading():
+    """
+    all references loaded by models created inside this context share one BatchScope.
+    nested contexts join the outer scope.
+    """
+    scope = current_batch_scope()
+    if scope is not None:
+        yield scope
+        return
+
+    scope = _local.scope = BatchScope()
+    try:
+        yield scope
+    finally:
+        _local.scope = None
@@ -1,3 +1,6 @@
+from database.geo import simplify_ring
+
+
 class LocationEntityFactory(object):
     def __init__(self):
         self.classes = {}
@@ -23,5 +26,55 @@ class Point(object):
         }
 
 
+class Polygon(object):
+    type = "Polygon"
+
+    def __init__(self, coordinates):
+        self.rings = [
+            [(float(longitude), float(latitude)) for longitude, latitude in ring] for ring in coordinates
+        ]
+        if not self.rings:
+            raise ValueError("a polygon needs an exterior ring")
+        for ring in self.rings:
+            if len(ring) < 4 or ring[0] != ring[-1]:
+                raise ValueError("rings need at least 4 positions and have to be closed")
+
+    def vertex_count(self):
+        return sum(len(ring) for ring in self.rings)
+
+    def simplify(self, tolerance):
+        """copy with fewer vertices, no vertex is moved by more than tolerance meters"""
+        return self.__class__([simplify_ring(ring, tolerance) for ring in self.rings])
+
+    def serialize(self):
+        return {
+            'type': self.type,
+            'coordinates': [[list(position) for position in ring] for ring in self.rings]
+        }
+
+
+class MultiPolygon(object):
+    type = "MultiPolygon"
+
+    def __init__(self, coordinates):
+        self.polygons = [Polygon(polygon) for polygon in coordinates]
+        if not self.polygons:
+            raise ValueError("a multipolygon needs a polygon")
+
+    def vertex_count(self):
+        return sum(polygon.vertex_count() for polygon in self.polygons)
+
+    def simplify(self, tolerance):
+        return self.__class__([polygon.simplify(tolerance).serialize()['coordinates'] for polygon in self.polygons])
+
+    def serialize(self):
+        return {
+            'type': self.type,
+            'coordinates': [polygon.serialize()['coordinates'] for polygon in self.polygons]
+        }
+
+
 locationEntityFactory = LocationEntityFactory()
 locationEntityFactory.register(Point)
+locationEntityFactory.register(Polygon)
+locationEntityFactory.register(MultiPolygon)
@@ -1,6 +1,11 @@
-from marshmallow import Schema, fields, post_load, pre_dump, ValidationError
+from marshmallow import Schema, fields, post_dump, post_load, pre_dump, ValidationError
+from pymongo import ASCENDING, GEOSPHERE
 
+from database.clusters import ClusterCache
+from database.geo_cache import GeoQueryCache
+from database.indexes import Index
 from database.location_manager import LocationManager
+from database.schema import cached_schema_cls
 from database.schema_fields import TupleField
 from models.geojsonp import locationEntityFactory
 from models.model_base import ModelBase
@@ -32,17 +37,51 @@ class LocationSchema(Schema):
 
 class LocationBasedModel(ModelBase):
     locationField = "loc"
+    # meters to the queried location, only set by nearby queries
+    distanceField = "distance"
+    # ranks the items of capped results
+    scoreField = "score"
+    # geohash of the location, maintained by the manager
+    cellField = "cell"
+    # serve nearby / within / cluster queries of this process from a GeoQueryCache and a ClusterCache
+    cache_geo_queries = False
 
     @classmethod
-    def manager(cls):
-        return LocationManager(cls)
+    def get_indexes(cls):
+        return super(LocationBasedModel, cls).get_indexes() + [
+            Index([(cls.locationField, GEOSPHERE)]),
+            Index([('deleted', ASCENDING), (cls.locationField, GEOSPHERE)]),
+            Index([cls.cellField]),
+        ]
 
     @classmethod
+    def create_manager(cls):
+        query_cache = GeoQueryCache(location_field=cls.locationField) if cls.cache_geo_queries else None
+        cluster_cache = ClusterCache() if cls.cache_geo_queries else None
+        return LocationManager(
+            cls, location_field=cls.locationField, distance_field=cls.distanceField, score_field=cls.scoreField,
+            cell_field=cls.cellField, query_cache=query_cache, cluster_cache=cluster_cache
+        )
+
+    @classmethod
+    @cached_schema_cls
     def get_scheme_cls(cls, class_to_create=None):
         class_to_create = class_to_create or cls
         base_schema = super(LocationBasedModel, cls).get_scheme_cls(class_to_create)
 
+        distance_field = cls.distanceField
+
+        @post_dump
+        def omit_missing_distance(self, data):
+            if data.get(distance_field) is None:
+                data.pop(distance_field, None)
+            return data
+
         location_schema_cls = type('LocationBasedSchema', (base_schema,), {
-            cls.locationField: fields.Nested(LocationSchema)
+            cls.locationField: fields.Nested(LocationSchema),
+            cls.cellField: fields.String(allow_none=True),
+            # computed by the database, never saved
+            distance_field: fields.Float(allow_none=True, internal=False),
+            'omit_missing_distance': omit_missing_distance
         })
         return location_schema_cls
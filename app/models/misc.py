@@ -1,6 +1,8 @@
 class CachedObj(object):
-    def __init__(self, creator_fn):
+    def __init__(self, creator_fn, key=None):
         self.creator = creator_fn
+        # the stored reference the value is looked up with, if known
+        self.key = key
         self._val = None
 
     @property
@@ -1,14 +1,29 @@
+from bson import ObjectId
 from flask_restful import Resource
 from marshmallow import fields, post_load
 from marshmallow.utils import _Missing
 
+from database.indexes import Index
 from database.manager import Manager
-from database.schema import BaseSchema
+from database.registry import managerRegistry
+from database.schema import BaseSchema, cached_schema_cls, schemaRegistry
 from database.schema_fields import IdField
 
 
+def _stored_form(value):
+    # serialized and loaded values differ in types which are stored the same, e.g. tuples and lists
+    if isinstance(value, ObjectId):
+        return value.binary.hex()
+    if isinstance(value, (list, tuple)):
+        return [_stored_form(entry) for entry in value]
+    if isinstance(value, dict):
+        return {key: _stored_form(entry) for key, entry in value.items()}
+    return value
+
+
 class ModelBase(Resource):
     @classmethod
+    @cached_schema_cls
     def get_scheme_cls(cls, class_to_create=None):
         class_to_create = class_to_create or cls
 
@@ -19,19 +34,44 @@ class ModelBase(Resource):
 
             @post_load
             def make_instance(self, data):
+                if self.only is not None:
+                    return class_to_create(_only=self.only, **data)
                 return class_to_create(**data)
 
         return ModelBaseSchema
 
     @classmethod
-    def manager(cls):
+    def get_schema(cls, many=False, exclude=(), only=None, field_filter_fn=None):
+        return schemaRegistry.get_schema(
+            cls, many=many, exclude=exclude, only=only, field_filter_fn=field_filter_fn
+        )
+
+    @classmethod
+    def get_indexes(cls):
+        return [
+            # default filter of the list views
+            Index(['deleted', '_id'])
+        ]
+
+    @classmethod
+    def create_manager(cls):
         return Manager(cls)
 
-    def __init__(self, **kwargs):
+    @classmethod
+    def manager(cls):
+        return managerRegistry.get(cls)
+
+    def __init__(self, _only=None, **kwargs):
         super().__init__()
         self._deleted_ = False
+        # names of the fields the item was loaded with, None for all fields
+        self._only_ = None if _only is None else frozenset(_only)
+        # stored values of the fields, see snapshot()
+        self._snapshot_ = None
         # iterate over all fields from schema and read values from kwargs to self.
-        for field_name, field in self.get_scheme_cls()().declared_fields.items():
+        for field_name, field in self.get_schema().declared_fields.items():
+            if not self._is_loaded(field_name):
+                continue
             try:
                 getattr(self, field_name)
             except AttributeError:
@@ -56,15 +96,24 @@ class ModelBase(Resource):
             result.update(_fields)
         return result
 
+    def _is_loaded(self, field_name, field=None):
+        if self._only_ is None:
+            return True
+        names = (field_name, getattr(field, 'load_from', None), getattr(field, 'dump_to', None))
+        return any(name in self._only_ for name in names if name)
+
     def _load_fields(self):
         _fields = self._get_fields()
         for field_name, field in _fields.items():
+            # references of fields which were not requested are not loaded at all
+            if not self._is_loaded(field_name, field):
+                continue
             field.load(field_name=field_name, obj=self)
 
     def _serialize_fields(self, exclude=[]):
         _fields = self._get_fields()
         for field_name, field in _fields.items():
-            if field_name in exclude:
+            if field_name in exclude or not self._is_loaded(field_name, field):
                 continue
             field.serialize(field_name=field_name, obj=self)
 
@@ -76,9 +125,33 @@ class ModelBase(Resource):
     def is_new(self):
         return self._id is None
 
+    def serialize_only(self, fields):
+        """restricts the serialized fields, e.g. to drop fields which were loaded for internal use"""
+        self._only_ = frozenset(fields)
+
+    def snapshot(self, stored_data):
+        """remembers the stored document of the item, e.g. the raw document it was loaded from"""
+        self._snapshot_ = stored_data
+
+    @property
+    def stored_data(self):
+        return self._snapshot_
+
+    def changed_fields(self, data):
+        """
+        names of the fields whose serialized values in data differ from the snapshot, _id excluded.
+        a missing value equals None. None if there is no snapshot, all fields have to be written then.
+        """
+        if self._snapshot_ is None:
+            return None
+        return set(
+            field_name for field_name, value in data.items()
+            if field_name != '_id' and _stored_form(value) != _stored_form(self._snapshot_.get(field_name))
+        )
+
     def serialize(self, exclude=(), exclude_fields=(), field_filter_fn=None):
         self._serialize_fields(exclude=exclude_fields)
 
-        schema = self.get_scheme_cls()(exclude=exclude, field_filter_fn=field_filter_fn)
+        schema = self.get_schema(exclude=exclude, only=self._only_, field_filter_fn=field_filter_fn)
         dump_result = schema.dump(self)
         return dump_result.data
@@ -1,4 +1,4 @@
-from database.exceptions import NotFoundError
+from models.batch_loader import current_batch_scope
 from models.misc import CachedObj
 from models.model_fields import BaseModelField
 
@@ -22,24 +22,26 @@ class ReferenceTargetField(BaseModelField):
         self.transform_value = value_transformer
         self.validate_exits = validate_exists
 
-    def _validate_exists(self, val):
-        if not self.target_cls.manager().exists({
-            self.target_field: val
-        }):
-            raise NotFoundError(self.target_cls.manager().collection, val)
-
     def _serialize(self, value, attr=None, obj=None):
-        transformed_value = self.transform_value(value)
-        if self.validate_exits:
-            self._validate_exists(transformed_value)
-        return transformed_value
+        # the stored key of a reference which was not resolved yet can be written back as is
+        if isinstance(value, CachedObj) and value.key is not None:
+            return value.key
+        return self.transform_value(value)
+
+    def reference_value(self, obj, field_name):
+        return self._serialize(getattr(obj, field_name), field_name, obj)
 
     def _load(self, value, attr=None, src_obj=None):
+        batch_scope = current_batch_scope()
+        if batch_scope is not None:
+            return batch_scope.loader(self.target_cls, self.target_field).load(value)
+
         cached = CachedObj(
             lambda: next(iter(self.target_cls.manager().get({
                 self.target_field: value
             })
-            ), None)
+            ), None),
+            key=value
         )
         return cached
 
@@ -83,6 +85,11 @@ class ReferenceField(BaseModelField):
         }
 
     def _load(self, value, attr, src_obj):
+        batch_scope = current_batch_scope()
+        if batch_scope is not None and not self.single_value_condition:
+            reference_value = self.filter_conditions[self.reference_field](src_obj)
+            return batch_scope.loader(self.target_cls, self.reference_field, many=True).load(reference_value)
+
         cache_key = id(value)
         if cache_key not in self.cached:
             conditions = self._get_concrete_conditions(src_obj)
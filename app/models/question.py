@@ -1,5 +1,8 @@
 from marshmallow import fields
+from pymongo import DESCENDING
 
+from database.indexes import Index
+from database.schema import cached_schema_cls
 from database.schema_fields import UnCacheField
 from models.location_model import LocationBasedModel
 from models.model_reference_fields import ReferenceField
@@ -11,6 +14,8 @@ def _question_answer_model():
 
 
 class QuestionModel(LocationBasedModel):
+    cache_geo_queries = True
+
     fields = {
         "answers": ReferenceField(
             target_cls=_question_answer_model,
@@ -19,6 +24,13 @@ class QuestionModel(LocationBasedModel):
     }
 
     @classmethod
+    def get_indexes(cls):
+        return super(QuestionModel, cls).get_indexes() + [
+            Index(['deleted', ('score', DESCENDING)]),
+        ]
+
+    @classmethod
+    @cached_schema_cls
     def get_scheme_cls(cls, class_to_create=None):
         class_to_create = class_to_create or cls
         base_schema = super(QuestionModel, cls).get_scheme_cls(class_to_create)
@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+from database.exceptions import NotFoundError
+from models.model_reference_fields import ReferenceTargetField
+
+
+class ReferenceValidator(object):
+    """
+    checks that the targets of all ReferenceTargetFields of the given items exist.
+    all values referring to the same target are checked with one $in query,
+    targets which were found recently are not looked up again.
+    the threads of a process share the cache of found targets, it is only touched with the lock held.
+    """
+
+    def __init__(self, ttl=5.0, max_size=10000, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.clock = clock
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def _is_cached(self, key, now):
+        with self.lock:
+            expires_at = self.cache.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < now:
+                del self.cache[key]
+                return False
+            return True
+
+    def _remember(self, key, now):
+        with self.lock:
+            self.cache[key] = now + self.ttl
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_size:
+                self.cache.popitem(last=False)
+
+    def _collect(self, items):
+        # (target_cls, target_field) -> value -> indexes of the items referring to it
+        values_per_target = OrderedDict()
+        for index, item in enumerate(items):
+            for field_name, field in item._get_fields().items():
+                if not isinstance(field, ReferenceTargetField) or not field.validate_exits:
+                    continue
+                value = field.reference_value(item, field_name)
+                if value is None:
+                    continue
+                target = (field.target_cls, field.target_field)
+                values_per_target.setdefault(target, OrderedDict()).setdefault(value, []).append(index)
+        return values_per_target
+
+    def find_invalid(self, items):
+        """{index: NotFoundError} of the items referring to missing targets, with one query per target"""
+        now = self.clock()
+        invalid = {}
+        for (target_cls, target_field), values in self._collect(items).items():
+            manager = target_cls.manager()
+            unchecked = [
+                value for value in values
+                if not self._is_cached((manager.collection_name, target_field, value), now)
+            ]
+            if not unchecked:
+                continue
+
+            existing = manager.existing_values(target_field, unchecked)
+            for value in unchecked:
+                if value not in existing:
+                    for index in values[value]:
+                        invalid.setdefault(index, NotFoundError(manager.collection, value))
+                    continue
+                self._remember((manager.collection_name, target_field, value), now)
+        return invalid
+
+    def validate(self, items):
+        invalid = self.find_invalid(items)
+        if invalid:
+            raise invalid[min(invalid)]
+
+    def reset(self):
+        with self.lock:
+            self.cache.clear()
+
+
+referenceValidator = ReferenceValidator()
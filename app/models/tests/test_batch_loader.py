@@ -0,0 +1,101 @@
+import random
+import unittest
+import unittest.mock as mock
+
+from database.utils import int_to_id_obj, id_obj_to_hex_str
+from models.batch_loader import BatchLoader, batch_loading, current_batch_scope
+from models.model_reference_fields import ReferenceTargetField, ReferenceField
+
+
+class TargetMock:
+    manager_mock = None
+
+    @classmethod
+    def manager(cls):
+        return cls.manager_mock
+
+    def __init__(self, **kwargs):
+        for key, val in kwargs.items():
+            setattr(self, key, val)
+
+
+class BatchLoaderBase(unittest.TestCase):
+    def setUp(self):
+        TargetMock.manager_mock = mock.MagicMock()
+        self.manager = TargetMock.manager_mock
+
+
+class TestBatchLoader(BatchLoaderBase):
+    def test_resolves_all_pending_keys_with_one_query(self):
+        self.manager.get.return_value = [TargetMock(_id=1), TargetMock(_id=2)]
+        loader = BatchLoader(TargetMock, '_id')
+        first, second, missing = loader.load(1), loader.load(2), loader.load(3)
+
+        self.manager.get.assert_not_called()
+        self.assertEqual(first.value._id, 1)
+        self.assertEqual(second.value._id, 2)
+        self.assertIsNone(missing.value)
+        self.manager.get.assert_called_once_with({'_id': {'$in': [1, 2, 3]}})
+
+    def test_groups_results_for_many(self):
+        self.manager.get.return_value = [
+            TargetMock(parent=1, val='a'), TargetMock(parent=2, val='b'), TargetMock(parent=1, val='c')
+        ]
+        loader = BatchLoader(TargetMock, 'parent', many=True)
+        first, second, empty = loader.load(1), loader.load(2), loader.load(3)
+
+        self.assertEqual([item.val for item in first.value], ['a', 'c'])
+        self.assertEqual([item.val for item in second.value], ['b'])
+        self.assertEqual(empty.value, [])
+        self.manager.get.assert_called_once()
+
+    def test_matches_object_ids_with_hex_strings(self):
+        id_obj = int_to_id_obj(random.randint(1, 10000))
+        self.manager.get.return_value = [TargetMock(_id=id_obj_to_hex_str(id_obj))]
+        loader = BatchLoader(TargetMock, '_id')
+
+        self.assertEqual(loader.load(id_obj).value._id, id_obj_to_hex_str(id_obj))
+
+    def test_keys_added_after_dispatch_are_queried_separately(self):
+        self.manager.get.return_value = []
+        loader = BatchLoader(TargetMock, '_id')
+        loader.load(1).value
+        loader.load(2).value
+        self.assertEqual(self.manager.get.call_count, 2)
+        self.manager.get.assert_called_with({'_id': {'$in': [2]}})
+
+
+class TestBatchLoading(unittest.TestCase):
+    def test_scope_is_only_active_inside_context(self):
+        self.assertIsNone(current_batch_scope())
+        with batch_loading() as scope:
+            self.assertIs(current_batch_scope(), scope)
+            with batch_loading() as inner_scope:
+                self.assertIs(inner_scope, scope)
+            self.assertIs(current_batch_scope(), scope)
+        self.assertIsNone(current_batch_scope())
+
+
+class TestReferenceFieldsInBatchScope(BatchLoaderBase):
+    def test_reference_target_fields_share_one_query(self):
+        self.manager.get.return_value = [TargetMock(_id=1), TargetMock(_id=2)]
+        field = ReferenceTargetField(target_cls=lambda: TargetMock)
+
+        with batch_loading():
+            loaded = [field._load(1), field._load(2)]
+
+        self.assertEqual([cached.value._id for cached in loaded], [1, 2])
+        self.manager.get.assert_called_once_with({'_id': {'$in': [1, 2]}})
+
+    def test_reference_fields_share_one_query(self):
+        self.manager.get.return_value = [
+            TargetMock(parent_id=1), TargetMock(parent_id=1), TargetMock(parent_id=2)
+        ]
+        field = ReferenceField(target_cls=lambda: TargetMock, reference_field='parent_id')
+        parents = [TargetMock(_id=1), TargetMock(_id=2)]
+
+        with batch_loading():
+            loaded = [field._load(None, 'children', parent) for parent in parents]
+
+        self.assertEqual([len(cached.value) for cached in loaded], [2, 1])
+        self.manager.get.assert_called_once_with({'parent_id': {'$in': [1, 2]}})
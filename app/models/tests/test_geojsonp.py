@@ -1,7 +1,7 @@
 import random
 import unittest
 
-from models.geojsonp import locationEntityFactory, Point
+from models.geojsonp import locationEntityFactory, MultiPolygon, Point, Polygon
 
 
 class TestLocationEntityFactory(unittest.TestCase):
@@ -52,3 +52,28 @@ class TestPoint(unittest.TestCase):
                              'type': "Point",
                              'coordinates': tuple((self.longitude, self.latitude))
                          })
+
+
+class TestPolygon(unittest.TestCase):
+    def setUp(self):
+        self.coordinates = [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]
+
+    def test_serialize(self):
+        self.assertEqual(Polygon(self.coordinates).serialize(), {
+            'type': 'Polygon',
+            'coordinates': [[[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0], [0.0, 0.0]]]
+        })
+
+    def test_ring_has_to_be_closed(self):
+        with self.assertRaises(ValueError):
+            Polygon([[[0, 0], [1, 0], [1, 1], [0, 1]]])
+
+    def test_simplify(self):
+        polygon = Polygon([[[0, 0], [0.5, 0.000001], [1, 0], [1, 1], [0, 1], [0, 0]]])
+        self.assertEqual(polygon.simplify(10).vertex_count(), 5)
+
+    def test_multipolygon(self):
+        multi_polygon = locationEntityFactory.get_class('MultiPolygon')([self.coordinates, self.coordinates])
+        self.assertIsInstance(multi_polygon, MultiPolygon)
+        self.assertEqual(multi_polygon.vertex_count(), 10)
+        self.assertEqual(multi_polygon.serialize()['coordinates'][1], Polygon(self.coordinates).serialize()['coordinates'])
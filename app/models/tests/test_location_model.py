@@ -3,6 +3,7 @@ import unittest
 from unittest import mock
 
 from database.location_manager import LocationManager
+from database.registry import managerRegistry
 from models.geojsonp import Point
 from models.location_model import LocationBasedModel
 
@@ -15,6 +16,7 @@ class TestManager(unittest.TestCase):
 
     def tearDown(self):
         self.patcher.stop()
+        managerRegistry.reset()
 
     def test_creates_manager_for_class(self):
         class TestCls(LocationBasedModel):
@@ -6,6 +6,7 @@ from copy import copy
 from marshmallow import fields
 
 from database.manager import Manager
+from database.registry import managerRegistry
 from database.schema_fields import IdField
 from database.utils import int_to_id_obj
 from models.model_base import ModelBase
@@ -49,6 +50,9 @@ class TestModelBaseSchema(unittest.TestCase):
 
 
 class TestManager(unittest.TestCase):
+    def tearDown(self):
+        managerRegistry.reset()
+
     def test_creates_manager_for_class(self):
         class TestCls(ModelBase):
             pass
@@ -59,6 +63,16 @@ class TestManager(unittest.TestCase):
             isinstance(manager, Manager)
         )
 
+    def test_returns_the_same_manager_for_a_class(self):
+        class TestCls(ModelBase):
+            pass
+
+        class OtherCls(ModelBase):
+            pass
+
+        self.assertIs(TestCls.manager(), TestCls.manager())
+        self.assertIsNot(TestCls.manager(), OtherCls.manager())
+
 
 class TestNew(unittest.TestCase):
     def test_is_true_if_no_id_is_present(self):
@@ -86,6 +100,29 @@ class TestDeleted(unittest.TestCase):
         )
 
 
+class TestChangedFields(unittest.TestCase):
+    def test_none_without_snapshot(self):
+        self.assertIsNone(ModelBase().changed_fields({'score': 1}))
+
+    def test_compares_with_the_stored_form(self):
+        instance = ModelBase()
+        instance.snapshot({
+            '_id': int_to_id_obj(1),
+            'loc': {'type': 'Point', 'coordinates': [1.0, 2.0]},
+            'question_id': int_to_id_obj(2),
+            'score': 1
+        })
+        changed_fields = instance.changed_fields({
+            '_id': 'other',
+            'loc': {'type': 'Point', 'coordinates': (1.0, 2.0)},
+            'question_id': int_to_id_obj(2).binary.hex(),
+            'score': 2,
+            'cell': None,
+            'topic': 'new'
+        })
+        self.assertEqual(changed_fields, {'score', 'topic'})
+
+
 class DummyField:
     def __init__(self):
         self.load = mock.MagicMock()
@@ -161,3 +198,42 @@ class TestSerialization(unittest.TestCase):
         self.Dummy.fields['dummy_field'].load.assert_called_once_with(
             field_name='dummy_field', obj=self.dummy_instance
         )
+
+
+class TestOnlyLoadedFields(unittest.TestCase):
+    class Dummy(ModelBase):
+        fields = {
+            'dummy_field': DummyField()
+        }
+
+        @classmethod
+        def get_scheme_cls(cls, class_to_create=None):
+            base_schema = super(TestOnlyLoadedFields.Dummy, cls).get_scheme_cls(class_to_create)
+
+            class DummySchema(base_schema):
+                required_field = fields.Integer()
+                other_field = fields.Integer()
+
+            return DummySchema
+
+    def setUp(self):
+        self.Dummy.fields['dummy_field'].load.reset_mock()
+        self.Dummy.fields['dummy_field'].serialize.reset_mock()
+
+    def test_schema_with_only_creates_partial_instance(self):
+        instance = self.Dummy.get_schema(only=('_id', 'other_field')).load({'other_field': 1}).data
+
+        self.assertEqual(instance.other_field, 1)
+        self.assertFalse(hasattr(instance, 'required_field'))
+
+    def test_fields_not_loaded_are_not_loaded_or_serialized(self):
+        instance = self.Dummy(_only=('_id', 'other_field'), other_field=1)
+        serialized = instance.serialize()
+
+        self.assertEqual(serialized, {'_id': None, 'other_field': 1})
+        self.Dummy.fields['dummy_field'].load.assert_not_called()
+        self.Dummy.fields['dummy_field'].serialize.assert_not_called()
+
+    def test_requested_reference_fields_are_loaded(self):
+        self.Dummy(_only=('_id', 'dummy_field'))
+        self.Dummy.fields['dummy_field'].load.assert_called_once()
@@ -2,7 +2,6 @@ import random
 import unittest
 import unittest.mock as mock
 
-from database.exceptions import NotFoundError
 from models.misc import CachedObj
 from models.model_reference_fields import ReferenceTargetField, ReferenceField
 
@@ -28,54 +27,47 @@ class ReferenceFieldBase(unittest.TestCase):
 
 
 class TestReferenceTargetFieldSerialize(ReferenceFieldBase):
-    def test_serialize_no_value_transformer_no_exists(self):
+    def test_serialize_no_value_transformer(self):
         field = ReferenceTargetField(
             target_cls=self.modelMockCls,
-            validate_exists=False
         )
 
         val = random.randint(0, 1000)
         serialized = field._serialize(val)
         self.assertEqual(val, serialized)
-        self.manager.exists.assert_not_called()
-
-    def test_serialize_no_value_transformer_item_exists(self):
-        field = ReferenceTargetField(
-            target_cls=self.modelMockCls,
-        )
-        self.manager.exists.return_value = True
-
-        val = random.randint(0, 1000)
-        serialized = field._serialize(val)
-        self.assertEqual(val, serialized)
-        self.manager.exists.assert_called_once_with({
-            '_id': val
-        })
 
-    def test_serialize_wirg_transformer_item_exists(self):
+    def test_serialize_with_transformer(self):
         value_transformer = lambda x: x + 1
         field = ReferenceTargetField(
             target_cls=self.modelMockCls,
             value_transformer=value_transformer
         )
-        self.manager.exists.return_value = True
 
         val = random.randint(0, 1000)
         serialized = field._serialize(val)
         self.assertEqual(value_transformer(val), serialized)
-        self.manager.exists.assert_called_once_with({
-            '_id': value_transformer(val)
-        })
 
-    def test_serialize_no_value_transformer_item_does_notexists(self):
+    def test_serialize_does_not_validate_existence(self):
         field = ReferenceTargetField(
             target_cls=lambda: self.modelMockCls,
         )
         self.manager.exists.return_value = False
 
         val = random.randint(0, 1000)
-        with self.assertRaises(NotFoundError):
-            field._serialize(val)
+        field._serialize(val)
+        self.manager.exists.assert_not_called()
+
+    def test_serialize_unresolved_reference_returns_its_key(self):
+        creator = mock.MagicMock()
+        field = ReferenceTargetField(
+            target_cls=self.modelMockCls,
+            value_transformer=lambda v: v.value._id
+        )
+
+        val = random.randint(0, 1000)
+        serialized = field._serialize(CachedObj(creator, key=val))
+        self.assertEqual(val, serialized)
+        creator.assert_not_called()
 
 
 class TestReferenceTargetFieldLoad(ReferenceFieldBase):
@@ -0,0 +1,81 @@
+import random
+import unittest
+import unittest.mock as mock
+
+from database.exceptions import NotFoundError
+from models.misc import CachedObj
+from models.model_reference_fields import ReferenceTargetField
+from models.reference_validation import ReferenceValidator
+
+
+class ReferenceValidationBase(unittest.TestCase):
+    def setUp(self):
+        manager = self.manager = mock.MagicMock()
+        self.manager.collection_name = 'Target'
+
+        class Target:
+            @classmethod
+            def manager(cls):
+                return manager
+
+        class Item:
+            fields = {
+                'target': ReferenceTargetField(target_cls=lambda: Target, load_from='target_id'),
+                'unchecked': ReferenceTargetField(target_cls=lambda: Target, validate_exists=False)
+            }
+
+            def __init__(self, target_id):
+                self.target = CachedObj(mock.MagicMock(), key=target_id)
+                self.unchecked = random.randint(0, 1000)
+
+            def _get_fields(self):
+                return self.fields
+
+        self.Item = Item
+        self.now = 100.0
+        self.validator = ReferenceValidator(ttl=5, clock=lambda: self.now)
+
+
+class TestReferenceValidator(ReferenceValidationBase):
+    def test_validates_all_items_with_one_query(self):
+        self.manager.existing_values.return_value = {1, 2}
+        self.validator.validate([self.Item(1), self.Item(2), self.Item(1)])
+
+        self.manager.existing_values.assert_called_once_with('_id', [1, 2])
+
+    def test_raises_not_found_for_missing_target(self):
+        self.manager.existing_values.return_value = {1}
+        with self.assertRaises(NotFoundError) as context:
+            self.validator.validate([self.Item(1), self.Item(2)])
+        self.assertEqual(context.exception._id, 2)
+
+    def test_skips_lookup_for_recently_found_targets(self):
+        self.manager.existing_values.return_value = {1}
+        self.validator.validate([self.Item(1)])
+        self.validator.validate([self.Item(1)])
+
+        self.manager.existing_values.assert_called_once()
+
+    def test_looks_up_again_after_ttl(self):
+        self.manager.existing_values.return_value = {1}
+        self.validator.validate([self.Item(1)])
+        self.now += 6
+        self.validator.validate([self.Item(1)])
+
+        self.assertEqual(self.manager.existing_values.call_count, 2)
+
+    def test_missing_targets_are_not_cached(self):
+        self.manager.existing_values.return_value = set()
+        for _ in range(2):
+            with self.assertRaises(NotFoundError):
+                self.validator.validate([self.Item(1)])
+
+        self.assertEqual(self.manager.existing_values.call_count, 2)
+
+    def test_find_invalid_returns_errors_per_item(self):
+        self.manager.existing_values.return_value = {1}
+        invalid = self.validator.find_invalid([self.Item(1), self.Item(2), self.Item(2)])
+
+        self.manager.existing_values.assert_called_once_with('_id', [1, 2])
+        self.assertEqual(sorted(invalid), [1, 2])
+        self.assertEqual(invalid[1]._id, 2)
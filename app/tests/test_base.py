@@ -1,6 +1,7 @@
 import unittest.mock as mock
 import unittest
 from app import App
+from database.registry import managerRegistry
 
 
 class BaseTest(unittest.TestCase):
@@ -10,8 +11,18 @@ class BaseTest(unittest.TestCase):
         self.db_mock = self.init_db_patcher.start()
         self.get_db_patcher = mock.patch('database.manager.get_db')
         self.get_db_mock = self.get_db_patcher.start()
+        managerRegistry.reset()
         self.app = App.test_client()
+        # write counters of the cached collections, see Manager.bump_write_generation
+        self.write_generations_mock = mock.Mock(name='write generations mock')
+        self.write_generations_mock.find_one.return_value = None
+        self.write_generations_mock.find_one_and_update.return_value = {'generation': 1}
+
+    def use_collections(self, collections):
+        """get_db() returns the collection mocks by name"""
+        self.get_db_mock.return_value = dict(collections, write_generations=self.write_generations_mock)
 
     def tearDown(self):
         self.init_db_patcher.stop()
         self.get_db_patcher.stop()
+        managerRegistry.reset()
@@ -1,9 +1,15 @@
 import json
+from collections import defaultdict
 from random import randrange
 from unittest import mock
 
-from database import utils
+from pymongo.errors import OperationFailure
+
+from app import App
+from database import geohash, unit_of_work, utils
+from database.pagination import encode_cursor
 from tests.test_base import BaseTest
+from views.questionView import QuestionVote
 
 
 class TestQuestionViewGet(BaseTest):
@@ -14,6 +20,284 @@ class TestQuestionViewGet(BaseTest):
         assert json.loads(resp.data) == []
 
 
+class TestQuestionViewDatabaseCommands(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.question_mongo_mock = mock.Mock(name='question collection mock')
+        self.answer_mongo_mock = mock.Mock(name='answer collection mock')
+        self.question_mongo_mock.find.return_value = []
+        self.question_mongo_mock.find_one.return_value = {
+            '_id': utils.int_to_id_obj(randrange(30000)),
+            'topic': 'some question',
+            'question': 'content',
+            'loc': {
+                'type': 'Point',
+                'coordinates': [20.21, 40.764]
+            }
+        }
+        self.answer_mongo_mock.find.return_value = []
+        self.use_collections({
+            'QuestionModel': self.question_mongo_mock,
+            'AnswerModel': self.answer_mongo_mock
+        })
+
+    def command_names(self, collection_mock):
+        # child mocks record every call made on the collection, e.g. find, create_index, ...
+        return [call[0] for call in collection_mock.method_calls]
+
+    def test_get_list_sends_a_single_find(self):
+        resp = self.app.get('/api/questions/')
+        assert resp.status == '200 OK'
+        assert self.command_names(self.question_mongo_mock) == ['find']
+        assert self.command_names(self.answer_mongo_mock) == []
+
+    def test_get_list_loads_answers_of_all_questions_with_one_query(self):
+        self.question_mongo_mock.find.return_value = [
+            dict(self.question_mongo_mock.find_one.return_value, _id=utils.int_to_id_obj(idx))
+            for idx in range(1, 4)
+        ]
+        resp = self.app.get('/api/questions/')
+        assert resp.status == '200 OK'
+        assert len(json.loads(resp.data)) == 3
+        assert self.command_names(self.answer_mongo_mock) == ['find']
+
+    def test_get_list_is_paginated(self):
+        self.question_mongo_mock.find.return_value = [
+            dict(self.question_mongo_mock.find_one.return_value, _id=utils.int_to_id_obj(idx))
+            for idx in range(1, 4)
+        ]
+        resp = self.app.get('/api/questions/?limit=2')
+        assert resp.status == '200 OK'
+        assert len(json.loads(resp.data)) == 2
+        assert self.question_mongo_mock.find.call_args[1]['limit'] == 3
+        assert resp.headers['Link'] == '<http://localhost/api/questions/?limit=2&after={}>; rel="next"'.format(
+            encode_cursor(utils.int_to_id_obj(2))
+        )
+
+    def test_get_list_last_page_has_no_link(self):
+        resp = self.app.get('/api/questions/')
+        assert resp.status == '200 OK'
+        assert 'Link' not in resp.headers
+
+    def test_get_list_with_invalid_cursor(self):
+        resp = self.app.get('/api/questions/?after=foo')
+        assert resp.status == '400 BAD REQUEST'
+
+    def test_get_list_as_json_stream(self):
+        self.question_mongo_mock.find.return_value = [
+            dict(self.question_mongo_mock.find_one.return_value, _id=utils.int_to_id_obj(idx))
+            for idx in range(1, 4)
+        ]
+        resp = self.app.get('/api/questions/?stream=json')
+        assert resp.status == '200 OK'
+        assert resp.is_streamed
+        assert resp.mimetype == 'application/json'
+        assert [item['_id'] for item in json.loads(resp.data)] == [
+            utils.id_obj_to_hex_str(utils.int_to_id_obj(idx)) for idx in range(1, 4)
+        ]
+        assert 'limit' not in self.question_mongo_mock.find.call_args[1]
+
+    def test_get_list_as_ndjson_stream(self):
+        self.question_mongo_mock.find.return_value = [
+            dict(self.question_mongo_mock.find_one.return_value, _id=utils.int_to_id_obj(idx))
+            for idx in range(1, 3)
+        ]
+        resp = self.app.get('/api/questions/', headers={'Accept': 'application/x-ndjson'})
+        assert resp.mimetype == 'application/x-ndjson'
+        lines = resp.data.decode('utf-8').splitlines()
+        assert [json.loads(line)['_id'] for line in lines] == [
+            utils.id_obj_to_hex_str(utils.int_to_id_obj(idx)) for idx in range(1, 3)
+        ]
+
+    def test_get_list_with_unknown_stream_format(self):
+        resp = self.app.get('/api/questions/?stream=xml')
+        assert resp.status == '400 BAD REQUEST'
+
+    def test_get_list_with_fields(self):
+        self.question_mongo_mock.find.return_value = [
+            {'_id': utils.int_to_id_obj(1), 'topic': 'some question'}
+        ]
+        resp = self.app.get('/api/questions/?fields=topic')
+        assert resp.status == '200 OK'
+        assert json.loads(resp.data) == [
+            {'_id': utils.id_obj_to_hex_str(utils.int_to_id_obj(1)), 'topic': 'some question'}
+        ]
+        assert self.question_mongo_mock.find.call_args[1]['projection'] == {'_id': True, 'topic': True}
+        assert self.command_names(self.answer_mongo_mock) == []
+
+    def test_get_list_with_unknown_fields(self):
+        resp = self.app.get('/api/questions/?fields=topic,foo')
+        assert resp.status == '400 BAD REQUEST'
+
+    def test_get_nearby_sorted_by_score(self):
+        self.question_mongo_mock.aggregate.return_value = [
+            dict(self.question_mongo_mock.find_one.return_value, _id=utils.int_to_id_obj(1), score=3, distance=12.5)
+        ]
+        # radii beyond the query cache go to mongodb
+        resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&max_distance=50000&sort=-score&limit=5')
+        assert resp.status == '200 OK'
+        assert [item['distance'] for item in json.loads(resp.data)] == [12.5]
+        pipeline = self.question_mongo_mock.aggregate.call_args[0][0]
+        assert pipeline[0]['$geoNear']['query'] == {'deleted': False}
+        assert pipeline[1] == {'$limit': 5}
+        assert list(pipeline[2]['$sort'].items()) == [('score', -1), ('distance', 1), ('_id', 1)]
+        assert self.command_names(self.question_mongo_mock) == ['aggregate']
+
+    def test_get_nearby_count(self):
+        self.question_mongo_mock.count_documents.return_value = 99
+        resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&max_distance=50000&count=true&limit=99')
+        assert resp.status == '200 OK'
+        assert json.loads(resp.data) == {'count': 99}
+        assert self.command_names(self.question_mongo_mock) == ['count_documents']
+
+    def test_nearby_pages_are_served_from_the_query_cache(self):
+        self.question_mongo_mock.find.return_value = [
+            dict(self.question_mongo_mock.find_one.return_value, _id=utils.int_to_id_obj(idx)) for idx in range(1, 4)
+        ]
+        url = '/api/questions/?longitude=20.21&latitude=40.764&max_distance=1000'
+        resp = self.app.get(url + '&limit=2')
+        assert resp.status == '200 OK'
+        assert len(json.loads(resp.data)) == 2
+        resp = self.app.get(url + '&count=true')
+        assert json.loads(resp.data) == {'count': 3}
+
+        assert self.command_names(self.question_mongo_mock) == ['find']
+        assert '$centerSphere' in self.question_mongo_mock.find.call_args[0][0]['loc']['$geoWithin']
+
+    def test_get_nearby_unsorted(self):
+        resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&max_distance=100000&sorted=false')
+        assert resp.status == '200 OK'
+        assert '$centerSphere' in self.question_mongo_mock.find.call_args[0][0]['loc']['$geoWithin']
+
+    def test_get_nearby_invalid_bool(self):
+        resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&max_distance=1000&sorted=maybe')
+        assert resp.status == '400 BAD REQUEST'
+
+    def test_get_k_nearest(self):
+        self.question_mongo_mock.aggregate.return_value = []
+        resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&k=5&max_distance=50000')
+        assert resp.status == '200 OK'
+        geo_near, limit = self.question_mongo_mock.aggregate.call_args[0][0]
+        assert geo_near['$geoNear']['query'] == {'deleted': False}
+        assert geo_near['$geoNear']['maxDistance'] == 50000
+        assert limit == {'$limit': 5}
+
+    def test_get_k_nearest_invalid_k(self):
+        for k in ('0', 'foo', '5000'):
+            resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&k=' + k)
+            assert resp.status == '400 BAD REQUEST'
+
+    def test_get_nearby_with_unknown_sort_field(self):
+        resp = self.app.get('/api/questions/?longitude=20.21&latitude=40.76&max_distance=1000&sort=foo')
+        assert resp.status == '400 BAD REQUEST'
+
+    def test_get_within_vertices(self):
+        resp = self.app.get('/api/questions/?vertices=[[0,0],[1,0],[1,1]]')
+        assert resp.status == '200 OK'
+        filter_data = self.question_mongo_mock.find.call_args[0][0]
+        assert filter_data['loc'] == {'$geoWithin': {'$polygon': [[0, 0], [1, 0], [1, 1]]}}
+        assert filter_data['deleted'] is False
+
+    def test_get_within_invalid_vertices(self):
+        resp = self.app.get('/api/questions/?vertices=foo')
+        assert resp.status == '400 BAD REQUEST'
+
+    def test_post_within_polygon_is_simplified(self):
+        polygon = {
+            'type': 'Polygon',
+            'coordinates': [[[0, 0], [0.005, 0.000001], [0.01, 0], [0.01, 0.01], [0, 0.01], [0, 0]]]
+        }
+        resp = self.app.post('/api/questions/within', data=json.dumps(polygon), content_type='application/json')
+        assert resp.status == '200 OK'
+        filter_data = self.question_mongo_mock.find.call_args[0][0]
+        assert filter_data['deleted'] is False
+        assert filter_data['loc']['$geoWithin']['$geometry'] == {
+            'type': 'Polygon',
+            'coordinates': [[[0, 0], [0.01, 0], [0.01, 0.01], [0, 0.01], [0, 0]]]
+        }
+
+    def test_post_within_feature_multipolygon(self):
+        feature = {
+            'type': 'Feature',
+            'geometry': {'type': 'MultiPolygon', 'coordinates': [[[[0, 0], [1, 0], [1, 1], [0, 0]]]]}
+        }
+        resp = self.app.post('/api/questions/within', data=json.dumps(feature), content_type='application/json')
+        assert resp.status == '200 OK'
+        assert self.question_mongo_mock.find.call_args[0][0]['loc']['$geoWithin']['$geometry']['type'] == \
+            'MultiPolygon'
+
+    def test_post_within_invalid_geometry(self):
+        for body in ({'type': 'Point', 'coordinates': [0, 0]}, {'type': 'Polygon', 'coordinates': [[[0, 0]]]}):
+            resp = self.app.post('/api/questions/within', data=json.dumps(body), content_type='application/json')
+            assert resp.status == '400 BAD REQUEST'
+
+    def test_post_within_rejected_simplification_falls_back_to_the_original(self):
+        polygon = {
+            'type': 'Polygon',
+            'coordinates': [[[0, 0], [0.005, 0.000001], [0.01, 0], [0.01, 0.01], [0, 0.01], [0, 0]]]
+        }
+        self.question_mongo_mock.find.side_effect = [OperationFailure('Loop is not valid', code=2), []]
+        resp = self.app.post('/api/questions/within', data=json.dumps(polygon), content_type='application/json')
+        assert resp.status == '200 OK'
+        assert self.question_mongo_mock.find.call_args[0][0]['loc']['$geoWithin']['$geometry'] == polygon
+
+    def test_post_within_rejected_geometry(self):
+        polygon = {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1], [1, 0], [0, 1], [0, 0]]]}
+        self.question_mongo_mock.find.side_effect = OperationFailure('Loop is not valid', code=2)
+        for url in ('/api/questions/within', '/api/questions/within?stream=ndjson'):
+            resp = self.app.post(url, data=json.dumps(polygon), content_type='application/json')
+            assert resp.status == '400 BAD REQUEST'
+
+    def test_within_only_accepts_post(self):
+        rules = [rule for rule in self.app.application.url_map.iter_rules() if rule.rule == '/api/questions/within']
+        assert [rule.methods - {'HEAD', 'OPTIONS'} for rule in rules] == [{'POST'}]
+
+    def test_get_in_bbox_is_capped(self):
+        resp = self.app.get('/api/questions/?bbox=170,-10,-170,10&limit=20')
+        assert resp.status == '200 OK'
+        filter_data = self.question_mongo_mock.find.call_args[0][0]
+        assert filter_data['deleted'] is False
+        assert len(filter_data['$or']) == 2
+        assert self.question_mongo_mock.find.call_args[1]['limit'] == 20
+
+    def test_get_in_bbox_invalid(self):
+        for bbox in ('1,2,3', 'a,b,c,d', '0,10,1,5', '0,0,200,1'):
+            resp = self.app.get('/api/questions/?bbox=' + bbox)
+            assert resp.status == '400 BAD REQUEST'
+
+    def test_get_clusters(self):
+        self.question_mongo_mock.aggregate.return_value = []
+        resp = self.app.get('/api/questions/clusters?bbox=13,52,14,53&zoom=7')
+        assert resp.status == '200 OK'
+        assert json.loads(resp.data) == []
+        assert self.command_names(self.question_mongo_mock) == ['aggregate']
+
+    def test_wrong_method_on_within_and_clusters(self):
+        assert self.app.get('/api/questions/within').status_code == 405
+        assert self.app.post('/api/questions/clusters').status_code == 405
+        assert self.app.delete('/api/questions/within').status_code == 405
+
+    def test_invalid_id_is_not_found(self):
+        assert self.app.get('/api/questions/' + 'x' * 24).status_code == 404
+        assert self.app.delete('/api/questions/' + 'x' * 24).status_code == 404
+        assert self.app.get('/api/questions/abc').status_code == 404
+
+    def test_clusters_only_accept_get(self):
+        rules = [rule for rule in self.app.application.url_map.iter_rules() if rule.rule == '/api/questions/clusters']
+        assert [rule.methods - {'HEAD', 'OPTIONS'} for rule in rules] == [{'GET'}]
+
+    def test_get_clusters_invalid(self):
+        for query in ('bbox=13,52,14,53', 'bbox=13,52,14,53&zoom=21', 'bbox=-180,-90,180,90&zoom=10'):
+            resp = self.app.get('/api/questions/clusters?' + query)
+            assert resp.status == '400 BAD REQUEST'
+
+    def test_get_single_sends_one_query_per_collection(self):
+        resp = self.app.get('/api/questions/' + utils.id_obj_to_hex_str(utils.int_to_id_obj(1)))
+        assert resp.status == '200 OK'
+        assert self.command_names(self.question_mongo_mock) == ['find_one']
+        assert self.command_names(self.answer_mongo_mock) == ['find']
+
+
 class TestQuestionViewPost(BaseTest):
 
     def setUp(self):
@@ -25,10 +309,10 @@ class TestQuestionViewPost(BaseTest):
         self.insert_result_mock.inserted_id = utils.int_to_id_obj(randrange(30000))
         self.question_mongo_mock.insert_one = mock.Mock(name='insert_one', return_value=self.insert_result_mock)
         answer_mongo_mock.find = mock.Mock(name="answer.find", return_value=[])
-        self.get_db_mock.return_value = {
+        self.use_collections({
             'QuestionModel': self.question_mongo_mock,
             'AnswerModel': answer_mongo_mock
-        }
+        })
 
     def test_posting_an_item(self):
         data = {
@@ -56,7 +340,283 @@ class TestQuestionViewPost(BaseTest):
             _id=utils.id_obj_to_hex_str(self.insert_result_mock.inserted_id),
             answers=[],
             deleted=False,
-            score=0
+            score=0,
+            cell=geohash.encode(20.21, 40.764)
         )
         response_data = json.loads(resp.data)
         assert response_data == expected_data
+
+    def test_posting_a_list_of_items(self):
+        question = {
+            'topic': 'some question',
+            'question': 'content',
+            'loc': {'type': 'Point', 'coordinates': [20.21, 40.764]}
+        }
+        data = {'question': [question, dict(question, loc='invalid'), question]}
+        resp = self.app.post('/api/questions/', data=json.dumps(data), content_type='application/json')
+
+        assert resp.status_code == 207
+        assert self.question_mongo_mock.insert_many.call_count == 1
+        assert self.question_mongo_mock.insert_one.call_count == 0
+        inserted = self.question_mongo_mock.insert_many.call_args[0][0]
+        results = json.loads(resp.data)
+        assert [result['status'] for result in results] == [201, 400, 201]
+        assert [results[0]['_id'], results[2]['_id']] == [
+            utils.id_obj_to_hex_str(document['_id']) for document in inserted
+        ]
+        assert 'loc' in results[1]['error']
+
+    def test_posting_a_list_of_items_all_created(self):
+        question = {
+            'topic': 'some question',
+            'question': 'content',
+            'loc': {'type': 'Point', 'coordinates': [20.21, 40.764]}
+        }
+        resp = self.app.post(
+            '/api/questions/', data=json.dumps({'question': [question] * 3}), content_type='application/json'
+        )
+
+        assert resp.status == '201 CREATED'
+        assert len(json.loads(resp.data)) == 3
+
+
+class TestQuestionViewBatch(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.question_mongo_mock = mock.Mock(name='question collection mock')
+        answer_mongo_mock = mock.Mock(name='answer collection mock')
+        answer_mongo_mock.find.return_value = []
+        self.ids = [utils.int_to_id_obj(idx) for idx in range(1, 4)]
+        self.question_mongo_mock.find.return_value = [{'_id': _id} for _id in self.ids[:2]]
+        self.question_mongo_mock.bulk_write.return_value.bulk_api_result = {'nMatched': 2, 'nModified': 2}
+        self.use_collections({
+            'QuestionModel': self.question_mongo_mock,
+            'AnswerModel': answer_mongo_mock
+        })
+
+    def test_put_list(self):
+        questions = [
+            {
+                '_id': utils.id_obj_to_hex_str(_id),
+                'topic': 'some question',
+                'question': 'content',
+                'loc': {'type': 'Point', 'coordinates': [20.21, 40.764]}
+            } for _id in self.ids
+        ]
+        questions.append(dict(questions[0], _id=None))
+        resp = self.app.put(
+            '/api/questions/', data=json.dumps({'question': questions}), content_type='application/json'
+        )
+
+        assert resp.status_code == 207
+        assert [result['status'] for result in json.loads(resp.data)] == [200, 200, 404, 400]
+        assert self.question_mongo_mock.bulk_write.call_count == 1
+        assert self.question_mongo_mock.update_one.call_count == 0
+
+    def test_delete_list(self):
+        ids = [utils.id_obj_to_hex_str(_id) for _id in self.ids]
+        resp = self.app.delete('/api/questions/', data=json.dumps({'_ids': ids}), content_type='application/json')
+
+        assert resp.status_code == 207
+        assert json.loads(resp.data) == [
+            {'status': 200, '_id': ids[0]},
+            {'status': 200, '_id': ids[1]},
+            {'status': 404, 'error': 'not found: {}'.format(ids[2])},
+        ]
+        assert self.question_mongo_mock.bulk_write.call_count == 1
+        assert self.question_mongo_mock.delete_one.call_count == 0
+
+    def test_delete_list_with_invalid_ids(self):
+        resp = self.app.delete('/api/questions/', data=json.dumps({'_ids': ['xyz']}), content_type='application/json')
+
+        assert resp.status_code == 400
+
+    def test_delete_without_ids(self):
+        resp = self.app.delete('/api/questions/')
+
+        assert resp.status_code == 400
+
+
+class TestQuestionViewVote(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.question_mongo_mock = mock.Mock(name='question collection mock')
+        self.use_collections({'QuestionModel': self.question_mongo_mock})
+        self._id = utils.id_obj_to_hex_str(utils.int_to_id_obj(1))
+
+    def tearDown(self):
+        QuestionVote.vote_buffer = None
+        super().tearDown()
+
+    def vote(self, data):
+        return self.app.post(
+            '/api/questions/{}/vote'.format(self._id), data=json.dumps(data), content_type='application/json'
+        )
+
+    def test_vote_increments_score(self):
+        QuestionVote.vote_buffer = None
+        self.question_mongo_mock.update_one.return_value.matched_count = 1
+        resp = self.vote({'vote': -1})
+
+        assert resp.status_code == 200
+        self.question_mongo_mock.update_one.assert_called_once_with(
+            {'_id': utils.int_to_id_obj(1)}, {'$inc': {'score': -1}}
+        )
+
+    def test_vote_for_missing_question(self):
+        QuestionVote.vote_buffer = None
+        self.question_mongo_mock.update_one.return_value.matched_count = 0
+        resp = self.vote({'vote': 1})
+
+        assert resp.status_code == 404
+
+    def test_vote_is_buffered(self):
+        QuestionVote.vote_buffer = mock.Mock()
+        resp = self.vote({'vote': 1})
+
+        assert resp.status_code == 202
+        QuestionVote.vote_buffer.add.assert_called_once_with(utils.int_to_id_obj(1), 1)
+        assert self.question_mongo_mock.method_calls == []
+
+    def test_invalid_vote(self):
+        for vote in (2, 0, True, 'up', None):
+            assert self.vote({'vote': vote}).status_code == 400
+
+    def test_vote_only_accepts_post(self):
+        rules = [
+            rule for rule in self.app.application.url_map.iter_rules() if rule.rule.endswith('/vote')
+        ]
+        assert len(rules) == 2
+        assert [rule.methods - {'HEAD', 'OPTIONS'} for rule in rules] == [{'POST'}, {'POST'}]
+
+    def test_vote_buffer_is_flushed_at_exit_once(self):
+        app = mock.Mock(config={'VOTE_BUFFER_INTERVAL': 0.3})
+        with mock.patch('views.model_base_view.atexit.register') as register_mock, \
+                mock.patch.object(QuestionVote, 'flush_at_exit_registered', False):
+            QuestionVote.configure(app)
+            QuestionVote.configure(app)
+
+        register_mock.assert_called_once_with(QuestionVote.flush_vote_buffer)
+
+
+class TestQuestionViewPatch(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.question_mongo_mock = mock.Mock(name='question collection mock')
+        answer_mongo_mock = mock.Mock(name='answer collection mock')
+        answer_mongo_mock.find.return_value = []
+        self.question_mongo_mock.find_one.return_value = {
+            '_id': utils.int_to_id_obj(1),
+            'topic': 'some question',
+            'question': 'content',
+            'deleted': False,
+            'score': 3,
+            'loc': {'type': 'Point', 'coordinates': [20.21, 40.764]},
+            'cell': geohash.encode(20.21, 40.764)
+        }
+        self.question_mongo_mock.update_one.return_value.matched_count = 1
+        self.question_mongo_mock.update_one.return_value.modified_count = 1
+        self.use_collections({
+            'QuestionModel': self.question_mongo_mock,
+            'AnswerModel': answer_mongo_mock
+        })
+        self.url = '/api/questions/' + utils.id_obj_to_hex_str(utils.int_to_id_obj(1))
+
+    def patch(self, data):
+        return self.app.patch(self.url, data=json.dumps({'question': data}), content_type='application/json')
+
+    def test_patch_sets_changed_fields(self):
+        resp = self.patch({'topic': 'new topic', 'question': 'content'})
+
+        assert resp.status_code == 200
+        assert json.loads(resp.data)['topic'] == 'new topic'
+        assert json.loads(resp.data)['score'] == 3
+        self.question_mongo_mock.update_one.assert_called_once_with(
+            {'_id': utils.int_to_id_obj(1)}, update={'$set': {'topic': 'new topic'}}
+        )
+
+    def test_patch_location_updates_cell(self):
+        resp = self.patch({'loc': {'type': 'Point', 'coordinates': [13.4, 52.5]}})
+
+        assert resp.status_code == 200
+        update = self.question_mongo_mock.update_one.call_args[1]['update']
+        assert sorted(update['$set']) == ['cell', 'loc']
+        assert update['$set']['cell'] == geohash.encode(13.4, 52.5)
+
+    def test_patch_without_changes_does_not_write(self):
+        resp = self.patch({'topic': 'some question'})
+
+        assert resp.status_code == 200
+        self.question_mongo_mock.update_one.assert_not_called()
+
+    def test_put_without_changes(self):
+        self.question_mongo_mock.update_one.return_value.modified_count = 0
+        resp = self.app.put(self.url, data=json.dumps({'question': {
+            'topic': 'some question',
+            'question': 'content',
+            'loc': {'type': 'Point', 'coordinates': [20.21, 40.764]}
+        }}), content_type='application/json')
+
+        assert resp.status_code == 200
+        assert json.loads(resp.data)['topic'] == 'some question'
+        self.question_mongo_mock.update_one.assert_called_once()
+
+    def test_patch_missing_item(self):
+        self.question_mongo_mock.find_one.return_value = None
+        resp = self.patch({'topic': 'new topic'})
+
+        assert resp.status_code == 404
+
+
+class TestQuestionViewUnitOfWork(BaseTest):
+    def setUp(self):
+        super().setUp()
+        # the app with UNIT_OF_WORK_PER_REQUEST, its hooks are removed again in tearDown
+        self.hook_patchers = [
+            mock.patch.object(App, name, defaultdict(list, {
+                key: list(functions) for key, functions in getattr(App, name).items()
+            })) for name in ('before_request_funcs', 'after_request_funcs', 'teardown_request_funcs')
+        ]
+        for patcher in self.hook_patchers:
+            patcher.start()
+        unit_of_work.init_app(App)
+        self.question_mongo_mock = mock.Mock(name='question collection mock')
+        answer_mongo_mock = mock.Mock(name='answer collection mock')
+        answer_mongo_mock.find.return_value = []
+        self.question_mongo_mock.find.return_value = []
+        self.question_mongo_mock.bulk_write.return_value.bulk_api_result = {'nMatched': 0, 'nModified': 0}
+        self.use_collections({
+            'QuestionModel': self.question_mongo_mock,
+            'AnswerModel': answer_mongo_mock
+        })
+        self._id = utils.id_obj_to_hex_str(utils.int_to_id_obj(1))
+
+    def tearDown(self):
+        for patcher in self.hook_patchers:
+            patcher.stop()
+        super().tearDown()
+
+    def test_delete_missing_item(self):
+        resp = self.app.delete('/api/questions/' + self._id)
+
+        assert resp.status_code == 404
+        self.question_mongo_mock.bulk_write.assert_not_called()
+        self.question_mongo_mock.delete_one.assert_not_called()
+
+    def test_delete(self):
+        self.question_mongo_mock.find.return_value = [{'_id': utils.int_to_id_obj(1)}]
+        resp = self.app.delete('/api/questions/' + self._id)
+
+        assert resp.status_code == 200
+        operations = self.question_mongo_mock.bulk_write.call_args[0][0]
+        assert [operation._filter for operation in operations] == [{'_id': utils.int_to_id_obj(1)}]
+
+    def test_put_missing_item(self):
+        resp = self.app.put('/api/questions/' + self._id, data=json.dumps({'question': {
+            'topic': 'some question',
+            'question': 'content',
+            'loc': {'type': 'Point', 'coordinates': [20.21, 40.764]}
+        }}), content_type='application/json')
+
+        assert resp.status_code == 404
+        self.question_mongo_mock.bulk_write.assert_called_once()
@@ -0,0 +1,143 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from database import utils
+from database.tiles import tile_of
+from models.geojsonp import Point
+from models.question import QuestionModel
+from tests.test_base import BaseTest
+from views.tileView import TileView
+from views.tile_cache import TileCache
+
+
+class TestTileView(BaseTest):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.tile_cache_patcher = mock.patch.object(TileView, 'tile_cache', TileCache(self.directory))
+        self.tile_cache_patcher.start()
+        self.question_mongo_mock = mock.Mock()
+        self.question_mongo_mock.find.return_value = [{
+            '_id': utils.int_to_id_obj(1),
+            'score': 7,
+            'loc': {'type': 'Point', 'coordinates': [13.4, 52.5]}
+        }]
+        answer_mongo_mock = mock.Mock()
+        answer_mongo_mock.find.return_value = []
+        self.use_collections({'QuestionModel': self.question_mongo_mock, 'AnswerModel': answer_mongo_mock})
+        self.url = '/api/tiles/questions/10/{}/{}'.format(*tile_of(10, 13.4, 52.5))
+
+    def tearDown(self):
+        self.tile_cache_patcher.stop()
+        shutil.rmtree(self.directory)
+        super().tearDown()
+
+    def test_renders_quantized_features(self):
+        resp = self.app.get(self.url)
+        assert resp.status == '200 OK'
+        tile = json.loads(resp.data)
+        assert tile['features'] == {
+            'id': [utils.id_obj_to_hex_str(utils.int_to_id_obj(1))], 'x': [473], 'y': [3767], 'score': [7]
+        }
+        assert tile['truncated'] is False
+        filter_data = self.question_mongo_mock.find.call_args[0][0]
+        assert filter_data['deleted'] is False
+        assert filter_data['loc']['$geoWithin']['$geometry']['type'] == 'Polygon'
+        assert self.question_mongo_mock.find.call_args[1]['limit'] == TileView.max_features + 1
+        assert resp.headers['Cache-Control'] == 'public, max-age=60'
+
+    def test_repeated_requests_skip_the_database(self):
+        first = self.app.get(self.url)
+        second = self.app.get(self.url)
+        assert first.data == second.data
+        assert self.question_mongo_mock.find.call_count == 1
+
+    def test_save_invalidates_tile(self):
+        self.app.get(self.url)
+        self.question_mongo_mock.insert_one.return_value.inserted_id = utils.int_to_id_obj(2)
+        QuestionModel.manager().save(QuestionModel(topic='t', question='q', loc=Point([13.41, 52.51])))
+        self.app.get(self.url)
+        assert self.question_mongo_mock.find.call_count == 2
+
+    def test_etag(self):
+        etag = self.app.get(self.url).headers['ETag']
+        resp = self.app.get(self.url, headers={'If-None-Match': etag})
+        assert resp.status == '304 NOT MODIFIED'
+
+    def test_unknown_layer_or_tile(self):
+        assert self.app.get('/api/tiles/foo/1/0/0').status == '404 NOT FOUND'
+        assert self.app.get('/api/tiles/questions/1/2/0').status == '404 NOT FOUND'
+
+
+class TestTileCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = TileCache(self.directory, max_age=300)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_put_and_get(self):
+        assert self.cache.get('questions', 1, 0, 0) is None
+        self.cache.put('questions', 1, 0, 0, b'{}')
+        assert self.cache.get('questions', 1, 0, 0) == b'{}'
+
+    def test_expires(self):
+        self.cache.put('questions', 1, 0, 0, b'{}')
+        self.cache.clock = lambda: time.time() + 301
+        assert self.cache.get('questions', 1, 0, 0) is None
+
+    def test_invalidate_removes_tiles_of_location_only(self):
+        self.cache.put('questions', 10, *tile_of(10, 13.4, 52.5), b'{}')
+        self.cache.put('questions', 10, 0, 0, b'{}')
+        self.cache.invalidate('questions', 13.4, 52.5)
+        assert self.cache.get('questions', 10, *tile_of(10, 13.4, 52.5)) is None
+        assert self.cache.get('questions', 10, 0, 0) == b'{}'
+
+    def test_deep_zoom_is_not_cached(self):
+        self.cache.max_zoom = 16
+        assert self.cache.put('questions', 17, 0, 0, b'{}') is False
+        assert self.cache.get('questions', 17, 0, 0) is None
+        assert not os.path.exists(os.path.join(self.directory, 'questions', '17'))
+
+    def test_render_started_before_a_write_is_not_stored(self):
+        rendered_at = time.time()
+        self.cache.invalidate('questions', 13.4, 52.5)
+        assert self.cache.put('questions', 1, 0, 0, b'{}', rendered_at=rendered_at - 1) is False
+        assert self.cache.get('questions', 1, 0, 0) is None
+        assert self.cache.put('questions', 1, 0, 0, b'{}', rendered_at=time.time() + 1) is True
+
+    def test_write_during_put_removes_the_tile(self):
+        rendered_at = time.time()
+        replace = os.replace
+
+        def replace_during_write(source, destination):
+            replace(source, destination)
+            self.cache.invalidate('questions', 0, 0)
+
+        with mock.patch('views.tile_cache.os.replace', replace_during_write):
+            assert self.cache.put('questions', 1, 0, 0, b'{}', rendered_at=rendered_at) is False
+        assert self.cache.get('questions', 1, 0, 0) is None
+
+    def test_evicts_expired_and_oldest_tiles(self):
+        now = time.time()
+        self.cache.put('questions', 1, 0, 0, b'0' * 10, rendered_at=now - 400)
+        self.cache.put('questions', 1, 1, 0, b'1' * 10, rendered_at=now - 20)
+        self.cache.put('questions', 1, 0, 1, b'2' * 10, rendered_at=now - 10)
+        self.cache.put('questions', 1, 1, 1, b'3' * 10, rendered_at=now)
+        self.cache.max_bytes = 25
+        assert self.cache.evict() == 2
+        assert self.cache.get('questions', 1, 0, 0) is None
+        assert self.cache.get('questions', 1, 1, 0) is None
+        assert self.cache.get('questions', 1, 0, 1) == b'2' * 10
+
+    def test_put_starts_eviction_in_background(self):
+        self.cache.evict_interval = 0
+        self.cache.put('questions', 1, 0, 0, b'{}')
+        self.cache.eviction.join(5)
+        assert self.cache.get('questions', 1, 0, 0) == b'{}'
@@ -1,9 +1,19 @@
+import json
+from itertools import chain, islice
+
 from flask import request, abort
+from pymongo.errors import OperationFailure
 
-from database.exceptions import NotFoundError
-from models.geojsonp import Point
+from database.clusters import MAX_ZOOM
+from database.exceptions import NotFoundError, InvalidCursorError
+from database.geo import split_bbox
+from models.geojsonp import MultiPolygon, Point, Polygon, locationEntityFactory
+from views import streaming
 from views.model_base_view import BaseModelView
 
+# code of the OperationFailure of geometries mongodb rejects, e.g. rings crossing themselves
+BAD_VALUE = 2
+
 
 class LocationModelView(BaseModelView):
     def is_nearby_request(self, kwargs):
@@ -15,31 +25,171 @@ class LocationModelView(BaseModelView):
             ]
         ])
 
+    def is_k_nearest_request(self, kwargs):
+        return "_id" not in kwargs and all([
+            key in request.args for key in [
+                "longitude",
+                "latitude",
+                "k"
+            ]
+        ])
+
     def is_within_request(self, kwargs):
         return "_id" not in kwargs and "vertices" in request.args
 
+    def is_bbox_request(self, kwargs):
+        return "_id" not in kwargs and "bbox" in request.args
+
     def is_single_item_request(self, kwargs):
         return "_id" in kwargs
 
-    def get(self, **kwargs):
+    def _get_vertices_arg(self):
+        """?vertices=[[longitude, latitude], ...] as list of Points"""
+        try:
+            vertices = [
+                Point([float(longitude), float(latitude)])
+                for longitude, latitude in json.loads(request.args["vertices"])
+            ]
+        except (TypeError, ValueError):
+            abort(400, "vertices have to be a json array of [longitude, latitude] pairs")
+        if len(vertices) < 3:
+            abort(400, "at least 3 vertices are required")
+        return vertices
+
+    def _get_bbox_arg(self):
+        """?bbox=min_longitude,min_latitude,max_longitude,max_latitude, min_longitude > max_longitude crosses 180"""
+        try:
+            min_longitude, min_latitude, max_longitude, max_latitude = map(float, request.args["bbox"].split(","))
+        except ValueError:
+            abort(400, "bbox has to be min_longitude,min_latitude,max_longitude,max_latitude")
+        if not (-180 <= min_longitude <= 180 and -180 <= max_longitude <= 180 and
+                -90 <= min_latitude <= max_latitude <= 90):
+            abort(400, "bbox is out of range")
+        return min_longitude, min_latitude, max_longitude, max_latitude
+
+    def _get_in_bbox(self):
+        bbox = self._get_bbox_arg()
+        fields = self._get_fields_arg()
+        stream_format = self._get_stream_format()
+        if stream_format:
+            return streaming.stream_response(self.manager.get_in_bbox(
+                *bbox, additional_filter_data=self.default_filter_args, fields=fields, stream=True
+            ), stream_format)
+
+        # dense viewports return the highest scored items only
+        limit, _ = self._get_page_args()
+        return [model.serialize() for model in self.manager.get_in_bbox(
+            *bbox, additional_filter_data=self.default_filter_args, limit=limit, fields=fields
+        )]
+
+    def _get_k_nearest(self):
+        query_params = request.args
+        location = Point([
+            float(query_params.get("longitude")),
+            float(query_params.get("latitude"))
+        ])
+        k = query_params.get("k", type=int)
+        if k is None or not 1 <= k <= self.max_page_size:
+            abort(400, "k has to be between 1 and {}".format(self.max_page_size))
+        max_distance = query_params.get("max_distance", type=float)
+        return [model.serialize() for model in self.manager.get_k_nearest(
+            location=location,
+            k=k,
+            max_distance=max_distance,
+            additional_filter_data=self.default_filter_args,
+            fields=self._get_fields_arg()
+        )]
 
+    def _get_nearby(self):
         query_params = request.args
+        min_distance = float(query_params.get("min_distance")) if 'min_distance' in query_params else None
+        location = Point([
+            float(query_params.get("longitude")),
+            float(query_params.get("latitude"))
+        ])
+        max_distance = float(query_params.get("max_distance"))
+        fields = self._get_fields_arg()
+        # ?sorted=false skips the ordering by distance, ?count=true only counts
+        is_sorted = self._get_bool_arg("sorted", True)
 
-        if self.is_nearby_request(kwargs):
-            min_distance = float(query_params.get("min_distance")) if 'min_distance' in query_params else None
-            return [model.serialize() for model in self.manager.get_near(
-                location=Point([
-                    float(query_params.get("longitude")),
-                    float(query_params.get("latitude"))
-                ]),
-                max_distance=float(query_params.get("max_distance")),
+        if self._get_bool_arg("count", False):
+            return {"count": self.manager.count_near(
+                location=location,
+                max_distance=max_distance,
                 min_distance=min_distance,
-                **kwargs
+                additional_filter_data=self.default_filter_args,
+                limit=query_params.get("limit", type=int)
+            )}
+
+        stream_format = self._get_stream_format()
+        if stream_format:
+            return streaming.stream_response(self.manager.get_near(
+                location=location,
+                max_distance=max_distance,
+                min_distance=min_distance,
+                additional_filter_data=self.default_filter_args,
+                fields=fields,
+                sort_by_distance=is_sorted,
+                stream=True
+            ), stream_format)
+
+        limit, after = self._get_page_args()
+        sort = self._get_sort_arg()
+        if sort is not None:
+            # the nearest items ordered by something else can not be paged by distance
+            return [model.serialize() for model in self.manager.get_near_with_distance(
+                location=location,
+                max_distance=max_distance,
+                min_distance=min_distance,
+                limit=limit,
+                sort=sort,
+                additional_filter_data=self.default_filter_args,
+                fields=fields
             )]
+
+        try:
+            page = self.manager.get_near_page(
+                location=location,
+                max_distance=max_distance,
+                min_distance=min_distance,
+                limit=limit,
+                after=after,
+                additional_filter_data=self.default_filter_args,
+                fields=fields,
+                sort_by_distance=is_sorted
+            )
+        except InvalidCursorError as invalid_cursor:
+            abort(400, "invalid cursor: {}".format(invalid_cursor.cursor))
+        serialized_items = [model.serialize() for model in page.items]
+        return serialized_items, 200, self._next_page_headers(page.next_cursor, limit)
+
+    def get(self, **kwargs):
+
+        query_params = request.args
+
+        if self.is_k_nearest_request(kwargs):
+            return self._get_k_nearest()
+        elif self.is_nearby_request(kwargs):
+            return self._get_nearby()
+        elif self.is_bbox_request(kwargs):
+            return self._get_in_bbox()
         elif self.is_within_request(kwargs):
-            # todo: ensure vertices is an array of 2-tuples of int
+            vertices = self._get_vertices_arg()
+            stream_format = self._get_stream_format()
+            if stream_format:
+                return streaming.stream_response(
+                    self.manager.get_within(
+                        vertices=vertices,
+                        additional_filter_data=self.default_filter_args,
+                        stream=True,
+                        fields=self._get_fields_arg(),
+                        **kwargs
+                    ), stream_format
+                )
             return [model.serialize() for model in self.manager.get_within(
-                vertices=[Point(vertex) for vertex in query_params.vertices],
+                vertices=vertices,
+                additional_filter_data=self.default_filter_args,
+                fields=self._get_fields_arg(),
                 **kwargs
             )]
         elif self.is_single_item_request(kwargs):
@@ -50,3 +200,78 @@ class LocationModelView(BaseModelView):
 
         else:
             return self._get_list(**kwargs)
+
+
+class LocationWithinView(BaseModelView):
+    """
+    POST a GeoJSON Polygon or MultiPolygon (or a Feature of one) to get the items inside it.
+    """
+    http_methods = ['POST']
+    geometry_classes = {
+        Polygon.type: Polygon,
+        MultiPolygon.type: MultiPolygon
+    }
+    # in meters. hand drawn outlines are simplified, the query cost grows with the vertex count.
+    simplify_tolerance = 10
+
+    def _load_geometry(self, data):
+        if isinstance(data, dict) and data.get('type') == 'Feature':
+            data = data.get('geometry')
+        if not isinstance(data, dict) or data.get('type') not in self.geometry_classes:
+            abort(400, "a GeoJSON Polygon or MultiPolygon is required")
+        try:
+            geometry_cls = locationEntityFactory.get_class(data['type'])
+            return geometry_cls(data['coordinates'])
+        except (KeyError, TypeError, ValueError) as ex:
+            abort(400, "invalid {}: {}".format(data['type'], ex))
+
+    def _get_within(self, geometry, fields, stream):
+        items = self.manager.get_within_geometry(
+            geometry, additional_filter_data=self.default_filter_args, fields=fields, stream=stream
+        )
+        if not stream:
+            return items
+        # the query runs with the first batch, a rejected geometry has to fail before the response starts
+        items = iter(items)
+        return chain(list(islice(items, 1)), items)
+
+    def post(self):
+        geometry = self._load_geometry(request.get_json(silent=True))
+        simplified = geometry.simplify(self.simplify_tolerance)
+        fields = self._get_fields_arg()
+        stream_format = self._get_stream_format()
+        try:
+            try:
+                items = self._get_within(simplified, fields, bool(stream_format))
+            except OperationFailure as failure:
+                if failure.code != BAD_VALUE or simplified.serialize() == geometry.serialize():
+                    raise
+                # simplified rings may still cross each other, e.g. a hole and the exterior ring
+                items = self._get_within(geometry, fields, bool(stream_format))
+        except OperationFailure as failure:
+            if failure.code != BAD_VALUE:
+                raise
+            abort(400, "invalid {}: {}".format(geometry.type, (failure.details or {}).get('errmsg', failure)))
+
+        if stream_format:
+            return streaming.stream_response(items, stream_format)
+        return [model.serialize() for model in items]
+
+
+class LocationClusterView(LocationModelView):
+    """
+    GET ?bbox=...&zoom=... returns the clusters of the viewport instead of the single items.
+    """
+    http_methods = ['GET']
+    # tiles per request, each tile holds up to 16 clusters
+    max_tiles = 256
+
+    def get(self):
+        bbox = self._get_bbox_arg()
+        zoom = request.args.get("zoom", type=int)
+        if zoom is None or not 0 <= zoom <= MAX_ZOOM:
+            abort(400, "zoom has to be between 0 and {}".format(MAX_ZOOM))
+        tile_count = sum(self.manager.cluster_grid.tile_count(zoom, box) for box in split_bbox(*bbox))
+        if tile_count > self.max_tiles:
+            abort(400, "the bbox is too large for zoom {}".format(zoom))
+        return self.manager.get_clusters(*bbox, zoom=zoom, additional_filter_data=self.default_filter_args)
@@ -1,17 +1,36 @@
 from flask import Blueprint
 
 from models.answer import AnswerModel
-from views.LocationModelView import LocationModelView
+from views.LocationModelView import LocationClusterView, LocationModelView, LocationWithinView
+from views.model_base_view import VoteView
 
 answer_bp = Blueprint('/answers', __name__)
-answer_bp.record(lambda _: register())
+answer_bp.record(lambda state: register(state.app))
 
 
-def register():
+def register(app):
     AnswerList.register(answer_bp, '/answers/', '/answers/<int:_id>')
+    AnswerWithin.register(answer_bp, '/answers/within')
+    AnswerClusters.register(answer_bp, '/answers/clusters')
+    AnswerVote.configure(app)
+    AnswerVote.register(answer_bp, '/answers/<string:_id>/vote')
 
 
 class AnswerList(LocationModelView):
-    def __init__(self):
-        super().__init__(AnswerModel)
-        self.field_name = "answer"
+    model_cls = AnswerModel
+    field_name = "answer"
+
+
+class AnswerWithin(LocationWithinView):
+    model_cls = AnswerModel
+    field_name = "answer"
+
+
+class AnswerClusters(LocationClusterView):
+    model_cls = AnswerModel
+    field_name = "answer"
+
+
+class AnswerVote(VoteView):
+    model_cls = AnswerModel
+    field_name = "answer"
@@ -1,8 +1,14 @@
+import atexit
+from urllib.parse import urlencode
+
 from flask import abort, request
 from flask_restful import Api, Resource
+from pymongo import ASCENDING, DESCENDING
 
-from database.exceptions import NotFoundError
+from database.exceptions import NotFoundError, InvalidCursorError
 from database.utils import hex_str_to_id_obj
+from database.vote_buffer import VoteBuffer
+from views import streaming
 from views.decorators import requires_argument
 
 
@@ -10,15 +16,36 @@ class BaseModelView(Resource):
     default_filter_args = {
         'deleted': False
     }
+    model_cls = None
+    field_name = None
+    default_page_size = 100
+    max_page_size = 1000
+    # items of one bulk request
+    max_bulk_size = 10000
+
+    # shared by all instances. flask_restful creates a new resource per request.
+    model_schema = None
+    # http methods of the urls, None for all implemented ones.
+    # flask recomputes methods for every subclass, so a restriction in methods is not inherited.
+    http_methods = None
 
     @classmethod
     def register(cls, app_or_blueprint, *url):
+        cls.setup()
         api = Api(app_or_blueprint)
-        api.add_resource(cls, *url)
+        if cls.http_methods is not None:
+            api.add_resource(cls, *url, methods=cls.http_methods)
+        else:
+            api.add_resource(cls, *url)
 
-    def __init__(self, model_cls):
-        self.model_schema = model_cls.get_scheme_cls()()
-        self.manager = model_cls.manager()
+    @classmethod
+    def setup(cls):
+        cls.model_schema = cls.model_cls.get_schema()
+        cls.model_cls.manager()
+
+    @property
+    def manager(self):
+        return self.model_cls.manager()
 
     def _load_model(self, data):
         loaded = self.model_schema.load(data)
@@ -35,33 +62,168 @@ class BaseModelView(Resource):
         except NotFoundError as not_found:
             abort(404, not_found._id)
 
+    @staticmethod
+    def _to_id_obj_or_404(_id):
+        """an _id which is no hex string can not exist"""
+        try:
+            return hex_str_to_id_obj(_id)
+        except (ValueError, OverflowError):
+            abort(404, _id)
+
     @requires_argument()
     def _get_single(self, _id, **kwargs):
-        item = self.manager.get_one_by_id(_id, **kwargs)
+        self._to_id_obj_or_404(_id)
+        item = self.manager.get_one_by_id(_id, fields=self._get_fields_arg(), **kwargs)
         if item:
             return item.serialize()
         else:
             abort(404)
 
+    def _get_fields_arg(self):
+        """
+        ?fields=_id,loc,topic restricts the loaded and serialized fields, _id is always included.
+        """
+        if 'fields' not in request.args:
+            return None
+        fields = set(field for field in request.args['fields'].split(',') if field)
+        unknown_fields = fields - set(self.model_schema.declared_fields)
+        if unknown_fields:
+            abort(400, "unknown fields: {}".format(", ".join(sorted(unknown_fields))))
+        return tuple(sorted(fields | {'_id'}))
+
+    def _get_bool_arg(self, name, default):
+        if name not in request.args:
+            return default
+        value = request.args[name].lower()
+        if value not in ('true', '1', 'false', '0'):
+            abort(400, "{} has to be true or false".format(name))
+        return value in ('true', '1')
+
+    def _get_sort_arg(self):
+        """
+        ?sort=-score,topic as list of (field, direction), a leading - sorts descending.
+        """
+        if 'sort' not in request.args:
+            return None
+        sort = [
+            (field[1:], DESCENDING) if field.startswith('-') else (field, ASCENDING)
+            for field in request.args['sort'].split(',') if field
+        ]
+        unknown_fields = set(field for field, _ in sort) - set(self.model_schema.declared_fields)
+        if unknown_fields:
+            abort(400, "unknown sort fields: {}".format(", ".join(sorted(unknown_fields))))
+        return sort
+
+    def _get_stream_format(self):
+        """
+        ?stream=json or ?stream=ndjson (or an Accept header asking for ndjson)
+        stream the whole result instead of returning a page.
+        """
+        stream_format = request.args.get('stream')
+        if stream_format is None and request.accept_mimetypes.best == streaming.MIMETYPES[streaming.NDJSON]:
+            stream_format = streaming.NDJSON
+        if stream_format is None:
+            return None
+        if stream_format not in streaming.MIMETYPES:
+            abort(400, "unknown stream format: {}".format(stream_format))
+        return stream_format
+
+    def _get_page_args(self):
+        limit = request.args.get('limit', default=self.default_page_size, type=int)
+        limit = max(1, min(limit, self.max_page_size))
+        return limit, request.args.get('after')
+
+    def _next_page_headers(self, next_cursor, limit):
+        if not next_cursor:
+            return {}
+        args = request.args.copy()
+        args['limit'] = limit
+        args['after'] = next_cursor
+        next_url = "{}?{}".format(request.base_url, urlencode(list(args.items(multi=True))))
+        return {'Link': '<{}>; rel="next"'.format(next_url)}
+
     def _get_list(self):
-        items = self.manager.get(self.default_filter_args)
+        stream_format = self._get_stream_format()
+        if stream_format:
+            return streaming.stream_response(
+                self.manager.get(self.default_filter_args, stream=True, fields=self._get_fields_arg()),
+                stream_format
+            )
+
+        limit, after = self._get_page_args()
+        try:
+            page = self.manager.get_page(
+                self.default_filter_args, limit=limit, after=after, fields=self._get_fields_arg()
+            )
+        except InvalidCursorError as invalid_cursor:
+            abort(400, "invalid cursor: {}".format(invalid_cursor.cursor))
         serialized_items = [
             item.serialize() for item in
-            items
+            page.items
         ]
-        return serialized_items
+        return serialized_items, 200, self._next_page_headers(page.next_cursor, limit)
 
     def post(self):
         data = request.get_json()[self.field_name]
+        if isinstance(data, list):
+            return self._post_many(data)
         item = self._load_model(data)
         saved_instance = self.manager.save(item)
         return saved_instance.serialize(), 201
 
-    @requires_argument()
+    @staticmethod
+    def _bulk_error(error):
+        if isinstance(error, NotFoundError):
+            return {'status': 404, 'error': "not found: {}".format(error._id)}
+        return {'status': 409, 'error': str(error)}
+
+    def _check_bulk_size(self, data):
+        if not isinstance(data, list):
+            abort(400, "a list of items is required")
+        if len(data) > self.max_bulk_size:
+            abort(400, "at most {} items per request".format(self.max_bulk_size))
+
+    def _bulk_response(self, results, status):
+        failed = any(result['status'] != status for result in results)
+        return results, 207 if failed else status
+
+    def _post_many(self, data):
+        """
+        a list of items is inserted in batches. the result has one entry per item in the same order,
+        with the status and either the new _id or the error. the response status is 207 if any item failed.
+        """
+        self._check_bulk_size(data)
+        results = [None] * len(data)
+        items, item_indexes = self._load_many(data, results)
+        errors = self.manager.save_many(items)
+        for position, item in enumerate(items):
+            error = errors.get(position)
+            results[item_indexes[position]] = self._bulk_error(error) if error else {'status': 201, '_id': item._id}
+
+        return self._bulk_response(results, 201)
+
+    def _load_many(self, data, results):
+        """loaded items and their indexes in data, load errors are stored in results"""
+        items, item_indexes = [], []
+        for index, item_data in enumerate(data):
+            loaded = self.model_schema.load(item_data)
+            if loaded.errors:
+                results[index] = {'status': 400, 'error': loaded.errors}
+                continue
+            items.append(loaded.data)
+            item_indexes.append(index)
+        return items, item_indexes
+
     def put(self, **kwargs):
+        if not kwargs.get('_id'):
+            return self._put_many(request.get_json()[self.field_name])
+        return self._put_single(**kwargs)
+
+    @requires_argument()
+    def _put_single(self, **kwargs):
         data = request.get_json()[self.field_name]
         item = self._load_model(data)
-        item._id = hex_str_to_id_obj(kwargs['_id'])
+        item._id = self._to_id_obj_or_404(kwargs['_id'])
         try:
             saved_instance = self.manager.save(item)
             return saved_instance.serialize()
@@ -69,10 +231,109 @@ class BaseModelView(Resource):
             abort(404, not_found._id)
 
     @requires_argument()
+    def patch(self, **kwargs):
+        """changes the given fields of a stored item, only the fields which actually change are written"""
+        data = request.get_json()[self.field_name]
+        self._to_id_obj_or_404(kwargs['_id'])
+        try:
+            stored_item = self.manager.get_one_by_id(kwargs['_id'])
+        except NotFoundError as not_found:
+            abort(404, not_found._id)
+        merged_data = stored_item.serialize(field_filter_fn=self.manager._default_exclude_in_save_fn)
+        merged_data.update(data)
+        merged_data['_id'] = kwargs['_id']
+        item = self._load_model(merged_data)
+        item.snapshot(stored_item.stored_data)
+        try:
+            saved_instance = self.manager.save(item)
+            return saved_instance.serialize()
+        except NotFoundError as not_found:
+            abort(404, not_found._id)
+
+    def _put_many(self, data):
+        """a list of items with their _id is updated in batches, the result is like the one of _post_many"""
+        self._check_bulk_size(data)
+        results = [None] * len(data)
+        items, item_indexes = self._load_many(data, results)
+        for index, item in zip(item_indexes, items):
+            if item.is_new():
+                results[index] = {'status': 400, 'error': "_id is required"}
+        item_indexes = [index for index in item_indexes if results[index] is None]
+        items = [item for item in items if not item.is_new()]
+        errors = self.manager.update_many_items(items)
+        for position, item in enumerate(items):
+            error = errors.get(position)
+            results[item_indexes[position]] = self._bulk_error(error) if error else {'status': 200, '_id': item._id}
+        return self._bulk_response(results, 200)
+
     def delete(self, **kwargs):
+        if not kwargs.get('_id'):
+            return self._delete_many((request.get_json(silent=True) or {}).get('_ids'))
+        return self._delete_single(**kwargs)
+
+    @requires_argument()
+    def _delete_single(self, **kwargs):
+        self._to_id_obj_or_404(kwargs['_id'])
         try:
             self.manager.delete(**kwargs)
         except NotFoundError as not_found:
             abort(404, not_found._id)
         except Exception as err:
             abort(500, err)
+
+    def _delete_many(self, ids):
+        """{"_ids": [...]} deletes the items in batches, with one result per _id"""
+        self._check_bulk_size(ids)
+        try:
+            id_objs = [hex_str_to_id_obj(_id) for _id in ids]
+        except (TypeError, ValueError, OverflowError):
+            abort(400, "_ids have to be hex strings")
+        errors = self.manager.delete_many_ids(id_objs)
+        return self._bulk_response([
+            self._bulk_error(errors[index]) if index in errors else {'status': 200, '_id': _id}
+            for index, _id in enumerate(ids)
+        ], 200)
+
+
+class VoteView(BaseModelView):
+    """
+    {"vote": 1} or {"vote": -1} changes the score of an item with $inc.
+    with a vote buffer the votes are summed per item and written in batches, the response is 202
+    and votes for missing items are dropped. without one every vote is written at once.
+    """
+    http_methods = ['POST']
+    score_field = "score"
+    vote_buffer = None
+    # the buffer may be replaced by configure, the one configured last is flushed at exit
+    flush_at_exit_registered = False
+
+    @classmethod
+    def configure(cls, app):
+        interval = app.config.get('VOTE_BUFFER_INTERVAL', 0)
+        if not interval:
+            cls.vote_buffer = None
+            return
+        cls.vote_buffer = VoteBuffer(cls.model_cls, field=cls.score_field, interval=interval, app=app)
+        if not cls.flush_at_exit_registered:
+            atexit.register(cls.flush_vote_buffer)
+            cls.flush_at_exit_registered = True
+
+    @classmethod
+    def flush_vote_buffer(cls):
+        if cls.vote_buffer is not None:
+            cls.vote_buffer.flush_and_log()
+
+    def post(self, _id):
+        vote = (request.get_json(silent=True) or {}).get('vote')
+        if isinstance(vote, bool) or vote not in (1, -1):
+            abort(400, "vote has to be 1 or -1")
+        id_obj = self._to_id_obj_or_404(_id)
+
+        if self.vote_buffer is not None:
+            self.vote_buffer.add(id_obj, vote)
+            return {'_id': _id}, 202
+        try:
+            self.manager.increment(id_obj, self.score_field, vote)
+        except NotFoundError:
+            abort(404, _id)
+        return {'_id': _id}, 200
@@ -1,18 +1,37 @@
 from flask import Blueprint
 
 from models.question import QuestionModel
-from views.LocationModelView import LocationModelView
+from views.LocationModelView import LocationClusterView, LocationModelView, LocationWithinView
+from views.model_base_view import VoteView
 
 questions_bp = Blueprint('/questions', __name__)
-questions_bp.record(lambda _: register())
+questions_bp.record(lambda state: register(state.app))
 
 
-def register():
-    QuestionList.register(questions_bp, '/questions/', '/questions/<string:_id>')
+def register(app):
+    # ids are 24 hex digits, so a wrong method on the paths below is no item request
+    QuestionList.register(questions_bp, '/questions/', '/questions/<string(length=24):_id>')
+    QuestionWithin.register(questions_bp, '/questions/within')
+    QuestionClusters.register(questions_bp, '/questions/clusters')
+    QuestionVote.configure(app)
+    QuestionVote.register(questions_bp, '/questions/<string:_id>/vote')
 
 
 class QuestionList(LocationModelView):
+    model_cls = QuestionModel
+    field_name = "question"
 
-    def __init__(self):
-        super().__init__(QuestionModel)
-        self.field_name = "question"
+
+class QuestionWithin(LocationWithinView):
+    model_cls = QuestionModel
+    field_name = "question"
+
+
+class QuestionClusters(LocationClusterView):
+    model_cls = QuestionModel
+    field_name = "question"
+
+
+class QuestionVote(VoteView):
+    model_cls = QuestionModel
+    field_name = "question"
@@ -0,0 +1,30 @@
+from flask import Response, json, stream_with_context
+
+JSON = 'json'
+NDJSON = 'ndjson'
+
+MIMETYPES = {
+    JSON: 'application/json',
+    NDJSON: 'application/x-ndjson',
+}
+
+
+def _json_array_chunks(items):
+    yield '['
+    for idx, item in enumerate(items):
+        yield (',' if idx else '') + json.dumps(item.serialize())
+    yield ']\n'
+
+
+def _ndjson_chunks(items):
+    for item in items:
+        yield json.dumps(item.serialize()) + '\n'
+
+
+def stream_response(items, stream_format=JSON):
+    """
+    chunked response which serializes one item after the other while items is consumed,
+    so the memory needed does not grow with the number of items.
+    """
+    chunks = _ndjson_chunks(items) if stream_format == NDJSON else _json_array_chunks(items)
+    return Response(stream_with_context(chunks), mimetype=MIMETYPES[stream_format])
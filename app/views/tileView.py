@@ -0,0 +1,102 @@
+from flask import Blueprint, Response, abort, json, request
+from flask_restful import Api, Resource
+
+from database.tiles import is_valid_tile, quantize, tile_bbox
+from models.answer import AnswerModel
+from models.question import QuestionModel
+from views.tile_cache import DEFAULT_MAX_ZOOM, TileCache
+
+tiles_bp = Blueprint('/tiles', __name__)
+tiles_bp.record(lambda state: register(state.app))
+
+
+def register(app):
+    tile_cache_directory = app.config.get('TILE_CACHE_DIR')
+    TileView.tile_cache = TileCache(
+        tile_cache_directory,
+        max_age=app.config.get('TILE_CACHE_MAX_AGE', 300),
+        max_zoom=app.config.get('TILE_CACHE_MAX_ZOOM', DEFAULT_MAX_ZOOM),
+        max_bytes=app.config.get('TILE_CACHE_MAX_BYTES', 1024 ** 3)
+    ) if tile_cache_directory else None
+    TileView.register(tiles_bp, '/tiles/<string:layer>/<int:z>/<int:x>/<int:y>')
+
+
+class TileView(Resource):
+    """
+    tiles of the items of a layer. features are stored column wise, with coordinates quantized
+    to integers between 0 and extent, (0, 0) being the north west corner of the tile.
+    """
+    layers = {
+        'questions': QuestionModel,
+        'answers': AnswerModel
+    }
+    default_filter_args = {
+        'deleted': False
+    }
+    extent = 4096
+    # dense tiles keep the highest scored items
+    max_features = 1000
+    max_age = 60
+    tile_cache = None
+
+    @classmethod
+    def register(cls, app_or_blueprint, *url):
+        cls.setup()
+        api = Api(app_or_blueprint)
+        api.add_resource(cls, *url)
+
+    @classmethod
+    def setup(cls):
+        for layer in cls.layers:
+            cls.get_manager(layer)
+
+    @classmethod
+    def get_manager(cls, layer):
+        manager = cls.layers[layer].manager()
+        if cls.tile_cache is not None:
+            cls.tile_cache.watch(layer, manager)
+        return manager
+
+    def _render(self, layer, z, x, y):
+        manager = self.get_manager(layer)
+        items = manager.get_in_bbox(
+            *tile_bbox(z, x, y),
+            additional_filter_data=self.default_filter_args,
+            limit=self.max_features + 1,
+            fields=('_id', manager.location_field, manager.score_field)
+        )
+        truncated = len(items) > self.max_features
+        features = {'id': [], 'x': [], 'y': [], 'score': []}
+        for item in items[:self.max_features]:
+            location = getattr(item, manager.location_field)
+            tile_x, tile_y = quantize(z, x, y, location.longitude, location.latitude, self.extent)
+            features['id'].append(item._id)
+            features['x'].append(tile_x)
+            features['y'].append(tile_y)
+            features['score'].append(getattr(item, manager.score_field, 0) or 0)
+        return json.dumps({
+            'layer': layer,
+            'z': z,
+            'x': x,
+            'y': y,
+            'extent': self.extent,
+            'truncated': truncated,
+            'features': features
+        }, separators=(',', ':')).encode('utf-8')
+
+    def get(self, layer, z, x, y):
+        if layer not in self.layers or not is_valid_tile(z, x, y):
+            abort(404)
+
+        data = self.tile_cache.get(layer, z, x, y) if self.tile_cache is not None else None
+        if data is None:
+            rendered_at = self.tile_cache.clock() if self.tile_cache is not None else None
+            data = self._render(layer, z, x, y)
+            if self.tile_cache is not None:
+                self.tile_cache.put(layer, z, x, y, data, rendered_at=rendered_at)
+
+        response = Response(data, mimetype='application/json')
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        response.add_etag()
+        return response.make_conditional(request)
@@ -0,0 +1,177 @@
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from database.tiles import tile_of
+
+# deeper tiles cover a few streets, they are cheap to render and too many to keep
+DEFAULT_MAX_ZOOM = 16
+
+
+class TileCache(object):
+    """
+    pyramid of rendered tiles on local disk, <directory>/<layer>/<z>/<x>/<y>.json.
+    all workers of a host share the files. a write removes the tiles containing the new location
+    on every zoom level, tiles at the previous location of a moved item expire after max_age seconds.
+    tiles deeper than max_zoom are not cached, expired tiles and the oldest ones beyond max_bytes are
+    removed by evict(), which put() starts in the background every evict_interval seconds.
+    """
+
+    def __init__(self, directory, max_age=300, max_zoom=DEFAULT_MAX_ZOOM, max_bytes=1024 ** 3, evict_interval=60,
+                 clock=time.time):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_zoom = max_zoom
+        self.max_bytes = max_bytes
+        self.evict_interval = evict_interval
+        self.clock = clock
+        self.listeners = {}
+        self.evicted_at = clock()
+        self.eviction = None
+        self._eviction_lock = threading.Lock()
+
+    def _path(self, layer, zoom, x, y):
+        return os.path.join(self.directory, layer, str(zoom), str(x), "{}.json".format(y))
+
+    def _written_marker_path(self, layer):
+        return os.path.join(self.directory, layer, ".written")
+
+    def _written_since(self, layer, timestamp):
+        try:
+            return os.stat(self._written_marker_path(layer)).st_mtime >= timestamp
+        except FileNotFoundError:
+            return False
+
+    def _mark_written(self, layer):
+        """renders of layer which started before now are not stored, see put"""
+        path = self._written_marker_path(layer)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'ab'):
+            pass
+        # file times are coarser than the clock, the marker has to be comparable to rendered_at
+        now = self.clock()
+        os.utime(path, (now, now))
+
+    def is_cacheable(self, zoom):
+        return zoom <= self.max_zoom
+
+    def get(self, layer, zoom, x, y):
+        if not self.is_cacheable(zoom):
+            return None
+        path = self._path(layer, zoom, x, y)
+        try:
+            with open(path, 'rb') as tile_file:
+                if self.clock() - os.fstat(tile_file.fileno()).st_mtime > self.max_age:
+                    return None
+                with mmap.mmap(tile_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return mapped[:]
+        except (FileNotFoundError, ValueError):
+            # ValueError: empty files can not be mapped
+            return None
+
+    def put(self, layer, zoom, x, y, data, rendered_at=None):
+        """
+        stores a tile rendered from the items read at rendered_at, returns whether it was stored.
+        a tile of a layer written since then may miss the write, it is not stored.
+        """
+        if not self.is_cacheable(zoom):
+            return False
+        rendered_at = self.clock() if rendered_at is None else rendered_at
+        if self._written_since(layer, rendered_at):
+            return False
+        path = self._path(layer, zoom, x, y)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # readers see either the old or the new tile, never a partial one
+        file_descriptor, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(file_descriptor, 'wb') as tile_file:
+                tile_file.write(data)
+            # the tile expires max_age seconds after its items were read
+            os.utime(temp_path, (rendered_at, rendered_at))
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        # a write between the first check and the replace may have removed the tile before it existed
+        if self._written_since(layer, rendered_at):
+            self._remove(path)
+            return False
+        self._start_eviction()
+        return True
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, layer, longitude, latitude):
+        # marked first, see put
+        self._mark_written(layer)
+        for zoom in range(self.max_zoom + 1):
+            self._remove(self._path(layer, zoom, *tile_of(zoom, longitude, latitude)))
+
+    def clear(self, layer):
+        self._mark_written(layer)
+        layer_directory = os.path.join(self.directory, layer)
+        for entry in os.scandir(layer_directory):
+            if entry.is_dir():
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    def _files(self):
+        """(modified at, size, path) of all tile files, temporary ones of interrupted writes included"""
+        files = []
+        for directory, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                if file_name.startswith('.'):
+                    continue
+                path = os.path.join(directory, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def evict(self):
+        """removes expired tiles and the oldest ones beyond max_bytes, returns the number of removed files"""
+        now = self.clock()
+        files = sorted(self._files(), reverse=True)
+        removed, size = 0, 0
+        for modified_at, file_size, path in files:
+            if now - modified_at <= self.max_age:
+                size += file_size
+                if size <= self.max_bytes:
+                    continue
+            self._remove(path)
+            removed += 1
+        return removed
+
+    def _start_eviction(self):
+        with self._eviction_lock:
+            if self.clock() - self.evicted_at < self.evict_interval or \
+                    (self.eviction is not None and self.eviction.is_alive()):
+                return
+            self.evicted_at = self.clock()
+            self.eviction = threading.Thread(target=self.evict, daemon=True)
+        self.eviction.start()
+
+    def watch(self, layer, manager):
+        """invalidates the tiles of layer on every write of manager, once per manager"""
+        listener = self.listeners.get(layer)
+        if listener is None:
+            def listener(_manager, _id, item):
+                if item is None:
+                    # the location of a removed item is unknown
+                    self.clear(layer)
+                    return
+                location = getattr(item, _manager.location_field)
+                self.invalidate(layer, location.longitude, location.latitude)
+
+            self.listeners[layer] = listener
+        if listener not in manager.write_listeners:
+            manager.add_write_listener(listener)